@@ -0,0 +1,61 @@
+"""Batch vs single-query throughput benchmark for RAGChain
+
+Runs the same questions through RAGChain.query one at a time and through
+RAGChain.query_batch, against a synthetic corpus in a temporary store.
+Answers come from the stand-in Ollama in fake_ollama.py, which takes
+llm_latency_ms per generation, so both paths include generation.
+
+Usage: python bench_batch.py [num_questions] [max_concurrency] [llm_latency_ms]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+from fake_ollama import start_fake_ollama
+from rag_chain import RAGChain
+from synthetic import WORDS, make_paragraphs
+
+
+def make_questions(count: int):
+    return [f"What does the {WORDS[i % len(WORDS)]} section say about item {i}?" for i in range(count)]
+
+
+async def run_single(rag: RAGChain, questions):
+    for question in questions:
+        await rag.query(question)
+
+
+if __name__ == "__main__":
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    max_concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    llm_latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.05
+    questions = make_questions(num_questions)
+
+    ollama = start_fake_ollama(latency=llm_latency)
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGChain(
+            persist_directory=persist_dir,
+            ollama_base_url=f"http://127.0.0.1:{ollama.server_address[1]}",
+            background=False,
+            embedding_cache_size=0,
+            answer_cache_size=0,
+            llm_concurrency=max_concurrency,
+        )
+        rag.add_documents(make_paragraphs(2000))
+
+        start = time.perf_counter()
+        asyncio.run(run_single(rag, questions))
+        single = time.perf_counter() - start
+        print(f"Single-query path: {num_questions / single:8.1f} questions/s")
+
+        start = time.perf_counter()
+        for _ in rag.query_batch(questions, max_concurrency=max_concurrency):
+            pass
+        batch = time.perf_counter() - start
+        print(f"Batch path:        {num_questions / batch:8.1f} questions/s")
+        print(f"Speedup: {single / batch:.2f}x")
+        print(f"LLM generations: {ollama.generate_calls} (stand-in latency {llm_latency * 1000:.0f} ms)")
+        rag.ollama.close()
+    ollama.shutdown()
+    ollama.server_close()
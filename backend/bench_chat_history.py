@@ -0,0 +1,56 @@
+"""Chat history benchmark: write throughput and session listing with many sessions
+
+Usage: python bench_chat_history.py [num_sessions] [messages_per_session]
+"""
+import sys
+import tempfile
+import threading
+import time
+
+from chat_history import ChatHistoryManager
+
+
+def bench(num_sessions: int, messages_per_session: int):
+    with tempfile.TemporaryDirectory() as history_dir:
+        manager = ChatHistoryManager(history_dir=history_dir)
+        answer = "This is a synthetic answer. " * 20
+
+        start = time.perf_counter()
+        for turn in range(messages_per_session):
+            for s in range(num_sessions):
+                manager.save_message(f"session-{s}", f"Question {turn}?", answer, "english")
+        elapsed = time.perf_counter() - start
+        writes = num_sessions * messages_per_session
+        print(f"Sequential writes: {writes} in {elapsed:.2f} s ({writes / elapsed:.0f} msg/s)")
+
+        # Concurrent writers on a single session must not lose messages
+        threads = [
+            threading.Thread(
+                target=lambda t=t: [manager.save_message("shared", f"q{t}-{i}", answer, "english") for i in range(100)]
+            )
+            for t in range(8)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stored = len(manager.get_history("shared"))
+        print(f"Concurrent writes: 800 in {elapsed:.2f} s, stored {stored} (lost {800 - stored})")
+
+        start = time.perf_counter()
+        sessions = manager.get_all_sessions()
+        elapsed = time.perf_counter() - start
+        print(f"get_all_sessions: {len(sessions)} sessions in {elapsed * 1000:.1f} ms")
+
+        start = time.perf_counter()
+        history = manager.get_history(f"session-{num_sessions // 2}")
+        elapsed = time.perf_counter() - start
+        print(f"get_history: {len(history)} messages in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    num_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    messages_per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    bench(num_sessions, messages_per_session)
@@ -0,0 +1,102 @@
+"""Chunking memory benchmark: peak memory of extract + chunk + embed on a large PDF
+
+Compares the old whole-document path (extract every page, join, split,
+then embed the chunk list in batches) with the streamed path
+(``DocumentProcessor.iter_chunks`` feeding embedding batches directly).
+Each run happens in a fresh process so peaks don't bleed into each other;
+extraction runs in-process (max_workers=1) so all of it is measured.
+
+Usage: python bench_chunking.py [pages] [words_per_page]
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import PyPDF2
+
+from document_processor import DocumentProcessor, _extract_pdf_pages
+from embeddings import HashEmbeddings
+from synthetic import make_paragraphs, write_pdf
+
+
+BATCH_SIZE = 64
+
+
+def _whole_document(processor: DocumentProcessor, path: str, embeddings: HashEmbeddings) -> int:
+    with open(path, "rb") as f:
+        page_count = len(PyPDF2.PdfReader(f).pages)
+    texts = _extract_pdf_pages(path, 0, page_count)
+    chunks = processor.text_splitter.split_text("\n".join(texts))
+    for start in range(0, len(chunks), BATCH_SIZE):
+        embeddings.embed_documents(chunks[start:start + BATCH_SIZE])
+    return len(chunks)
+
+
+def _streamed(processor: DocumentProcessor, path: str, embeddings: HashEmbeddings) -> int:
+    count = 0
+    batch = []
+    for chunk, _ in processor.iter_chunks(path, ".pdf"):
+        batch.append(chunk)
+        if len(batch) >= BATCH_SIZE:
+            embeddings.embed_documents(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        embeddings.embed_documents(batch)
+        count += len(batch)
+    return count
+
+
+MODES = {"whole-document": _whole_document, "streamed": _streamed}
+
+
+def _measure(mode: str, path: str, traced: bool, results):
+    processor = DocumentProcessor(max_workers=1, ocr_cache_dir=tempfile.mkdtemp())
+    embeddings = HashEmbeddings()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    chunks = MODES[mode](processor, path, embeddings)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if traced else None
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((chunks, elapsed, peak, max_rss_kb))
+
+
+def _in_process(mode: str, path: str, traced: bool):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(mode, path, traced, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def run(mode: str, path: str, pages: int):
+    # tracemalloc slows allocation-heavy code many times over, so time and
+    # RSS come from a plain run and the allocation peak from a traced one
+    chunks, elapsed, _, max_rss_kb = _in_process(mode, path, traced=False)
+    _, _, peak, _ = _in_process(mode, path, traced=True)
+
+    print(f"{mode}:")
+    print(f"  {elapsed:8.2f} s  {pages / elapsed:8.1f} pages/s  {chunks} chunks")
+    print(f"  peak Python allocations {peak / 2**20:8.1f} MiB  max RSS {max_rss_kb / 1024:8.1f} MiB")
+    return peak
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    words_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        path = os.path.join(corpus_dir, "large.pdf")
+        write_pdf(path, make_paragraphs(pages, words_per_paragraph=words_per_page))
+        print(f"Document: {pages} pages, {os.path.getsize(path) / 2**20:.1f} MiB")
+        whole = run("whole-document", path, pages)
+        streamed = run("streamed", path, pages)
+        print(f"Peak allocations: {whole / streamed:.1f}x lower when streamed")
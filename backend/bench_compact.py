@@ -0,0 +1,106 @@
+"""Compact int8 index vs Chroma benchmark: memory per million chunks, QPS and recall@4
+
+Synthetic clustered 384-dimensional vectors (MiniLM's size) are written to
+a Chroma collection and to a CompactVectorIndex. Each index is then opened
+in a fresh worker process that runs the queries, so the reported memory is
+what serving that index costs. Recall@4 is measured against exact
+brute-force search.
+
+Memory is read from /proc/self/statm, so the benchmark needs Linux.
+
+Usage: python bench_compact.py [num_chunks] [num_queries]
+"""
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DIM = 384
+K = 4
+
+
+def make_vectors(count: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around the same few hundred topic centres for every seed"""
+    centres = np.random.default_rng(1234).normal(size=(256, DIM)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.6 * rng.normal(size=(count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray):
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    return [set(np.argsort(norms - 2 * vectors @ q)[:K].tolist()) for q in queries]
+
+
+def _rss_bytes():
+    """(resident, anonymous) bytes - file-backed mmap pages can be reclaimed by the OS"""
+    with open("/proc/self/statm") as f:
+        fields = [int(field) * resource.getpagesize() for field in f.read().split()]
+    return fields[1], fields[1] - fields[2]
+
+
+def _serve(kind: str, directory: str, queries: np.ndarray):
+    """Open one index in this (fresh) process and run the queries"""
+    from langchain_community.vectorstores.chroma import Chroma
+    from compact_index import CompactVectorIndex
+
+    np.ones((64, 64)) @ np.ones((64, 64))  # BLAS allocates its buffers on first use
+    before = _rss_bytes()
+    if kind == "chroma":
+        collection = Chroma(persist_directory=directory, collection_name="bench")._collection
+        search = lambda q: collection.query(query_embeddings=[q.tolist()], n_results=K, include=[])["ids"][0]
+    else:
+        index = CompactVectorIndex(directory)
+        search = lambda q: [chunk_id for chunk_id, _ in index.search(q, K)]
+
+    search(queries[0])  # load the index before timing
+    start = time.perf_counter()
+    results = [[int(chunk_id) for chunk_id in search(q)] for q in queries]
+    elapsed = time.perf_counter() - start
+    after = _rss_bytes()
+    return results, len(queries) / elapsed, after[0] - before[0], after[1] - before[1]
+
+
+def report(name: str, outcome, truth, num_chunks: int):
+    results, qps, rss_bytes, anon_bytes = outcome
+    recall = np.mean([len(truth[i] & set(r)) / K for i, r in enumerate(results)])
+    scale = 1_000_000 / num_chunks / 2**30
+    print(
+        f"{name:<14} memory/1M chunks: {rss_bytes * scale:5.2f} GiB RSS ({anon_bytes * scale:5.2f} GiB anonymous)"
+        f"   QPS: {qps:8.1f}   recall@4: {recall:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    vectors = make_vectors(num_chunks)
+    queries = make_vectors(num_queries, seed=1)
+    ids = [str(i) for i in range(num_chunks)]
+    truth = exact_neighbours(vectors, queries)
+
+    with tempfile.TemporaryDirectory() as chroma_dir, tempfile.TemporaryDirectory() as compact_dir:
+        from langchain_community.vectorstores.chroma import Chroma
+        from compact_index import CompactVectorIndex
+
+        collection = Chroma(persist_directory=chroma_dir, collection_name="bench")._collection
+        compact = CompactVectorIndex(compact_dir)
+        for start in range(0, num_chunks, 5000):
+            batch = slice(start, start + 5000)
+            collection.add(ids=ids[batch], embeddings=vectors[batch].tolist())
+            compact.add(ids[batch], vectors[batch])
+        compact.flush()
+        del collection
+
+        print(f"{num_chunks} chunks, {num_queries} queries")
+        for name, kind, directory in (("Chroma", "chroma", chroma_dir), ("Compact int8", "compact", compact_dir)):
+            # Spawn, not fork: the parent already runs Chroma's threads
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                report(name, pool.submit(_serve, kind, directory, queries).result(), truth, num_chunks)
+        print(f"Compact on-disk scan size/1M chunks: {(DIM + 8) * 1_000_000 / 2**30:.2f} GiB "
+              f"(float32 rerank copy {4 * DIM * 1_000_000 / 2**30:.2f} GiB, read per candidate)")
@@ -0,0 +1,68 @@
+"""Embedding backend benchmark: load time, embeddings/sec and process RSS
+
+Each backend is loaded in a fresh worker process so import cost and memory
+are measured in isolation. Vectors for the same texts are compared with
+the first backend listed (cosine similarity) to confirm the backends stay
+interchangeable for existing indexes.
+
+Usage: python bench_embeddings.py [num_texts] [batch_size] [threads] [backend ...]
+"""
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from synthetic import make_paragraphs
+
+
+def _rss_mib() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _run(backend: str, texts, batch_size: int, threads: int):
+    start = time.perf_counter()
+    from embeddings import create_embeddings
+    model = create_embeddings(backend, batch_size=batch_size, num_threads=threads or None)
+    model.embed_documents(texts[:batch_size])  # warm-up
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = model.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return load_seconds, len(texts) / elapsed, _rss_mib(), peak_mib, vectors[:32]
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+
+if __name__ == "__main__":
+    num_texts = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    backends = sys.argv[4:] or ["huggingface", "onnx", "onnx-int8"]
+    texts = make_paragraphs(num_texts, words_per_paragraph=120)
+
+    reference = None
+    print(f"{num_texts} texts, batch size {batch_size}, threads {threads or 'default'}")
+    for backend in backends:
+        # Spawn so every backend starts from a bare interpreter
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            try:
+                load_seconds, rate, rss, peak, vectors = pool.submit(_run, backend, texts, batch_size, threads).result()
+            except Exception as e:
+                print(f"{backend:<12} skipped: {e}")
+                continue
+        if reference is None:
+            reference, agreement = vectors, ""
+        else:
+            agreement = f"   min cosine vs {backends[0]}: {min(_cosine(a, b) for a, b in zip(reference, vectors)):.4f}"
+        print(
+            f"{backend:<12} load {load_seconds:5.1f} s   {rate:8.1f} embeddings/s   "
+            f"RSS {rss:7.1f} MiB (peak {peak:7.1f} MiB){agreement}"
+        )
@@ -0,0 +1,59 @@
+"""Hybrid retrieval benchmark: recall@4 for exact identifiers and BM25 latency vs corpus size
+
+Every synthetic chunk carries a unique part number; each query asks for one
+of them, so the chunk containing it is the single relevant result.
+
+Usage: python bench_hybrid.py [num_chunks] [num_queries]
+"""
+import random
+import sys
+import tempfile
+import time
+
+from keyword_index import KeywordIndex
+from rag_chain import RAGChain
+from synthetic import make_paragraphs
+
+
+def make_corpus(num_chunks: int):
+    texts = make_paragraphs(num_chunks, words_per_paragraph=60)
+    parts = [f"PN-{10000 + i}" for i in range(num_chunks)]
+    return [f"{text} Replacement part {part}." for text, part in zip(texts, parts)], parts
+
+
+def recall_at_k(rag: RAGChain, parts, num_queries: int) -> float:
+    rng = random.Random(0)
+    hits = 0
+    for index in rng.sample(range(len(parts)), num_queries):
+        docs = rag._retrieve(f"Which section lists part {parts[index]}?")
+        hits += any(parts[index] in doc.page_content for doc in docs)
+    return hits / num_queries
+
+
+def keyword_latency(num_docs: int, queries: int = 200) -> float:
+    texts, parts = make_corpus(num_docs)
+    with tempfile.TemporaryDirectory() as directory:
+        index = KeywordIndex(directory)
+        index.add([str(i) for i in range(num_docs)], texts)
+        index.flush()
+        start = time.perf_counter()
+        for i in range(queries):
+            index.search(f"policy approval part {parts[i % num_docs]}", k=8)
+        return (time.perf_counter() - start) / queries
+
+
+if __name__ == "__main__":
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    texts, parts = make_corpus(num_chunks)
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGChain(persist_directory=persist_dir, background=False)
+        rag.add_documents(texts)
+        rag.hybrid = False
+        print(f"Dense only   recall@4: {recall_at_k(rag, parts, num_queries):.3f}")
+        rag.hybrid = True
+        print(f"Hybrid (RRF) recall@4: {recall_at_k(rag, parts, num_queries):.3f}")
+
+    for size in (1000, 10000, 50000):
+        print(f"BM25 search latency @ {size:>6} chunks: {keyword_latency(size) * 1000:.2f} ms")
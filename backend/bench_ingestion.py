@@ -0,0 +1,71 @@
+"""Ingestion throughput benchmark: pages/sec and chunks/sec for /upload's pipeline
+
+Each file goes through the same calls as an upload job (iter_chunks
+streamed into index_chunks). Compares a one-at-a-time configuration
+(in-process extraction, one chunk per embedding call, persist after every
+file) with the tuned defaults (process pool extraction, batched embeddings,
+grouped persistence with one flush at the end of the batch).
+
+Usage: python bench_ingestion.py [num_files] [pages_per_file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from document_processor import DocumentProcessor
+from rag_chain import RAGChain
+from synthetic import make_paragraphs, write_pdf
+
+
+def make_corpus(directory: str, num_files: int, pages_per_file: int):
+    paths = []
+    for i in range(num_files):
+        path = os.path.join(directory, f"doc_{i}.pdf")
+        write_pdf(path, make_paragraphs(pages_per_file, words_per_paragraph=300, seed=i))
+        paths.append(path)
+    return paths
+
+
+def run(label: str, paths, pages: int, max_workers: int, batch_size: int, persist_every: int, flush_each_file: bool):
+    processor = DocumentProcessor(max_workers=max_workers)
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGChain(
+            persist_directory=persist_dir,
+            background=False,
+            embedding_batch_size=batch_size,
+            persist_every=persist_every,
+        )
+        rag.embeddings.load()
+
+        chunks = 0
+        start = time.perf_counter()
+        for i, path in enumerate(paths):
+            result = rag.index_chunks(
+                processor.iter_chunks(path, ".pdf"), os.path.basename(path), f"file-{i}", f"hash-{i}"
+            )
+            chunks += result["added"]
+            if flush_each_file:
+                rag.flush()
+        rag.flush()
+        elapsed = time.perf_counter() - start
+    processor.shutdown()
+
+    print(f"{label}:")
+    print(f"  {elapsed:8.2f} s  {pages / elapsed:8.1f} pages/s  {chunks / elapsed:8.1f} chunks/s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    pages = num_files * pages_per_file
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = make_corpus(corpus_dir, num_files, pages_per_file)
+        print(f"Corpus: {num_files} PDFs, {pages} pages")
+        baseline = run("One-at-a-time", paths, pages, max_workers=1, batch_size=1, persist_every=2000,
+                       flush_each_file=True)
+        tuned = run("Parallel + batched", paths, pages, max_workers=os.cpu_count() or 1,
+                    batch_size=64, persist_every=2000, flush_each_file=False)
+        print(f"Speedup: {baseline / tuned:.2f}x")
@@ -0,0 +1,110 @@
+"""Intent classification benchmark: misroutes and time per message
+
+Classifies every message of a labelled corpus (``intent_corpus.json``)
+with the old substring scans that ``RAGChain`` used and with the compiled
+``IntentMatcher``. Reported per classifier:
+
+- routing errors: real questions answered with a canned greeting (they
+  skip retrieval) and greetings sent to retrieval
+- intent errors: messages that get the wrong canned answer, or one they
+  should not get, in the no-LLM fallback
+- microseconds per message
+
+Usage: python bench_intents.py [--corpus intent_corpus.json] [--intents intents.json] [--repeat 200]
+"""
+import argparse
+import json
+import time
+from typing import Callable, List, Optional
+
+from intents import DEFAULT_INTENTS_FILE, IntentMatcher
+
+
+# The substring scans this benchmark replaced, as they were in rag_chain.py
+_LEGACY_ROUTED = ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening",
+                  "how are you", "how's it going", "what's up", "sup", "hi there", "hello there",
+                  "what can you do", "help", "what do you do", "capabilities"]
+_LEGACY_FALLBACK = [
+    ("greeting", ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]),
+    ("how_are_you", ["how are you", "how's it going"]),
+    ("weather", ["weather"]),
+    ("capabilities", ["what can you do", "help", "what do you do", "capabilities"]),
+    ("documents", ["document", "upload", "file", "pdf", "ppt", "docx"]),
+]
+
+
+def legacy_routed(question: str) -> bool:
+    question_lower = question.lower().strip()
+    return any(greeting in question_lower for greeting in _LEGACY_ROUTED)
+
+
+def legacy_intent(question: str) -> Optional[str]:
+    question_lower = question.lower().strip()
+    for name, phrases in _LEGACY_FALLBACK:
+        if any(phrase in question_lower for phrase in phrases):
+            return name
+    return None
+
+
+def evaluate(label: str, messages: List[dict], routed_names: set,
+             routed: Callable[[str], bool], intent: Callable[[str], Optional[str]], repeat: int) -> dict:
+    wrongly_routed, missed_routes, wrong_intents = [], [], []
+    for message in messages:
+        text, expected = message["text"], message["intent"]
+        should_route = expected in routed_names
+        if routed(text) and not should_route:
+            wrongly_routed.append(text)
+        elif should_route and not routed(text):
+            missed_routes.append(text)
+        if intent(text) != expected:
+            wrong_intents.append(text)
+
+    texts = [message["text"] for message in messages]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            routed(text)
+    seconds = time.perf_counter() - start
+
+    result = {
+        "questions_routed_to_canned": len(wrongly_routed),
+        "canned_routed_to_retrieval": len(missed_routes),
+        "wrong_intents": len(wrong_intents),
+        "us_per_message": seconds / (repeat * len(texts)) * 1e6,
+    }
+    print(f"{label}:")
+    print(f"  questions answered with a canned greeting: {len(wrongly_routed):3d}  "
+          f"greetings sent to retrieval: {len(missed_routes):3d}  "
+          f"wrong fallback intent: {len(wrong_intents):3d}/{len(messages)}  "
+          f"{result['us_per_message']:6.2f} us/message")
+    for text in wrongly_routed[:5]:
+        print(f"    canned: {text!r}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="intent_corpus.json")
+    parser.add_argument("--intents", default=DEFAULT_INTENTS_FILE)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        messages = json.load(f)["messages"]
+
+    start = time.perf_counter()
+    matcher = IntentMatcher.from_file(args.intents)
+    print(f"Compiled {len(matcher.intents)} intents in {(time.perf_counter() - start) * 1000:.2f} ms; "
+          f"{len(messages)} labelled messages")
+    routed_names = {intent.name for intent in matcher.intents if intent.route}
+
+    def matcher_routed(text: str) -> bool:
+        intent = matcher.classify(text)
+        return intent is not None and intent.route
+
+    def matcher_intent(text: str) -> Optional[str]:
+        intent = matcher.classify(text)
+        return intent.name if intent else None
+
+    evaluate("Substring scans (old)", messages, routed_names, legacy_routed, legacy_intent, args.repeat)
+    evaluate("IntentMatcher", messages, routed_names, matcher_routed, matcher_intent, args.repeat)
@@ -0,0 +1,117 @@
+"""Language routing benchmark: per-request overhead and Hinglish cache sharing
+
+1. Router cost: resolving the language, normalizing the question and
+   formatting the cached per-language prompts, per language, against
+   formatting the English prompts alone (the cost before languages were
+   honored). For scale it also reports retrieval latency on a small
+   synthetic corpus (model-free ``hash`` embeddings).
+2. Cache sharing: Hinglish questions written with random spelling variants
+   ("kya"/"kyaa"/"kia") and how many distinct embedding-cache keys they
+   produce with and without normalization - each distinct key is an
+   embedding computation.
+
+Usage: python bench_languages.py [--questions 2000] [--repeat 2000]
+"""
+import argparse
+import random
+import re
+import tempfile
+import time
+
+from bench_suite import percentiles
+from cache import normalize_text
+from languages import HINGLISH_VARIANTS, LANGUAGES, normalize_query, resolve_language
+from rag_chain import RAGChain
+from synthetic import WORDS, make_paragraphs
+
+
+TEMPLATES = [
+    "{topic} ke baare mein batao",
+    "{topic} kya hai",
+    "{topic} kyun zaroori hai",
+    "mujhe {topic} samjhao",
+    "{topic} kaise kaam karta hai",
+    "kaunsa {topic} sabse accha hai",
+    "{topic} ke liye kitne din chahiye",
+    "kya {topic} abhi bhi valid hai",
+]
+QUESTIONS = {
+    "english": "What does the travel policy say about expense reimbursement?",
+    "hindi": "यात्रा नीति में खर्च की प्रतिपूर्ति के बारे में क्या लिखा है?",
+    "hinglish": "Travel policy mein expense reimbursement ke bare me kyaa likha hai?",
+}
+
+
+def respell(text: str, rng: random.Random) -> str:
+    """Replace canonical Hinglish words with a random spelling variant"""
+    for canonical, variants in HINGLISH_VARIANTS.items():
+        text = re.sub(rf"\b{canonical}\b", lambda _: rng.choice([canonical] + variants), text)
+    return text
+
+
+def hinglish_questions(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        respell(rng.choice(TEMPLATES).format(topic=f"{rng.choice(WORDS)} policy"), rng)
+        for _ in range(count)
+    ]
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGChain(
+            persist_directory=persist_dir,
+            ollama_base_url="http://127.0.0.1:9",
+            probe_timeout=0.2,
+            background=False,
+            embedding_backend="hash",
+        )
+        paragraphs = make_paragraphs(500, words_per_paragraph=120)
+        rag.index_file(paragraphs, [{"page": i + 1} for i in range(len(paragraphs))], "corpus.pdf", "corpus", "corpus")
+        context = rag._build_context("", rag._retrieve(QUESTIONS["english"]))[0]
+
+        print("Per-request language routing (resolve + normalize + prompts):")
+        baseline = time_per_call(lambda: rag._llm_prompts(QUESTIONS["english"], context), args.repeat)
+        print(f"  english prompts only (before): {baseline:7.2f} us")
+        for language in LANGUAGES:
+            question = QUESTIONS[language]
+
+            def route():
+                resolved = resolve_language(language)
+                normalize_query(question, resolved)
+                rag._llm_prompts(question, context, "", resolved)
+
+            routed = time_per_call(route, args.repeat)
+            print(f"  {language:<8} routed:              {routed:7.2f} us  (+{routed - baseline:.2f} us)")
+
+        latencies = []
+        for language in LANGUAGES:
+            for _ in range(50):
+                rag.embedding_cache.clear()
+                start = time.perf_counter()
+                rag._retrieve(QUESTIONS[language], None, language)
+                latencies.append(time.perf_counter() - start)
+        print(f"  for scale, retrieval alone: p50 {percentiles(latencies)['p50_ms'] * 1000:.0f} us")
+        rag.ollama.close()
+
+    questions = hinglish_questions(args.questions)
+    raw_keys = {normalize_text(q) for q in questions}
+    normalized_keys = {RAGChain._query_key(normalize_query(q, "hinglish"), "hinglish") for q in questions}
+    print(f"\n{len(questions)} Hinglish questions with spelling variants "
+          f"({len(TEMPLATES)} templates x {len(WORDS)} topics):")
+    print(f"  embedding cache keys without normalization: {len(raw_keys):5d}  "
+          f"(hit rate {1 - len(raw_keys) / len(questions):6.1%})")
+    print(f"  embedding cache keys with normalization:    {len(normalized_keys):5d}  "
+          f"(hit rate {1 - len(normalized_keys) / len(questions):6.1%})")
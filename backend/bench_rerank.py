@@ -0,0 +1,104 @@
+"""Reranking benchmark: added retrieval latency against answer-context quality
+
+Indexes a synthetic corpus (model-free ``hash`` embeddings) and asks
+questions quoted from one known paragraph each. For plain retrieval and
+for reranking (cold, then with the score cache warm) it reports how often
+the source paragraph lands in the top-k context handed to the LLM
+(hit@k), its mean reciprocal rank, and the retrieval latency.
+
+The default ``overlap`` scorer needs no model download; pass
+``--backend onnx`` (or ``huggingface``) to measure the real cross-encoder.
+
+Usage: python bench_rerank.py [--backend overlap] [--budget-ms 250]
+                              [--candidates 30] [--paragraphs 400] [--questions 100]
+"""
+import argparse
+import random
+import tempfile
+import time
+from typing import List
+
+from bench_suite import percentiles
+from metrics import RERANKS
+from rag_chain import RAGChain
+from reranker import Reranker, create_scorer
+from synthetic import make_paragraphs
+
+
+def make_questions(paragraphs: List[str], count: int, words: int = 10, seed: int = 1):
+    """(question, index of the paragraph it quotes)"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        source = rng.randrange(len(paragraphs))
+        tokens = paragraphs[source].split()
+        start = rng.randrange(2, max(3, len(tokens) - words))
+        questions.append((" ".join(tokens[start:start + words]), source))
+    return questions
+
+
+def run(label: str, rag: RAGChain, questions) -> dict:
+    rag.embedding_cache.clear()
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for question, source in questions:
+        start = time.perf_counter()
+        docs = rag._retrieve(question)
+        latencies.append(time.perf_counter() - start)
+        pages = [doc.metadata.get("page") for doc in docs]
+        rank = pages.index(source + 1) + 1 if source + 1 in pages else None
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    timing = percentiles(latencies)
+    result = {
+        "hit_at_k": hits / len(questions),
+        "mrr": sum(reciprocal_ranks) / len(questions),
+        **timing,
+    }
+    print(f"{label}:")
+    print(f"  hit@{rag.top_k} {result['hit_at_k']:6.1%}  MRR {result['mrr']:.3f}  "
+          f"p50 {timing['p50_ms']:8.2f} ms  p95 {timing['p95_ms']:8.2f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="overlap")
+    parser.add_argument("--budget-ms", type=float, default=250)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--paragraphs", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        rag = RAGChain(
+            persist_directory=persist_dir,
+            ollama_base_url="http://127.0.0.1:9",
+            probe_timeout=0.2,
+            background=False,
+            embedding_backend="hash",
+            rerank_candidates=args.candidates,
+        )
+        paragraphs = make_paragraphs(args.paragraphs, words_per_paragraph=150)
+        rag.index_file(paragraphs, [{"page": i + 1} for i in range(len(paragraphs))], "corpus.pdf", "corpus", "corpus")
+        questions = make_questions(paragraphs, args.questions)
+        print(f"Corpus: {len(paragraphs)} chunks, {len(questions)} questions, top_k={rag.top_k}")
+
+        dense = run("Retrieval only", rag, questions)
+
+        # Ceiling for reranking: how often the source paragraph is a candidate at all
+        rag.top_k, top_k = args.candidates, rag.top_k
+        in_pool = sum(
+            (source + 1) in [doc.metadata.get("page") for doc in rag._retrieve(question)]
+            for question, source in questions
+        )
+        rag.top_k = top_k
+        print(f"Source paragraph among the {args.candidates} candidates: {in_pool / len(questions):.1%}")
+
+        rag.reranker = Reranker(lambda: create_scorer(args.backend), budget_seconds=args.budget_ms / 1000)
+        rag.reranker.load()
+        cold = run(f"Reranked ({args.backend}, cold cache)", rag, questions)
+        warm = run(f"Reranked ({args.backend}, warm cache)", rag, questions)
+        print(f"Added p50 latency: {cold['p50_ms'] - dense['p50_ms']:.2f} ms cold, "
+              f"{warm['p50_ms'] - dense['p50_ms']:.2f} ms warm; "
+              f"budget exceeded {RERANKS.value(result='timeout'):.0f} times")
@@ -0,0 +1,35 @@
+"""Startup-time benchmark for RAGChain against a local stand-in Ollama server"""
+import tempfile
+import time
+
+from fake_ollama import start_fake_ollama
+from rag_chain import RAGChain
+
+
+def measure(label: str, base_url: str):
+    with tempfile.TemporaryDirectory() as persist_dir:
+        start = time.perf_counter()
+        rag = RAGChain(persist_directory=persist_dir, ollama_base_url=base_url, probe_timeout=2.0)
+        constructed = time.perf_counter() - start
+
+        rag._llm_probed.wait()
+        probed = time.perf_counter() - start
+
+        rag._warmed_up.wait()
+        ready = time.perf_counter() - start
+
+    print(f"{label}:")
+    print(f"  constructor returned: {constructed * 1000:8.1f} ms")
+    print(f"  Ollama probe done:    {probed * 1000:8.1f} ms (available={rag.ollama_available})")
+    print(f"  warm-up finished:     {ready * 1000:8.1f} ms (ready={rag.ready}, failed: {sorted(rag.warm_up_errors)})")
+
+
+if __name__ == "__main__":
+    server = start_fake_ollama()
+    host, port = server.server_address
+    measure("Stand-in Ollama (llama3 installed)", f"http://{host}:{port}")
+    server.shutdown()
+    server.server_close()
+
+    # Nothing listens on the closed port - the probe must fail fast
+    measure("Dead Ollama host", f"http://{host}:{port}")
@@ -0,0 +1,404 @@
+"""Benchmark suite: ingestion, retrieval, /chat under load and chat history writes
+
+Everything runs offline and deterministically: documents come from the
+synthetic corpus generators, embeddings from the model-free ``hash``
+backend and answers from the stand-in Ollama in fake_ollama.py. The /chat
+load test starts the real app under uvicorn in a scratch directory and
+drives it over HTTP with concurrent clients.
+
+Results are written as JSON; pass an earlier result file with --compare
+to print the change of every number.
+
+Usage: python bench_suite.py [--only ingestion,retrieval,chat,history]
+                             [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List
+
+from synthetic import WORDS, make_paragraphs, write_document
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SECTIONS = ("ingestion", "retrieval", "chat", "history")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean in milliseconds (nearest-rank)"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "p50_ms": round(rank(50) * 1000, 3),
+        "p95_ms": round(rank(95) * 1000, 3),
+        "p99_ms": round(rank(99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def make_questions(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [f"What does the {' '.join(rng.sample(WORDS, 3))} section say? ({i})" for i in range(count)]
+
+
+def make_rag(persist_directory: str):
+    from rag_chain import RAGChain
+    # Port 9 (discard) refuses at once, so the LLM probe doesn't wait
+    return RAGChain(
+        persist_directory=persist_directory,
+        ollama_base_url="http://127.0.0.1:9",
+        probe_timeout=0.2,
+        background=False,
+        embedding_backend="hash",
+    )
+
+
+# -------------------------------------------------------
+# INGESTION - extract, chunk, embed and index per format
+# -------------------------------------------------------
+def bench_ingestion(num_files: int, pages_per_file: int) -> dict:
+    from document_processor import DocumentProcessor
+
+    results = {}
+    processor = DocumentProcessor()
+    try:
+        for ext in (".pdf", ".docx", ".pptx", ".txt"):
+            with tempfile.TemporaryDirectory() as workdir:
+                paths = []
+                for i in range(num_files):
+                    path = os.path.join(workdir, f"doc_{i}{ext}")
+                    write_document(path, make_paragraphs(pages_per_file, words_per_paragraph=300, seed=i))
+                    paths.append(path)
+
+                rag = make_rag(os.path.join(workdir, "vectorstore"))
+                chunks = 0
+                start = time.perf_counter()
+                for i, path in enumerate(paths):
+                    texts, metadata = processor.process_chunks(path, ext)
+                    result = rag.index_file(texts, metadata, os.path.basename(path), f"file-{i}", f"hash-{i}")
+                    chunks += result["added"]
+                rag.flush()
+                elapsed = time.perf_counter() - start
+                rag.ollama.close()
+
+            pages = num_files * pages_per_file
+            results[ext.lstrip(".")] = {
+                "files": num_files,
+                "pages": pages,
+                "chunks": chunks,
+                "seconds": round(elapsed, 3),
+                "pages_per_s": round(pages / elapsed, 1),
+                "chunks_per_s": round(chunks / elapsed, 1),
+            }
+            print(f"  ingestion {ext:<6} {results[ext.lstrip('.')]}")
+    finally:
+        processor.shutdown()
+    return results
+
+
+# -------------------------------------------------------
+# RETRIEVAL - hybrid search latency vs corpus size
+# -------------------------------------------------------
+def bench_retrieval(sizes: List[int], num_queries: int) -> dict:
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            rag = make_rag(workdir)
+            texts = make_paragraphs(size, words_per_paragraph=120, seed=size)
+            start = time.perf_counter()
+            rag.add_documents(texts, [{"source": f"synthetic-{i // 50}"} for i in range(size)])
+            index_seconds = time.perf_counter() - start
+
+            questions = make_questions(num_queries, seed=size)
+            rag._retrieve(questions[0])  # warm-up
+            latencies = []
+            for question in questions[1:]:
+                start = time.perf_counter()
+                rag._retrieve(question)
+                latencies.append(time.perf_counter() - start)
+
+            # No-LLM mode: sentence index search plus citations
+            rag.flush()
+            extractive = []
+            for question in questions[1:]:
+                start = time.perf_counter()
+                rag._extractive_answer(question)
+                extractive.append(time.perf_counter() - start)
+            rag.ollama.close()
+
+        results[str(size)] = {
+            "chunks": size,
+            "index_seconds": round(index_seconds, 3),
+            **percentiles(latencies),
+            "extractive": percentiles(extractive),
+        }
+        print(f"  retrieval {size:>7} chunks {results[str(size)]}")
+    return results
+
+
+# -------------------------------------------------------
+# CHAT - the real app over HTTP under concurrent load
+# -------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1) as response:
+                if json.load(response).get("ready"):
+                    return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Backend did not become ready")
+
+
+async def _load(base_url: str, questions: List[str], concurrency: int) -> dict:
+    import aiohttp
+
+    queue = asyncio.Queue()
+    for item in enumerate(questions):
+        queue.put_nowait(item)
+    latencies, errors = [], 0
+
+    async def client(worker: int, session):
+        nonlocal errors
+        while not queue.empty():
+            index, question = queue.get_nowait()
+            payload = {"question": question, "session_id": f"load-{worker}"}
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{base_url}/chat", json=payload) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(worker, session) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(questions),
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+
+def bench_chat(num_requests: int, concurrency_levels: List[int], llm_latency: float, corpus_pages: int) -> dict:
+    from fake_ollama import start_fake_ollama
+
+    ollama = start_fake_ollama(latency=llm_latency)
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    results = {"llm_latency_ms": llm_latency * 1000}
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "EMBEDDING_BACKEND": "hash",
+            "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama.server_address[1]}",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(base_url)
+            corpus = os.path.join(workdir, "corpus.txt")
+            write_document(corpus, make_paragraphs(corpus_pages, words_per_paragraph=300))
+            with open(corpus, "rb") as f:
+                body, boundary = _multipart("corpus.txt", f.read())
+            request = urllib.request.Request(
+                f"{base_url}/upload", data=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            )
+            with urllib.request.urlopen(request) as response:
+                job_id = json.load(response)["job_id"]
+            while True:
+                with urllib.request.urlopen(f"{base_url}/jobs/{job_id}") as response:
+                    job = json.load(response)
+                if job["status"] in ("completed", "failed"):
+                    break
+                time.sleep(0.1)
+
+            for level, concurrency in enumerate(concurrency_levels):
+                # Fresh questions per level so answers never come from the cache
+                questions = make_questions(num_requests, seed=1000 + level)
+                results[f"concurrency_{concurrency}"] = asyncio.run(_load(base_url, questions, concurrency))
+                print(f"  chat concurrency {concurrency:>3} {results[f'concurrency_{concurrency}']}")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            ollama.shutdown()
+            ollama.server_close()
+    results["llm_generations"] = ollama.generate_calls
+    return results
+
+
+def _multipart(filename: str, content: bytes):
+    boundary = "bench-suite-boundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, boundary
+
+
+# -------------------------------------------------------
+# HISTORY - chat history write throughput
+# -------------------------------------------------------
+def bench_history(num_sessions: int, messages_per_session: int, writers: int) -> dict:
+    from chat_history import ChatHistoryManager
+
+    answer = "This is a synthetic answer. " * 20
+    with tempfile.TemporaryDirectory() as history_dir:
+        manager = ChatHistoryManager(history_dir=history_dir)
+        writes = num_sessions * messages_per_session
+        start = time.perf_counter()
+        for turn in range(messages_per_session):
+            for s in range(num_sessions):
+                manager.save_message(f"session-{s}", f"Question {turn}?", answer, "english")
+        sequential = time.perf_counter() - start
+
+        per_writer = writes // writers
+        threads = [
+            threading.Thread(target=lambda t=t: [
+                manager.save_message(f"writer-{t}", f"q{i}", answer, "english") for i in range(per_writer)
+            ])
+            for t in range(writers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent = time.perf_counter() - start
+
+    results = {
+        "sequential": {"writes": writes, "writes_per_s": round(writes / sequential, 1)},
+        "concurrent": {"writers": writers, "writes": per_writer * writers,
+                       "writes_per_s": round(per_writer * writers / concurrent, 1)},
+    }
+    print(f"  history {results}")
+    return results
+
+
+# -------------------------------------------------------
+# RESULTS
+# -------------------------------------------------------
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _flatten(data: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict):
+    """Print every number that exists in both result files with its change"""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    print(f"\nChange vs {baseline['meta'].get('commit') or 'baseline'}:")
+    for name in sorted(old.keys() & new.keys()):
+        change = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else "n/a"
+        print(f"  {name:<50} {old[name]:>12} -> {new[name]:>12}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(SECTIONS), help="comma-separated sections to run")
+    parser.add_argument("--output", help="write results JSON here (default: print it)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--files", type=int, default=4, help="ingestion: files per format")
+    parser.add_argument("--pages", type=int, default=20, help="ingestion: pages per file")
+    parser.add_argument("--sizes", default="1000,10000", help="retrieval: corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200, help="retrieval: queries per corpus size")
+    parser.add_argument("--requests", type=int, default=200, help="chat: requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="chat: concurrent clients per level")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="chat: fake LLM latency in seconds")
+    parser.add_argument("--sessions", type=int, default=100, help="history: sessions")
+    parser.add_argument("--messages", type=int, default=20, help="history: messages per session")
+    args = parser.parse_args()
+
+    sections = [s for s in args.only.split(",") if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for section in sections:
+        print(f"[{section}]")
+        if section == "ingestion":
+            results[section] = bench_ingestion(args.files, args.pages)
+        elif section == "retrieval":
+            results[section] = bench_retrieval([int(s) for s in args.sizes.split(",")], args.queries)
+        elif section == "chat":
+            results[section] = bench_chat(
+                args.requests, [int(c) for c in args.concurrency.split(",")], args.llm_latency, corpus_pages=50
+            )
+        elif section == "history":
+            results[section] = bench_history(args.sessions, args.messages, writers=8)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
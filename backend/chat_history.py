@@ -1,80 +1,219 @@
 import os
 import json
+import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
-import uuid
+from typing import List, Dict, Optional, Tuple
 
 
 class ChatHistoryManager:
-    def __init__(self):
-        self.history_dir = "chat_history"
+    """Chat history stored in SQLite (WAL mode).
+
+    Each message is one appended row and the session list is read from a
+    summary table that is updated in the same transaction, so saving a turn
+    costs the same regardless of conversation length and concurrent writers
+    for one session can't lose messages. Legacy ``{session_id}.json`` files
+    found in the history directory are imported on startup.
+    """
+
+    def __init__(self, history_dir: str = "chat_history", db_path: Optional[str] = None):
+        self.history_dir = history_dir
         os.makedirs(self.history_dir, exist_ok=True)
-    
+        self.db_path = db_path or os.path.join(self.history_dir, "chat_history.db")
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                language TEXT,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+            """
+        )
+        self._migrate_json_files()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; writers wait on the lock instead of failing"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _append(self, conn: sqlite3.Connection, session_id: str, message: Dict, created_at: Optional[str] = None):
+        conn.execute(
+            "INSERT INTO messages (session_id, question, answer, language, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (session_id, message["question"], message["answer"], message.get("language"), message["timestamp"])
+        )
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, created_at, updated_at, message_count) VALUES (?, ?, ?, 1)
+            ON CONFLICT(session_id) DO UPDATE SET
+                updated_at = excluded.updated_at,
+                message_count = message_count + 1
+            """,
+            (session_id, created_at or message["timestamp"], message["timestamp"])
+        )
+
     def save_message(self, session_id: str, question: str, answer: str, language: str):
         """Save a chat message to history"""
-        history_file = os.path.join(self.history_dir, f"{session_id}.json")
-        
-        # Load existing history
-        if os.path.exists(history_file):
-            with open(history_file, "r", encoding="utf-8") as f:
-                history = json.load(f)
-        else:
-            history = {
-                "session_id": session_id,
-                "created_at": datetime.now().isoformat(),
-                "messages": []
-            }
-        
-        # Add new message
         message = {
             "question": question,
             "answer": answer,
             "language": language,
             "timestamp": datetime.now().isoformat()
         }
-        history["messages"].append(message)
-        history["updated_at"] = datetime.now().isoformat()
-        
-        # Save history
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-    
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._append(conn, session_id, message)
+
     def get_history(self, session_id: str) -> List[Dict]:
         """Get chat history for a session"""
-        history_file = os.path.join(self.history_dir, f"{session_id}.json")
-        
-        if os.path.exists(history_file):
-            with open(history_file, "r", encoding="utf-8") as f:
-                history = json.load(f)
-            return history.get("messages", [])
-        return []
-    
+        messages, _ = self.get_messages(session_id)
+        return messages
+
+    def get_messages(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        updated_since: Optional[str] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """Get a page of messages (oldest first) and whether more exist.
+
+        ``before``/``after`` are message ids used as cursors. With ``after``
+        the page continues forward from that message; otherwise it holds the
+        newest messages older than ``before`` (or the newest overall).
+        ``updated_since`` keeps only messages newer than that ISO timestamp.
+        """
+        clauses = ["session_id = ?"]
+        params = [session_id]
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        if after is not None:
+            clauses.append("id > ?")
+            params.append(after)
+        if updated_since:
+            clauses.append("timestamp > ?")
+            params.append(updated_since)
+
+        forward = after is not None
+        query = (
+            "SELECT id, question, answer, language, timestamp FROM messages WHERE "
+            + " AND ".join(clauses)
+            + (" ORDER BY id" if forward or limit is None else " ORDER BY id DESC")
+        )
+        if limit is not None:
+            # Fetch one extra row to learn whether another page exists
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = [dict(row) for row in self._connect().execute(query, params).fetchall()]
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit] if limit is not None else rows
+        if limit is not None and not forward:
+            rows.reverse()
+        return rows, has_more
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        """Get the summary row for one session"""
+        row = self._connect().execute(
+            "SELECT session_id, created_at, updated_at, message_count FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
     def get_all_sessions(self) -> List[Dict]:
-        """Get all chat sessions"""
-        sessions = []
-        
-        for filename in os.listdir(self.history_dir):
-            if filename.endswith(".json"):
-                session_id = filename[:-5]  # Remove .json extension
-                history_file = os.path.join(self.history_dir, filename)
-                
-                with open(history_file, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-                
-                sessions.append({
-                    "session_id": session_id,
-                    "created_at": history.get("created_at"),
-                    "updated_at": history.get("updated_at"),
-                    "message_count": len(history.get("messages", []))
-                })
-        
-        # Sort by updated_at (most recent first)
-        sessions.sort(key=lambda x: x.get("updated_at", ""), reverse=True)
+        """Get all chat sessions (most recently updated first)"""
+        sessions, _ = self.list_sessions()
         return sessions
-    
+
+    def list_sessions(
+        self,
+        limit: Optional[int] = None,
+        before: Optional[Tuple[str, str]] = None,
+        updated_since: Optional[str] = None,
+    ) -> Tuple[List[Dict], bool]:
+        """Get a page of sessions, most recently updated first.
+
+        ``before`` is the (updated_at, session_id) of the last session on the
+        previous page.
+        """
+        clauses = []
+        params = []
+        if before is not None:
+            clauses.append("(updated_at < ? OR (updated_at = ? AND session_id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        if updated_since:
+            clauses.append("updated_at > ?")
+            params.append(updated_since)
+
+        query = "SELECT session_id, created_at, updated_at, message_count FROM sessions"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY updated_at DESC, session_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = [dict(row) for row in self._connect().execute(query, params).fetchall()]
+        has_more = limit is not None and len(rows) > limit
+        return (rows[:limit] if limit is not None else rows), has_more
+
+    def sessions_version(self) -> Tuple[int, Optional[str]]:
+        """(session count, latest updated_at) - changes whenever the session list does"""
+        row = self._connect().execute(
+            "SELECT COUNT(*), MAX(updated_at) FROM sessions"
+        ).fetchone()
+        return row[0], row[1]
+
     def delete_session(self, session_id: str):
         """Delete a chat session"""
-        history_file = os.path.join(self.history_dir, f"{session_id}.json")
-        if os.path.exists(history_file):
-            os.remove(history_file)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    # -------------------------------------------------------
+    # MIGRATION FROM PER-SESSION JSON FILES
+    # -------------------------------------------------------
+    def _migrate_json_files(self):
+        """Import legacy {session_id}.json files, renaming each to .json.migrated"""
+        conn = self._connect()
+        for filename in os.listdir(self.history_dir):
+            if not filename.endswith(".json"):
+                continue
+            session_id = filename[:-5]  # Remove .json extension
+            history_file = os.path.join(self.history_dir, filename)
+            try:
+                with open(history_file, "r", encoding="utf-8") as f:
+                    history = json.load(f)
+            except Exception as e:
+                print(f"Chat history migration error ({filename}): {e}")
+                continue
 
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for message in history.get("messages", []):
+                    self._append(conn, session_id, message, created_at=history.get("created_at"))
+            os.replace(history_file, history_file + ".migrated")
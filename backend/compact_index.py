@@ -0,0 +1,339 @@
+import json
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class CompactVectorIndex:
+    """Int8-quantized IVF vector index in memory-mapped files, with exact rerank.
+
+    Every vector is stored twice in append-only files: as int8 codes with a
+    per-vector scale (``dim + 8`` bytes) and as float32, which is only read
+    for the few rerank candidates so those pages stay on disk. Once there
+    are ``train_min_rows`` vectors they are clustered with k-means into
+    inverted lists, and a query only scans the codes of its ``nprobe``
+    nearest lists. Candidates are scored approximately by squared L2
+    distance - the metric Chroma uses - and the best ``k * rerank_factor``
+    are reranked exactly against the float32 vectors.
+    """
+
+    _ROW_FILES = ("codes.i8", "scales.f32", "norms.f32", "vectors.f32")
+
+    def __init__(
+        self,
+        directory: str,
+        rerank_factor: int = 8,
+        nprobe: int = 16,
+        max_lists: int = 1024,
+        train_min_rows: int = 10000,
+    ):
+        self.directory = directory
+        self.rerank_factor = rerank_factor
+        self.nprobe = nprobe
+        self.max_lists = max_lists
+        self.train_min_rows = train_min_rows
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+        meta = self._read_meta()
+        self.dim = meta.get("dim")
+        self._deleted = set(meta.get("deleted", []))
+        self._trained_rows = meta.get("trained_rows", 0)
+
+        self._ids = []
+        ids_path = self._path("ids.txt")
+        if os.path.exists(ids_path):
+            with open(ids_path, "r", encoding="utf-8") as f:
+                self._ids = [line.rstrip("\n") for line in f]
+        self._persisted = self._open_files(len(self._ids))
+        if len(self._ids) > self._persisted:
+            self._ids = self._ids[:self._persisted]
+            with open(ids_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id in self._ids))
+        self._rows = {chunk_id: n for n, chunk_id in enumerate(self._ids)}
+
+        self._centroids = None
+        self._lists = None
+        self._members = None
+        if os.path.exists(self._path("centroids.npy")) and self._persisted:
+            self._centroids = np.load(self._path("centroids.npy"))
+            self._load_lists()
+
+        # Rows added since the last flush, kept in memory and always scanned
+        self._pending_codes = []
+        self._pending_scales = []
+        self._pending_norms = []
+        self._pending_vectors = []
+        self._deleted_mask = None
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        row = self._rows.get(chunk_id)
+        return row is not None and row not in self._deleted
+
+    def ids(self) -> set:
+        """IDs of the vectors in the index (deleted ones excluded)"""
+        with self._lock:
+            return {chunk_id for chunk_id, row in self._rows.items() if row not in self._deleted}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self) -> dict:
+        path = self._path("meta.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _write_meta(self):
+        path = self._path("meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "deleted": sorted(self._deleted),
+                "trained_rows": self._trained_rows,
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    def _open_files(self, rows: int) -> int:
+        """Memory-map the persisted arrays; returns the number of complete rows"""
+        self._codes = self._scales = self._norms = None
+        if not self.dim or not os.path.exists(self._path("vectors.f32")):
+            return 0
+        # A crash can leave some files longer than others - cut every file
+        # back to the rows present in all of them before appending again
+        row_bytes = dict(zip(self._ROW_FILES, (self.dim, 4, 4, 4 * self.dim)))
+        count = min([rows] + [os.path.getsize(self._path(name)) // size for name, size in row_bytes.items()])
+        for name, size in row_bytes.items():
+            if os.path.getsize(self._path(name)) > count * size:
+                os.truncate(self._path(name), count * size)
+        if count == 0:
+            return 0
+        self._codes = np.memmap(self._path("codes.i8"), dtype=np.int8, mode="r", shape=(count, self.dim))
+        self._scales = np.memmap(self._path("scales.f32"), dtype=np.float32, mode="r", shape=(count,))
+        self._norms = np.memmap(self._path("norms.f32"), dtype=np.float32, mode="r", shape=(count,))
+        return count
+
+    def _all_vectors(self) -> np.ndarray:
+        """Temporary mapping of every persisted float32 vector (training only)"""
+        return np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(self._persisted, self.dim))
+
+    def _read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Read float32 rows with plain reads rather than a mapping, so the
+        rerank copy never becomes resident (a page fault maps a whole
+        neighbourhood of pages for every scattered row)"""
+        row_bytes = 4 * self.dim
+        chunks = []
+        with open(self._path("vectors.f32"), "rb", buffering=0) as f:
+            for row in rows:
+                f.seek(int(row) * row_bytes)
+                chunks.append(f.read(row_bytes))
+        return np.frombuffer(b"".join(chunks), dtype=np.float32).reshape(len(rows), self.dim)
+
+    def _load_lists(self):
+        path = self._path("lists.i32")
+        lists = np.fromfile(path, dtype=np.int32) if os.path.exists(path) else np.zeros(0, np.int32)
+        if len(lists) != self._persisted:
+            # Assignments lost in a crash are recomputed from the vectors
+            lists = self._assign(self._all_vectors())
+            self._write_lists(lists)
+        self._lists = lists
+        self._members = None
+
+    def _write_lists(self, lists: np.ndarray):
+        path = self._path("lists.i32")
+        lists.astype(np.int32).tofile(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Symmetric per-vector int8 quantization: vector ~= codes * scale"""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    # -------------------------------------------------------
+    # INVERTED LISTS (k-means coarse quantizer)
+    # -------------------------------------------------------
+    def _assign(self, vectors, centroids: Optional[np.ndarray] = None, block_rows: int = 65536) -> np.ndarray:
+        centroids = self._centroids if centroids is None else centroids
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            lists[start:start + len(block)] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+        return lists
+
+    def _target_lists(self) -> int:
+        return int(min(self.max_lists, 4 * np.sqrt(self._persisted)))
+
+    def _wants_training(self) -> bool:
+        if self._persisted < self.train_min_rows:
+            return False
+        if self._centroids is None:
+            return True
+        # Retrain after large growth, until the list count reaches max_lists
+        return len(self._centroids) < self._target_lists() and self._persisted >= 8 * self._trained_rows
+
+    def _train(self, iterations: int = 10):
+        nlist = self._target_lists()
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(self._persisted, min(self._persisted, 64 * nlist), replace=False))
+        vectors = self._all_vectors()
+        data = np.asarray(vectors[sample])
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._assign(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self._centroids = centroids.astype(np.float32)
+        np.save(self._path("centroids.npy"), self._centroids)
+        self._lists = self._assign(vectors)
+        self._write_lists(self._lists)
+        self._members = None
+        self._trained_rows = self._persisted
+
+    def _list_members(self) -> List[np.ndarray]:
+        if self._members is None:
+            order = np.argsort(self._lists, kind="stable")
+            bounds = np.searchsorted(self._lists[order], np.arange(len(self._centroids) + 1))
+            self._members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+        return self._members
+
+    # -------------------------------------------------------
+    # WRITES
+    # -------------------------------------------------------
+    def add(self, chunk_ids: List[str], embeddings: List[List[float]]):
+        if not chunk_ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            keep = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in self]
+            if not keep:
+                return
+            vectors = vectors[keep]
+            codes, scales = self.quantize(vectors)
+            for i in keep:
+                self._rows[chunk_ids[i]] = len(self._ids)
+                self._ids.append(chunk_ids[i])
+            self._pending_codes.append(codes)
+            self._pending_scales.append(scales)
+            self._pending_norms.append(np.einsum("ij,ij->i", vectors, vectors))
+            self._pending_vectors.append(vectors)
+            self._deleted_mask = None
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            # Tombstones are row numbers, so a re-added chunk gets a fresh row
+            self._deleted.update(self._rows[c] for c in chunk_ids if c in self._rows)
+            self._deleted_mask = None
+
+    def flush(self):
+        """Append pending rows to the files, (re)train the lists when due, persist tombstones"""
+        with self._lock:
+            if self._pending_vectors:
+                pending = (self._pending_codes, self._pending_scales, self._pending_norms, self._pending_vectors)
+                for name, parts in zip(self._ROW_FILES, pending):
+                    with open(self._path(name), "ab") as f:
+                        for part in parts:
+                            part.tofile(f)
+                with open(self._path("ids.txt"), "a", encoding="utf-8") as f:
+                    f.write("".join(f"{chunk_id}\n" for chunk_id in self._ids[self._persisted:]))
+                if self._centroids is not None:
+                    new_lists = self._assign(np.concatenate(self._pending_vectors))
+                    with open(self._path("lists.i32"), "ab") as f:
+                        new_lists.tofile(f)
+                    self._lists = np.concatenate([self._lists, new_lists])
+                    self._members = None
+                self._pending_codes = []
+                self._pending_scales = []
+                self._pending_norms = []
+                self._pending_vectors = []
+                self._persisted = self._open_files(len(self._ids))
+
+            if self._wants_training():
+                self._train()
+            if self.dim is not None:
+                self._write_meta()
+
+    # -------------------------------------------------------
+    # SEARCH
+    # -------------------------------------------------------
+    def search(self, embedding: List[float], k: int = 4) -> List[Tuple[str, float]]:
+        """Return up to k (chunk_id, squared L2 distance) pairs, nearest first"""
+        return self.search_many([embedding], k)[0]
+
+    def search_many(self, embeddings: List[List[float]], k: int = 4) -> List[List[Tuple[str, float]]]:
+        queries = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if len(self) == 0:
+                return [[] for _ in embeddings]
+            if self._deleted_mask is None:
+                self._deleted_mask = np.zeros(len(self._ids), dtype=bool)
+                self._deleted_mask[list(self._deleted)] = True
+            pending = None
+            if self._pending_vectors:
+                pending = tuple(np.concatenate(part) for part in (
+                    self._pending_codes, self._pending_scales, self._pending_norms, self._pending_vectors
+                ))
+            return [self._search_one(query, k, pending) for query in queries]
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        """Persisted rows to scan: members of the nearest lists, or all rows before training"""
+        if self._persisted == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._centroids is None:
+            return np.arange(self._persisted)
+        centroids = self._centroids
+        distances = np.einsum("ij,ij->i", centroids, centroids) - 2 * centroids @ query
+        nprobe = min(self.nprobe, len(centroids))
+        probe = np.argpartition(distances, nprobe - 1)[:nprobe]
+        members = self._list_members()
+        return np.sort(np.concatenate([members[i] for i in probe]))
+
+    def _search_one(self, query: np.ndarray, k: int, pending) -> List[Tuple[str, float]]:
+        # Approximate pass: ||v||^2 - 2 q.v with v decoded from the int8 codes
+        rows = self._candidate_rows(query)
+        approx = np.zeros(0, dtype=np.float32)
+        if len(rows):
+            dots = np.asarray(self._codes[rows], dtype=np.float32) @ query
+            approx = self._norms[rows] - 2 * dots * self._scales[rows]
+        if pending is not None:
+            codes, scales, norms, _ = pending
+            rows = np.concatenate([rows, np.arange(self._persisted, self._persisted + len(codes))])
+            approx = np.concatenate([approx, norms - 2 * (codes.astype(np.float32) @ query) * scales])
+
+        live = ~self._deleted_mask[rows]
+        rows, approx = rows[live], approx[live]
+        if not len(rows):
+            return []
+        candidates = min(len(rows), k * self.rerank_factor)
+        shortlist = np.sort(rows[np.argpartition(approx, candidates - 1)[:candidates]])
+
+        # Exact pass on the float32 vectors of the shortlist only
+        stored = shortlist[shortlist < self._persisted]
+        fresh = shortlist[shortlist >= self._persisted]
+        vectors = []
+        if len(stored):
+            vectors.append(self._read_vectors(stored))
+        if len(fresh):
+            vectors.append(pending[3][fresh - self._persisted])
+        diff = np.concatenate(vectors) - query
+        distances = np.einsum("ij,ij->i", diff, diff)
+        best = np.argsort(distances)[:k]
+        return [(self._ids[shortlist[i]], float(distances[i])) for i in best]
@@ -0,0 +1,110 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+
+_SENTENCE_END = re.compile(r"[.!?।]\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def _overlap(left: str, right: str, min_overlap: int, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    longest = min(len(left), len(right), max_overlap)
+    for size in range(longest, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextBuilder:
+    """Assembles retrieved chunks into a prompt context under a token budget.
+
+    Chunks are taken in ranking order (best first). Text already present in
+    a chosen chunk is dropped: whole duplicates and contained chunks are
+    skipped, and the span a chunk shares with the start or end of another
+    chosen chunk (the splitter's chunk overlap) is trimmed. The chunk that
+    crosses the budget is cut at a sentence boundary.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        min_overlap: int = 20,
+        max_overlap: int = 400,
+        min_tail_tokens: int = 40,
+        separator: str = "\n\n",
+    ):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.min_tail_tokens = min_tail_tokens
+        self.separator = separator
+
+    def _dedupe(self, text: str, chosen: List[str]) -> str:
+        for previous in chosen:
+            if text in previous:
+                return ""
+            head = _overlap(previous, text, self.min_overlap, self.max_overlap)
+            if head:
+                text = text[head:]
+            tail = _overlap(text, previous, self.min_overlap, self.max_overlap)
+            if tail:
+                text = text[:-tail]
+        return text.strip()
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """Cut text to roughly budget tokens, preferring a sentence boundary"""
+        if budget <= 0:
+            return ""
+        ratio = budget / max(1, self.count_tokens(text))
+        cut = text[:int(len(text) * ratio)]
+        ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+        if ends and ends[-1] > len(cut) // 2:
+            cut = cut[:ends[-1]]
+        return cut.strip()
+
+    def build(self, docs: List[Document], max_tokens: Optional[int] = None) -> Tuple[str, dict]:
+        """Return (context, stats) for docs given best first"""
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        separator_tokens = self.count_tokens(self.separator)
+        raw_tokens = sum(self.count_tokens(doc.page_content or "") for doc in docs)
+        chosen = []
+        used = 0
+
+        for doc in docs:
+            text = (doc.page_content or "").strip()
+            if not text:
+                continue
+
+            text = self._dedupe(text, chosen)
+            if not text:
+                continue
+
+            cost = self.count_tokens(text) + (separator_tokens if chosen else 0)
+            if used + cost > budget:
+                remaining = budget - used - (separator_tokens if chosen else 0)
+                if remaining >= self.min_tail_tokens:
+                    tail = self._truncate(text, remaining)
+                    if tail:
+                        chosen.append(tail)
+                        used += self.count_tokens(tail) + (separator_tokens if len(chosen) > 1 else 0)
+                break
+
+            chosen.append(text)
+            used += cost
+
+        context = self.separator.join(chosen)
+        stats = {
+            "chunks_retrieved": len(docs),
+            "chunks_used": len(chosen),
+            "raw_tokens": raw_tokens,
+            "context_tokens": self.count_tokens(context) if context else 0,
+        }
+        return context, stats
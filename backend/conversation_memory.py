@@ -0,0 +1,152 @@
+import re
+from typing import List, Optional
+
+from cache import LRUCache
+from chat_history import ChatHistoryManager
+from context_builder import estimate_tokens
+from keyword_index import tokenize
+
+
+# Words that make a question lean on the previous turn ("what about its cost?")
+_REFERRING_WORDS = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their",
+    "he", "she", "his", "her", "there", "same", "above", "previous", "earlier",
+    "ye", "yeh", "wo", "woh", "iska", "uska", "iske", "uske", "isme", "usme",
+}
+_FOLLOW_UP_OPENERS = ("and ", "what about", "how about", "also", "then ", "so ", "aur ")
+
+# Left out of the terms carried over from the previous question
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "of", "in",
+    "on", "at", "to", "for", "from", "by", "with", "and", "or", "what", "which", "who",
+    "how", "why", "when", "where", "can", "could", "would", "should", "tell", "me", "about",
+    "please", "you", "your", "i", "my", "we", "our", "say", "says", "give", "explain",
+} | _REFERRING_WORDS
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?।])(\s|$)", re.S)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+class ConversationContext:
+    """What one question needs from its session: the recent turns, the
+    rolling summary of older turns and the prompt prefix built from both."""
+
+    def __init__(self, turns: List[dict], summary: List[str], prefix: str, max_carry_terms: int = 8):
+        self.turns = turns
+        self.summary = summary
+        self.prefix = prefix
+        self.max_carry_terms = max_carry_terms
+
+    @staticmethod
+    def is_follow_up(question: str) -> bool:
+        # Only a referring word or opener counts: short questions are often
+        # complete on their own ("What is the refund policy?")
+        return (
+            any(w in _REFERRING_WORDS for w in tokenize(question))
+            or question.lower().lstrip().startswith(_FOLLOW_UP_OPENERS)
+        )
+
+    def search_query(self, question: str) -> str:
+        """The question to retrieve with: follow-ups carry over the key
+        terms of the previous question so "and what about page 3?" still
+        finds the document the conversation is about."""
+        if not self.turns or not self.is_follow_up(question):
+            return question
+        asked = set(tokenize(question))
+        carried = []
+        for word in tokenize(self.turns[-1]["question"]):
+            if len(word) > 2 and word not in _STOPWORDS and word not in asked and word not in carried:
+                carried.append(word)
+        if not carried:
+            return question
+        return f"{question} {' '.join(carried[:self.max_carry_terms])}"
+
+
+class ConversationMemory:
+    """Session context for follow-up questions, read from the chat history.
+
+    Keeps the last ``recent_turns`` turns verbatim and a rolling summary of
+    up to ``summary_turns`` older turns, one line per turn. Summaries are
+    cached per session and extended incrementally: each call only reads
+    the turns that slid out of the recent window since the last call, so
+    the cost - and the prompt prefix, capped at ``max_tokens`` - stays the
+    same however long the conversation gets.
+    """
+
+    def __init__(
+        self,
+        history: ChatHistoryManager,
+        recent_turns: int = 3,
+        summary_turns: int = 8,
+        max_tokens: int = 400,
+        max_sessions: int = 1024,
+    ):
+        self.history = history
+        self.recent_turns = recent_turns
+        self.summary_turns = summary_turns
+        self.max_tokens = max_tokens
+        # session_id -> (id of the last summarized message, summary lines)
+        self.summaries = LRUCache(maxsize=max_sessions)
+
+    @staticmethod
+    def _summarize_turn(message: dict) -> str:
+        answer = message["answer"].strip()
+        match = _FIRST_SENTENCE.match(answer)
+        first = match.group(1) if match else answer
+        return f"- Asked: {_clip(message['question'], 100)} Answer: {_clip(first, 160)}"
+
+    def _summary(self, session_id: str, first_recent_id: int) -> List[str]:
+        cached = self.summaries.get(session_id)
+        if cached is None:
+            # Cold start: only the newest older turns can fit in the summary
+            upto, lines = 0, []
+            older, _ = self.history.get_messages(session_id, limit=self.summary_turns, before=first_recent_id)
+        else:
+            upto, lines = cached
+            older, _ = self.history.get_messages(session_id, after=upto, before=first_recent_id)
+
+        if older:
+            lines = (lines + [self._summarize_turn(m) for m in older])[-self.summary_turns:]
+            upto = older[-1]["id"]
+            self.summaries.put(session_id, (upto, lines))
+        elif cached is None:
+            self.summaries.put(session_id, (upto, lines))
+        return lines
+
+    def _prefix(self, turns: List[dict], summary: List[str]) -> str:
+        """Render summary and turns, dropping the oldest parts to fit max_tokens"""
+        summary = list(summary)
+        turns = list(turns)
+
+        def render() -> str:
+            parts = ["Conversation so far:"]
+            if summary:
+                parts.append("Earlier:\n" + "\n".join(summary))
+            for turn in turns:
+                parts.append(f"User: {_clip(turn['question'], 300)}\nAssistant: {_clip(turn['answer'], 400)}")
+            return "\n".join(parts)
+
+        prefix = render()
+        while estimate_tokens(prefix) > self.max_tokens and (summary or len(turns) > 1):
+            if summary:
+                summary.pop(0)
+            else:
+                turns.pop(0)
+            prefix = render()
+        return prefix[:self.max_tokens * 4]
+
+    def context(self, session_id: str) -> Optional[ConversationContext]:
+        """Context for the next question in a session, or None for a new session"""
+        turns, _ = self.history.get_messages(session_id, limit=self.recent_turns)
+        if not turns:
+            return None
+        summary = self._summary(session_id, turns[0]["id"])
+        return ConversationContext(turns, summary, self._prefix(turns, summary))
+
+    def forget(self, session_id: str):
+        """Drop the cached summary, e.g. when the session is deleted"""
+        self.summaries.pop(session_id)
@@ -1,41 +1,63 @@
 import os
 import asyncio
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # NO langchain_community imports (prevents pwd error)
-import pytesseract
-from PIL import Image
 import docx
 import pptx
-import io
 import PyPDF2
 
+from metrics import OCR_IMAGES, report_error, span
+from ocr import OcrCache, extract_page_images, ocr_image_bytes
+
+
 # -------------------------------------------------------
-# Configure Tesseract path for Windows
+# Worker functions (module level so the process pool can pickle them)
 # -------------------------------------------------------
-try:
-    import platform
-    if platform.system() == 'Windows':
-        tesseract_paths = [
-            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
-        ]
-        for path in tesseract_paths:
-            if os.path.exists(path):
-                pytesseract.pytesseract.tesseract_cmd = path
-                break
-except:
-    pass
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract text from pages [start, end) of a PDF"""
+    texts = []
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for index in range(start, end):
+            texts.append(reader.pages[index].extract_text() or "")
+    return texts
 
 
 class DocumentProcessor:
-    def __init__(self):
+    # PDFs with fewer pages than this are extracted in-process
+    PARALLEL_PDF_MIN_PAGES = 16
+    # Pages extracted per step in-process; bounds the pages held in memory
+    PDF_PAGE_BATCH = 32
+    # Pages per process pool task - each task re-reads the PDF's page tree,
+    # so pool tasks are larger; at most two per worker are in flight
+    PDF_POOL_BATCH = 256
+    # Text files are read in blocks of about this many characters
+    TEXT_BLOCK_CHARS = 64 * 1024
+
+    def __init__(self, max_workers: Optional[int] = None, ocr_cache_dir: str = "ocr_cache"):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        self.ocr_cache = OcrCache(ocr_cache_dir)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Process pool for CPU-bound page extraction and OCR, created on first use"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
     
     async def process_document(self, file_path: str, file_extension: str) -> List[str]:
         """Process different document types and extract text asynchronously"""
@@ -44,99 +66,287 @@ class DocumentProcessor:
             None, self._process_document_sync, file_path, file_extension
         )
     
-    def _process_document_sync(self, file_path: str, file_extension: str) -> List[str]:
-        """Synchronous document processing"""
-        texts = []
-        
+    def _process_document_sync(
+        self,
+        file_path: str,
+        file_extension: str,
+        on_pages: Optional[Callable[[int], None]] = None,
+    ) -> List[str]:
+        """Synchronous document processing; an unreadable document gives no chunks"""
         try:
-            if file_extension == ".pdf":
-                texts = self._process_pdf(file_path)
-            elif file_extension in [".pptx", ".ppt"]:
-                texts = self._process_ppt(file_path)
-            elif file_extension in [".docx", ".doc"]:
-                texts = self._process_docx(file_path)
-            elif file_extension.lower() in [".jpg", ".jpeg", ".png", ".gif", ".bmp"]:
-                texts = self._process_image(file_path)
-            elif file_extension == ".txt":
-                texts = self._process_txt(file_path)
-            else:
-                texts = self._process_txt(file_path)
+            return [chunk for chunk, _ in self.iter_chunks(file_path, file_extension, on_pages)]
+        except Exception:
+            return []
 
-            if texts:
-                chunks = self.text_splitter.split_text("\n".join(texts))
-                return chunks
-            else:
-                return []
+    def process_chunks(
+        self,
+        file_path: str,
+        file_extension: str,
+        on_pages: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[List[str], List[dict]]:
+        """Extract and chunk a whole document into (chunks, metadatas) lists"""
+        chunks, metadatas = [], []
+        for chunk, metadata in self.iter_chunks(file_path, file_extension, on_pages):
+            chunks.append(chunk)
+            metadatas.append(metadata)
+        return chunks, metadatas
+
+    def iter_chunks(
+        self,
+        file_path: str,
+        file_extension: str,
+        on_pages: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[Tuple[str, dict]]:
+        """Extract and chunk a document page by page, yielding (chunk, metadata).
+
+        Only the current page batch and the text of the chunk still being
+        filled are held in memory, whatever the document size. PDF chunks
+        carry the 1-based "page" and PowerPoint chunks the "slide" they start
+        on, plus the character "offset" of the chunk within that page (for
+        other formats, within the document). on_pages is called with each
+        batch of extracted pages. Extraction errors are reported and raised,
+        so a caller can tell a broken document from a short one.
+        """
+        extension = file_extension.lower()
+        unit = {".pdf": "page", ".pptx": "slide", ".ppt": "slide"}.get(extension)
+        try:
+            yield from self._chunk_pages(self._iter_pages(file_path, extension, on_pages), unit)
         except Exception as e:
-            print(f"Error processing document: {e}")
-            return []
-    
+            report_error("process_document", f"Error processing document: {e}")
+            raise
+
+    def _iter_pages(
+        self, file_path: str, extension: str, on_pages: Optional[Callable[[int], None]] = None
+    ) -> Iterator[Tuple[Optional[int], str]]:
+        """(page or slide number, text) in document order"""
+        if extension == ".pdf":
+            pages = self._iter_pdf(file_path)
+        elif extension in [".pptx", ".ppt"]:
+            pages = self._iter_ppt(file_path)
+        elif extension in [".docx", ".doc"]:
+            pages = ((None, text) for text in self._iter_docx(file_path))
+        elif extension in [".jpg", ".jpeg", ".png", ".gif", ".bmp"]:
+            pages = ((None, text) for text in self._process_image(file_path))
+        else:
+            pages = ((None, text) for text in self._iter_txt(file_path))
+
+        for batch in pages if extension == ".pdf" else ([page] for page in pages):
+            if on_pages:
+                on_pages(len(batch))
+            yield from batch
+
+    def _chunk_pages(
+        self, pages: Iterable[Tuple[Optional[int], str]], unit: Optional[str]
+    ) -> Iterator[Tuple[str, dict]]:
+        """Split pages into chunks as they arrive.
+
+        Pages are appended (newline-separated) to a buffer that is split once
+        it holds a few chunks' worth of text. Every chunk but the last is
+        emitted; the last one may continue on the next page, so the buffer
+        restarts from it. Chunks match splitting the joined document, except
+        that a boundary near a restart can occasionally shift by a separator.
+        """
+        splitter = self.text_splitter
+        flush_at = splitter._chunk_size * 4
+        buffer = ""
+        origin = 0          # document position of buffer[0]
+        length = 0          # document length so far
+        starts = deque()    # (document position, number) of pages still in the buffer
+
+        def metadata(position: int) -> dict:
+            if unit is None:
+                return {"offset": position}
+            page_start, number = starts[0]
+            for start, page in starts:
+                if start > position:
+                    break
+                page_start, number = start, page
+            return {unit: number, "offset": position - page_start}
+
+        def emit(final: bool) -> List[Tuple[str, dict]]:
+            nonlocal buffer, origin
+            with span("split"):
+                chunks = splitter.split_text(buffer)
+                positions = []
+                cursor = 0
+                for chunk in chunks:
+                    position = buffer.find(chunk, cursor)
+                    position = cursor if position < 0 else position
+                    positions.append(origin + position)
+                    cursor = position + 1
+                if not final:
+                    # The last chunk may continue on the next page: keep it
+                    chunks, carry = chunks[:-1], positions[-1] if chunks else origin
+                results = [(chunk, metadata(position)) for chunk, position in zip(chunks, positions)]
+                if not final:
+                    buffer = buffer[carry - origin:]
+                    origin = carry
+                    while len(starts) > 1 and starts[1][0] <= origin:
+                        starts.popleft()
+            return results
+
+        for number, text in pages:
+            if length:
+                buffer += "\n"
+                length += 1
+            starts.append((length, number))
+            buffer += text
+            length += len(text)
+            if len(buffer) >= flush_at:
+                yield from emit(final=False)
+        if buffer.strip():
+            yield from emit(final=True)
+
     # -------------------------------------------------------
     # PDF PROCESSING WITHOUT LANGCHAIN
     # -------------------------------------------------------
-    def _process_pdf(self, file_path: str) -> List[str]:
-        texts = []
+    def _iter_pdf(self, file_path: str) -> Iterator[List[Tuple[int, str]]]:
+        """Batches of (page number, text); large PDFs are extracted on the process pool"""
+        with open(file_path, "rb") as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+
+        inline = self.max_workers <= 1 or page_count < self.PARALLEL_PDF_MIN_PAGES
+        step = self.PDF_PAGE_BATCH if inline else max(self.PDF_PAGE_BATCH, min(
+            self.PDF_POOL_BATCH, -(-page_count // self.max_workers)
+        ))
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        if inline:
+            batches = self._extract_inline(file_path, ranges)
+        else:
+            batches = self._extract_on_pool(file_path, ranges)
+
+        for (start, _), texts in zip(ranges, batches):
+            # Pages without a text layer are scans - OCR their images instead
+            image_only = [start + i for i, text in enumerate(texts) if not text.strip()]
+            if image_only:
+                texts = self._ocr_pdf_pages(file_path, texts, start, image_only)
+            yield [(start + i + 1, text) for i, text in enumerate(texts)]
+
+    def _extract_inline(self, file_path: str, ranges: List[Tuple[int, int]]) -> Iterator[List[str]]:
+        """Extract page ranges with one reader, dropping its object cache after
+        each range so parsed page content doesn't pile up"""
+        with open(file_path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            for start, end in ranges:
+                with span("extract"):
+                    texts = [reader.pages[index].extract_text() or "" for index in range(start, end)]
+                    reader.resolved_objects.clear()
+                yield texts
+
+    def _extract_on_pool(self, file_path: str, ranges: List[Tuple[int, int]]) -> Iterator[List[str]]:
+        """Extract page ranges in order, keeping at most two per worker in flight"""
+        pool = self._get_pool()
+        pending = deque()
+        upcoming = iter(ranges)
+        for start, end in upcoming:
+            pending.append(pool.submit(_extract_pdf_pages, file_path, start, end))
+            if len(pending) >= self.max_workers * 2:
+                break
         try:
-            with open(file_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    texts.append(page.extract_text() or "")
+            while pending:
+                with span("extract"):
+                    texts = pending.popleft().result()
+                next_range = next(upcoming, None)
+                if next_range is not None:
+                    pending.append(pool.submit(_extract_pdf_pages, file_path, *next_range))
+                yield texts
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _ocr_pdf_pages(self, file_path: str, texts: List[str], first_page: int, page_indexes: List[int]) -> List[str]:
+        try:
+            images = extract_page_images(file_path, page_indexes)
         except Exception as e:
-            print(f"PDF Error: {e}")
+            report_error("ocr", f"PDF image extraction error: {e}")
+            return texts
+        if not images:
+            return texts
+
+        recognized = self._ocr_images([(data, dpi) for _, data, dpi in images])
+        texts = list(texts)
+        for (index, _, _), text in zip(images, recognized):
+            if text.strip():
+                texts[index - first_page] = f"{texts[index - first_page]}\n{text}".strip()
         return texts
 
+    # -------------------------------------------------------
+    # OCR - cached by image hash, cache misses spread over the process pool
+    # -------------------------------------------------------
+    def _ocr_images(self, images: List[Tuple[bytes, Optional[float]]]) -> List[str]:
+        """Text of each (encoded image, DPI); failed images give empty text"""
+        with span("ocr"):
+            keys = [self.ocr_cache.key(data) for data, _ in images]
+            results = [self.ocr_cache.get(key) for key in keys]
+            missing = [i for i, text in enumerate(results) if text is None]
+            OCR_IMAGES.inc(len(images) - len(missing), result="cached")
+
+            if self.max_workers > 1 and len(missing) > 0:
+                pool = self._get_pool()
+                pending = {i: pool.submit(ocr_image_bytes, *images[i]) for i in missing}
+                recognize = lambda i: pending[i].result()
+            else:
+                recognize = lambda i: ocr_image_bytes(*images[i])
+
+            for i in missing:
+                try:
+                    results[i] = recognize(i)
+                except Exception as e:
+                    report_error("ocr", f"OCR Error: {e}")
+                    OCR_IMAGES.inc(result="failed")
+                    results[i] = ""
+                    continue
+                OCR_IMAGES.inc(result="recognized")
+                self.ocr_cache.put(keys[i], results[i])
+            return results
+
     # -------------------------------------------------------
     # POWERPOINT PROCESSING WITHOUT LANGCHAIN
     # -------------------------------------------------------
-    def _process_ppt(self, file_path: str) -> List[str]:
-        texts = []
-        try:
-            prs = pptx.Presentation(file_path)
-            for slide in prs.slides:
-                slide_text = []
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        slide_text.append(shape.text)
-                if slide_text:
-                    texts.append("\n".join(slide_text))
-        except Exception as e:
-            print(f"PPT Error: {e}")
-        return texts
+    def _iter_ppt(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        prs = pptx.Presentation(file_path)
+        for number, slide in enumerate(prs.slides, start=1):
+            slide_text = []
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    slide_text.append(shape.text)
+            # Keep empty slides so slide numbers stay aligned
+            yield number, "\n".join(slide_text)
     
     # -------------------------------------------------------
     # WORD DOCUMENT PROCESSING WITHOUT LANGCHAIN
     # -------------------------------------------------------
-    def _process_docx(self, file_path: str) -> List[str]:
-        texts = []
-        try:
-            doc = docx.Document(file_path)
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    texts.append(paragraph.text)
-        except Exception as e:
-            print(f"DOCX Error: {e}")
-        return texts
+    def _iter_docx(self, file_path: str) -> Iterator[str]:
+        doc = docx.Document(file_path)
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                yield paragraph.text
     
     # -------------------------------------------------------
     # IMAGE OCR PROCESSING
     # -------------------------------------------------------
     def _process_image(self, file_path: str) -> List[str]:
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image, lang='eng+hin')  
+            with open(file_path, "rb") as f:
+                text = self._ocr_images([(f.read(), None)])[0]
             return [text] if text.strip() else []
         except Exception as e:
-            print(f"OCR Error: {e}")
+            report_error("ocr", f"OCR Error: {e}")
             return []
     
     # -------------------------------------------------------
     # TEXT FILE PROCESSING
     # -------------------------------------------------------
-    def _process_txt(self, file_path: str) -> List[str]:
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return [f.read()]
-        except Exception as e:
-            print(f"TXT Error: {e}")
-            return []
-
+    def _iter_txt(self, file_path: str) -> Iterator[str]:
+        """Blocks of whole lines; joining them with newlines restores the file"""
+        with open(file_path, "r", encoding="utf-8") as f:
+            block, size = [], 0
+            for line in f:
+                block.append(line)
+                size += len(line)
+                if size >= self.TEXT_BLOCK_CHARS:
+                    yield "".join(block)[:-1] if line.endswith("\n") else "".join(block)
+                    block, size = [], 0
+            if block:
+                text = "".join(block)
+                yield text[:-1] if text.endswith("\n") else text
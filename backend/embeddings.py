@@ -0,0 +1,190 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from typing import Callable, List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# ONNX exports published in the model repository (same weights as PyTorch)
+ONNX_MODEL_FILE = "onnx/model.onnx"
+ONNX_INT8_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+
+EMBEDDING_BACKENDS = ("huggingface", "onnx", "onnx-int8", "hash")
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings wrapper that builds the real model on first use.
+
+    Loading MiniLM pulls in PyTorch and reads the model weights, which
+    takes seconds. The wrapper lets the vector store be opened right away
+    while the model is loaded in the background (``load``) or on the first
+    embedding call, whichever happens first.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """MiniLM on ONNX Runtime instead of PyTorch.
+
+    Runs the ONNX export of the same model with the same tokenizer, mean
+    pooling and L2 normalisation as the sentence-transformers pipeline, so
+    the vectors match the HuggingFace backend (the int8 export to within
+    quantisation error) and existing indexes stay valid. Texts are sorted
+    by length before batching so each batch pads to a similar length.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        model_file: str = ONNX_MODEL_FILE,
+        model_dir: Optional[str] = None,
+        batch_size: int = 32,
+        num_threads: Optional[int] = None,
+        max_length: int = 256,
+    ):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        self.batch_size = max(1, batch_size)
+
+        def resolve(filename: str) -> str:
+            if model_dir:
+                return os.path.join(model_dir, filename)
+            from huggingface_hub import hf_hub_download
+            return hf_hub_download(model_name, filename)
+
+        self.tokenizer = Tokenizer.from_file(resolve("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            resolve(model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed_batch(self, texts: List[str]):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings by feature hashing.
+
+    Needs no model download and gives the same vectors on every machine,
+    so benchmarks and offline runs get stable numbers. Texts sharing words
+    get similar vectors, which is enough to exercise retrieval - but it is
+    no substitute for MiniLM's semantic matching.
+    """
+
+    _TOKEN = re.compile(r"[\w\u0900-\u097F]+")
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in self._TOKEN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_embeddings(
+    backend: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    num_threads: Optional[int] = None,
+) -> Embeddings:
+    """Build the embedding backend named by ``backend`` or EMBEDDING_BACKEND.
+
+    ``huggingface`` (default) runs PyTorch through sentence-transformers;
+    ``onnx`` and ``onnx-int8`` run the ONNX exports of the same model;
+    ``hash`` is the model-free HashEmbeddings used by the benchmarks.
+    Batch size and thread count default to EMBEDDING_BATCH_SIZE and
+    EMBEDDING_THREADS.
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "huggingface")).lower()
+    batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    num_threads = num_threads or int(os.getenv("EMBEDDING_THREADS", "0")) or None
+
+    if backend == "huggingface":
+        from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": batch_size})
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(
+            model_file=ONNX_INT8_MODEL_FILE if backend == "onnx-int8" else ONNX_MODEL_FILE,
+            model_dir=os.getenv("EMBEDDING_MODEL_DIR") or None,
+            batch_size=batch_size,
+            num_threads=num_threads,
+        )
+    if backend == "hash":
+        return HashEmbeddings()
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
@@ -0,0 +1,100 @@
+"""Local stand-in for an Ollama server, for benchmarks and manual testing.
+
+Serves ``/api/tags`` and ``/api/generate`` (streaming and not) with a fixed
+answer emitted word by word after a configurable delay, and records how
+many generations ran and how many overlapped.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Sequence
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40 ms to every kept-alive request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name} for name in self.server.models]})
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/generate":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        request = json.loads(body or b"{}")
+        server = self.server
+        with server.lock:
+            server.generate_calls += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            words = server.answer.split(" ")
+            time.sleep(server.latency)
+            if request.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    time.sleep(server.token_delay)
+                    text = word if i == 0 else " " + word
+                    self._write_chunk(json.dumps({"response": text, "done": False}) + "\n")
+                self._write_chunk(json.dumps({"response": "", "done": True}) + "\n")
+                self._write_chunk("")
+            else:
+                time.sleep(server.token_delay * len(words))
+                self._send_json({"model": request.get("model"), "response": server.answer, "done": True})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_ollama(
+    models: Sequence[str] = ("llama3:latest",),
+    answer: str = "This is a generated answer from the stand-in model.",
+    latency: float = 0.0,
+    token_delay: float = 0.0,
+) -> ThreadingHTTPServer:
+    """Start a fake Ollama on a free local port; stop it with shutdown()/server_close()"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.models = list(models)
+    server.answer = answer
+    server.latency = latency
+    server.token_delay = token_delay
+    server.lock = threading.Lock()
+    server.generate_calls = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
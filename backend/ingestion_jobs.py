@@ -0,0 +1,150 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from metrics import report_error, start_trace, trace_summary
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no free slots"""
+
+
+class IngestionJob:
+    def __init__(self, filename: str, file_id: str):
+        self.job_id = str(uuid.uuid4())
+        self.filename = filename
+        self.file_id = file_id
+        self.status = "queued"
+        self.pages_extracted = 0
+        self.chunks_total = None
+        self.chunks_embedded = 0
+        self.chunks_skipped = 0
+        self.chunks_removed = 0
+        self.duplicate = False
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add_pages(self, count: int):
+        with self._lock:
+            self.pages_extracted += count
+
+    def add_chunks(self, count: int):
+        with self._lock:
+            self.chunks_embedded += count
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "status": self.status,
+            "pages_extracted": self.pages_extracted,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_skipped": self.chunks_skipped,
+            "chunks_removed": self.chunks_removed,
+            "duplicate": self.duplicate,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+        }
+
+
+class IngestionQueue:
+    """Bounded background queue for document ingestion.
+
+    Jobs run on a dedicated thread pool so heavy uploads never occupy the
+    default executor used by chat queries. At most ``max_pending`` jobs can
+    be queued or running; further submissions raise QueueFullError.
+    ``on_idle`` is called once the last queued job finishes, so work the
+    handler defers (e.g. persisting the index) happens once per batch of
+    uploads rather than once per file.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., None],
+        max_workers: int = 2,
+        max_pending: int = 16,
+        max_jobs_kept: int = 1000,
+        on_idle: Optional[Callable[[], None]] = None,
+    ):
+        self._handler = handler
+        self._on_idle = on_idle
+        self._active = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._max_jobs_kept = max_jobs_kept
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, file_id: str, *args) -> IngestionJob:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Ingestion queue is full")
+
+        job = IngestionJob(filename, file_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._forget_old_jobs()
+            self._active += 1
+        try:
+            self._executor.submit(self._run, job, args)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+            raise
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: IngestionJob, args: tuple):
+        job.status = "running"
+        job.started_at = datetime.now().isoformat()
+        # Per-stage time (extract, split, index_*) of this job only
+        trace = start_trace()
+        try:
+            self._handler(job, *args)
+            job.status = "completed"
+        except Exception as e:
+            report_error("ingestion", f"Ingestion job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.timings = trace_summary(trace)
+            job.finished_at = datetime.now().isoformat()
+            with self._lock:
+                self._active -= 1
+                idle = self._active == 0
+            if idle and self._on_idle is not None:
+                try:
+                    self._on_idle()
+                except Exception as e:
+                    report_error("ingestion", f"Ingestion idle hook failed: {e}")
+            self._slots.release()
+
+    def _forget_old_jobs(self):
+        """Drop the oldest finished jobs once more than max_jobs_kept are tracked"""
+        excess = len(self._jobs) - self._max_jobs_kept
+        if excess <= 0:
+            return
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished][:excess]:
+            del self._jobs[job_id]
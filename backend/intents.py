@@ -0,0 +1,193 @@
+"""Canned-answer intents (greetings, small talk, "what can you do").
+
+Intents and their phrases live in ``intents.json``. All phrases are
+compiled once into a character trie written as a single regex, with
+word boundaries that also hold for Devanagari, so "hi" matches "hi there"
+but not "this" or "which". A message only counts as an intent when it is
+(nearly) nothing else: a greeting in front of a real question still goes
+to retrieval.
+"""
+import json
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from metrics import report_error
+
+
+DEFAULT_INTENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json")
+
+# Word characters, including Devanagari vowel signs (which \w does not match)
+_WORD = r"\w\u0900-\u097F"
+
+
+class Intent:
+    """One intent: its phrases and canned response.
+
+    ``route`` intents are answered without retrieval or the LLM; the rest
+    are only used by the no-LLM fallback. ``max_extra_words`` caps the
+    words outside matched phrases (None: no cap).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        phrases: List[str],
+        response: str,
+        route: bool = False,
+        max_extra_words: Optional[int] = None,
+        response_without_documents: Optional[str] = None,
+    ):
+        self.name = name
+        self.phrases = phrases
+        self.response = response
+        self.route = route
+        self.max_extra_words = max_extra_words
+        self.response_without_documents = response_without_documents
+
+    def __repr__(self):
+        return f"Intent({self.name!r})"
+
+
+def phrase_trie_pattern(phrases: Iterable[str], elongate: bool = False) -> str:
+    """Regex matching any of the (lowercase) phrases, written as a character
+    trie: shared prefixes are matched once, so the engine rejects a
+    position after a character or two whatever the number of phrases.
+    Spaces match any whitespace; with ``elongate`` the last letter of a
+    phrase may be drawn out ("hiii", "heyyy")."""
+    return _trie_pattern(_build_trie(phrases), elongate)
+
+
+def _build_trie(phrases: Iterable[str]) -> dict:
+    # char -> child node; the key "" marks the end of a phrase
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return trie
+
+
+def _trie_pattern(node: dict, elongate: bool) -> str:
+    alternatives = []
+    for char in sorted(c for c in node if c):
+        child = node[char]
+        if char == " ":
+            pattern = r"\s+"
+        else:
+            pattern = re.escape(char) + ("+" if elongate and "" in child else "")
+        if any(child):
+            rest = _trie_pattern(child, elongate)
+            pattern += f"(?:{rest})?" if "" in child else rest
+        alternatives.append(pattern)
+    if len(alternatives) == 1 and "" not in node:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+def _spell_out(node: dict, text: str, i: int, previous: str) -> Optional[str]:
+    """The phrase in the trie that text (an elongated match) stands for.
+
+    Mirrors the regex: a letter repeating the one before it may be skipped
+    wherever a phrase could end ("hiii there" -> "hi there").
+    """
+    if i == len(text):
+        return "" if "" in node else None
+    char = text[i]
+    if char in node:
+        rest = _spell_out(node[char], text, i + 1, char)
+        if rest is not None:
+            return char + rest
+    if char == previous and "" in node:
+        return _spell_out(node, text, i + 1, previous)
+    return None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("’", "'").split())
+
+
+class IntentMatcher:
+    """Classifies a message into at most one intent, highest priority first"""
+
+    def __init__(self, intents: List[Intent]):
+        self.intents = intents
+        # phrase -> (index of the first intent listing it, number of words)
+        self._phrases = {}
+        for i, intent in enumerate(intents):
+            for phrase in map(_normalize, intent.phrases):
+                if phrase and phrase not in self._phrases:
+                    self._phrases[phrase] = (i, len(phrase.split()))
+        self._trie = _build_trie(self._phrases)
+        self._pattern = None
+        if self._phrases:
+            # The lookahead on possible first characters lets the regex
+            # engine skip most positions without entering the trie
+            first = "".join(re.escape(char) for char in sorted(self._trie))
+            self._pattern = re.compile(
+                rf"(?=[{first}])(?<![{_WORD}']){_trie_pattern(self._trie, True)}(?![{_WORD}])"
+            )
+
+    def _lookup(self, matched: str) -> Optional[Tuple[int, int]]:
+        """(intent index, words) of the phrase a regex match spelled out"""
+        found = self._phrases.get(matched)
+        if found is None:
+            phrase = " ".join(matched.split())
+            found = self._phrases.get(phrase)
+        if found is None:
+            # Drawn out ("hiii there")
+            phrase = _spell_out(self._trie, phrase, 0, "")
+            found = self._phrases.get(phrase) if phrase is not None else None
+        return found
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_INTENTS_FILE) -> "IntentMatcher":
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls([
+            Intent(
+                name=entry["name"],
+                phrases=entry.get("phrases", []),
+                response=entry["response"],
+                route=bool(entry.get("route", False)),
+                max_extra_words=entry.get("max_extra_words"),
+                response_without_documents=entry.get("response_without_documents"),
+            )
+            for entry in config["intents"]
+        ])
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "IntentMatcher":
+        """from_file, or a matcher without intents if the file can't be read"""
+        path = path or os.getenv("INTENTS_FILE") or DEFAULT_INTENTS_FILE
+        try:
+            return cls.from_file(path)
+        except Exception as e:
+            report_error("intents", f"⚠️ Could not load intents from {path}: {e}")
+            return cls([])
+
+    def classify(self, text: str) -> Optional[Intent]:
+        if self._pattern is None or not text:
+            return None
+        text = text.lower().replace("’", "'")
+        # Whole message is a phrase, up to closing punctuation ("Hi!"):
+        # a dict lookup instead of the regex
+        found = self._phrases.get(text.strip().rstrip("!?.,"))
+        if found is not None:
+            return self.intents[found[0]]
+        matched = set()
+        covered = 0
+        for match in self._pattern.findall(text):
+            found = self._lookup(match)
+            if found is not None:
+                matched.add(found[0])
+                covered += found[1]
+        if not matched:
+            return None
+        extra = len(text.split()) - covered
+        for i in sorted(matched):
+            intent = self.intents[i]
+            if intent.max_extra_words is None or extra <= intent.max_extra_words:
+                return intent
+        return None
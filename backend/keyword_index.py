@@ -0,0 +1,387 @@
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from languages import canonical_spelling
+
+
+# Words plus Devanagari runs (vowel signs are not matched by \w)
+_TOKEN = re.compile(r"[\w\u0900-\u097F]+")
+
+# Bumped whenever tokenize changes; an index written with another version
+# is rebuilt (see RAGChain._reconcile_indexes)
+TOKENIZER_VERSION = 2
+
+
+def tokenize(text: str) -> List[str]:
+    if not text.isascii():
+        # One form for letters that can be typed two ways (e.g. nukta letters)
+        text = unicodedata.normalize("NFC", text)
+    # Documents and questions alike, so "kyaa" in a chunk matches "kya"
+    return _TOKEN.findall(canonical_spelling(text.lower()))
+
+
+class _Segment:
+    """Immutable on-disk postings: a term table plus memory-mapped arrays"""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        with open(os.path.join(directory, f"{name}.terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        self.docs = np.load(os.path.join(directory, f"{name}.docs.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(directory, f"{name}.tfs.npy"), mmap_mode="r")
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        start, count = entry
+        return self.docs[start:start + count], self.tfs[start:start + count]
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @staticmethod
+    def write(directory: str, name: str, postings: Dict[str, List[Tuple[int, int]]]):
+        terms = sorted(postings)
+        counts = np.fromiter((len(postings[t]) for t in terms), dtype=np.int64, count=len(terms))
+        entries = [entry for term in terms for entry in postings[term]]
+        docs = np.fromiter((d for d, _ in entries), dtype=np.int32, count=len(entries))
+        tfs = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+        _Segment.write_arrays(directory, name, terms, counts, docs, tfs)
+
+    @staticmethod
+    def write_arrays(directory: str, name: str, terms: List[str], counts: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        """Write postings already grouped by term, in the order of terms"""
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+        table = {term: [int(start), int(count)] for term, start, count in zip(terms, starts, counts) if count}
+        np.save(os.path.join(directory, f"{name}.docs.npy"), np.asarray(docs, dtype=np.int32))
+        np.save(os.path.join(directory, f"{name}.tfs.npy"), np.asarray(tfs, dtype=np.float32))
+        with open(os.path.join(directory, f"{name}.terms.json"), "w", encoding="utf-8") as f:
+            json.dump(table, f, ensure_ascii=False)
+
+
+class KeywordIndex:
+    """Incremental BM25 inverted index persisted as memory-mapped segments.
+
+    New chunks go into an in-memory segment that ``flush`` writes to disk as
+    an immutable segment; segments of similar size are merged once there
+    are ``merge_factor`` of them. Document ids and lengths live in
+    append-only files, so a flush does not rewrite existing data. Deletes
+    are tombstones until a merge of every segment drops them, which a flush
+    forces once more than ``compact_ratio`` of all documents are deleted.
+    A query only touches the postings of its own terms, and terms found in
+    more than ``common_term_ratio`` of all chunks are skipped whenever the
+    query also has rarer terms, so latency tracks the selective terms
+    rather than corpus size.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        k1: float = 1.5,
+        b: float = 0.75,
+        merge_factor: int = 4,
+        common_term_ratio: float = 0.1,
+        compact_ratio: float = 0.2,
+    ):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.merge_factor = merge_factor
+        self.common_term_ratio = common_term_ratio
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        directory = self.directory
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta()
+        self._segment_names = meta.get("segments", [])
+        self._next_segment = meta.get("next_segment", 0)
+        self._deleted = set(meta.get("deleted", []))
+        self._generation = meta.get("generation", 0)
+        self._segments = [_Segment(directory, name) for name in self._segment_names]
+
+        self._doc_ids = []
+        ids_path, lengths_path = self._doc_paths(self._generation)
+        if os.path.exists(ids_path):
+            with open(ids_path, "r", encoding="utf-8") as f:
+                self._doc_ids = [line.rstrip("\n") for line in f]
+        lengths = np.fromfile(lengths_path, dtype=np.int32) if os.path.exists(lengths_path) else np.zeros(0, np.int32)
+        # Files are appended ids first, so trim to the shorter one after a crash
+        count = min(len(self._doc_ids), len(lengths))
+        self._doc_ids = self._doc_ids[:count]
+        self._doc_lengths = list(lengths[:count])
+        self._doc_numbers = {chunk_id: n for n, chunk_id in enumerate(self._doc_ids)}
+        self._persisted_docs = count
+
+        self._pending = defaultdict(list)
+        self._total_length = float(sum(self._doc_lengths))
+        self._lengths_array = None
+        self._deleted_array = None
+        # Written by an older tokenize: its terms no longer match queries
+        self.outdated = count > 0 and meta.get("tokenizer") != TOKENIZER_VERSION
+
+    def clear(self):
+        """Delete every document and the index files"""
+        with self._lock:
+            self._segments = []
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._doc_ids) - len(self._deleted)
+
+    def ids(self) -> set:
+        """IDs of the documents in the index (deleted ones excluded)"""
+        with self._lock:
+            return {doc_id for doc_id, number in self._doc_numbers.items() if number not in self._deleted}
+
+    def _doc_paths(self, generation: int) -> Tuple[str, str]:
+        # Compaction renumbers documents into a new generation of files, so
+        # the ones meta.json points to stay intact until it is replaced
+        suffix = f".{generation}" if generation else ""
+        return (
+            os.path.join(self.directory, f"doc_ids{suffix}.txt"),
+            os.path.join(self.directory, f"doc_lengths{suffix}.bin"),
+        )
+
+    def _read_meta(self) -> dict:
+        path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "segments": self._segment_names,
+                "next_segment": self._next_segment,
+                "deleted": sorted(self._deleted),
+                "generation": self._generation,
+                "tokenizer": TOKENIZER_VERSION,
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    # -------------------------------------------------------
+    # WRITES
+    # -------------------------------------------------------
+    def add(self, chunk_ids: List[str], texts: List[str]):
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                if chunk_id in self._doc_numbers and self._doc_numbers[chunk_id] not in self._deleted:
+                    continue
+                tokens = tokenize(text)
+                number = len(self._doc_ids)
+                self._doc_ids.append(chunk_id)
+                self._doc_lengths.append(len(tokens))
+                self._doc_numbers[chunk_id] = number
+                self._total_length += len(tokens)
+                self._lengths_array = None
+                for term, tf in Counter(tokens).items():
+                    self._pending[term].append((number, tf))
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock:
+            # Tombstones are document numbers, so a re-added chunk gets a
+            # fresh number and its old postings stay hidden
+            self._deleted.update(self._doc_numbers[c] for c in chunk_ids if c in self._doc_numbers)
+            self._deleted_array = None
+
+    def flush(self):
+        """Write pending documents as a new segment and persist metadata"""
+        with self._lock:
+            new_docs = self._doc_ids[self._persisted_docs:]
+            if new_docs:
+                ids_path, lengths_path = self._doc_paths(self._generation)
+                with open(ids_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{chunk_id}\n" for chunk_id in new_docs))
+                with open(lengths_path, "ab") as f:
+                    np.asarray(self._doc_lengths[self._persisted_docs:], dtype=np.int32).tofile(f)
+                self._persisted_docs = len(self._doc_ids)
+
+            if self._pending:
+                name = f"seg_{self._next_segment}"
+                self._next_segment += 1
+                _Segment.write(self.directory, name, self._pending)
+                self._segments.append(_Segment(self.directory, name))
+                self._segment_names.append(name)
+                self._pending = defaultdict(list)
+                self._merge_tiers()
+            if self._segments and len(self._deleted) > self.compact_ratio * len(self._doc_ids):
+                self._merge_segments(list(self._segments))
+
+            self._write_meta()
+
+    def _merge_tiers(self):
+        # Size-tiered merging: segments are grouped by the order of magnitude
+        # (base merge_factor) of their posting count, and a group is merged
+        # once it has merge_factor segments. Each posting is rewritten about
+        # log(n) times over a bulk load instead of once per flush.
+        while True:
+            tiers = defaultdict(list)
+            for segment in self._segments:
+                tiers[int(math.log(max(len(segment), 1), self.merge_factor))].append(segment)
+            full = [group for _, group in sorted(tiers.items()) if len(group) >= self.merge_factor]
+            if not full:
+                return
+            self._merge_segments(full[0])
+
+    def _merge_segments(self, segments: List[_Segment]):
+        # Postings of deleted documents are dropped while merging; a merge of
+        # every segment also renumbers the documents left and clears the
+        # tombstones (see _compact)
+        terms = sorted(set().union(*(segment.terms for segment in segments)))
+        positions = {term: i for i, term in enumerate(terms)}
+        term_parts, doc_parts, tf_parts = [], [], []
+        for segment in segments:
+            entries = sorted(segment.terms.items(), key=lambda item: item[1][0])
+            term_parts.append(np.repeat(
+                np.fromiter((positions[t] for t, _ in entries), dtype=np.int64, count=len(entries)),
+                np.fromiter((count for _, (_, count) in entries), dtype=np.int64, count=len(entries)),
+            ))
+            doc_parts.append(np.asarray(segment.docs))
+            tf_parts.append(np.asarray(segment.tfs))
+        term_ids = np.concatenate(term_parts)
+        docs = np.concatenate(doc_parts)
+        tfs = np.concatenate(tf_parts)
+        if self._deleted:
+            live = ~np.isin(docs, np.fromiter(self._deleted, dtype=np.int32, count=len(self._deleted)))
+            term_ids, docs, tfs = term_ids[live], docs[live], tfs[live]
+
+        compact = len(segments) == len(self._segments)
+        old_paths = self._doc_paths(self._generation)
+        if compact and self._deleted:
+            docs = self._compact()[docs]
+
+        # Segments are in flush order, so a stable sort on the term keeps
+        # each term's postings in document order
+        order = np.argsort(term_ids, kind="stable")
+        counts = np.bincount(term_ids, minlength=len(terms))
+        name = f"seg_{self._next_segment}"
+        self._next_segment += 1
+        _Segment.write_arrays(self.directory, name, terms, counts, docs[order], tfs[order])
+
+        # The merged segment takes the place of the first one it replaces
+        merged_names = {segment.name for segment in segments}
+        first = self._segment_names.index(segments[0].name)
+        kept = [s for s in self._segments if s.name not in merged_names]
+        kept.insert(first, _Segment(self.directory, name))
+        self._segments = kept
+        self._segment_names = [s.name for s in kept]
+        self._write_meta()
+        removed = [os.path.join(self.directory, old + suffix)
+                   for old in merged_names for suffix in (".terms.json", ".docs.npy", ".tfs.npy")]
+        if old_paths != self._doc_paths(self._generation):
+            removed.extend(old_paths)
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _compact(self) -> np.ndarray:
+        """Drop deleted documents from the id and length files.
+
+        Writes the remaining documents, renumbered from 0, as a new
+        generation of files and clears the tombstones; returns the map from
+        old to new document numbers for the postings being merged.
+        """
+        live = np.ones(len(self._doc_ids), dtype=bool)
+        live[np.fromiter(self._deleted, dtype=np.int64, count=len(self._deleted))] = False
+        renumber = (np.cumsum(live) - 1).astype(np.int32)
+
+        self._doc_ids = [doc_id for doc_id, keep in zip(self._doc_ids, live.tolist()) if keep]
+        lengths = np.asarray(self._doc_lengths, dtype=np.int32)[live]
+        self._doc_lengths = list(lengths)
+        self._doc_numbers = {doc_id: n for n, doc_id in enumerate(self._doc_ids)}
+        self._total_length = float(lengths.sum())
+        self._lengths_array = None
+        self._deleted = set()
+        self._deleted_array = None
+
+        self._generation += 1
+        ids_path, lengths_path = self._doc_paths(self._generation)
+        with open(ids_path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{doc_id}\n" for doc_id in self._doc_ids))
+        lengths.tofile(lengths_path)
+        self._persisted_docs = len(self._doc_ids)
+        return renumber
+
+    # -------------------------------------------------------
+    # SEARCH
+    # -------------------------------------------------------
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Return up to k (chunk_id, BM25 score) pairs, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            total_docs = len(self._doc_ids)
+            if total_docs == 0:
+                return []
+            avg_length = self._total_length / total_docs
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self._doc_lengths, dtype=np.float32)
+            lengths = self._lengths_array
+
+            # Document frequency from the term tables, before touching postings
+            frequencies = {
+                term: sum(seg.terms[term][1] for seg in self._segments if term in seg.terms)
+                + len(self._pending.get(term, ()))
+                for term in terms
+            }
+            limit = max(1, self.common_term_ratio * total_docs)
+            selective = [t for t, df in frequencies.items() if 0 < df <= limit]
+            query_terms = selective or [t for t, df in frequencies.items() if df > 0]
+
+            all_docs = []
+            all_scores = []
+            for term in query_terms:
+                parts = [segment.postings(term) for segment in self._segments]
+                parts = [p for p in parts if p is not None]
+                pending = self._pending.get(term)
+                if pending:
+                    parts.append((
+                        np.fromiter((d for d, _ in pending), dtype=np.int32, count=len(pending)),
+                        np.fromiter((t for _, t in pending), dtype=np.float32, count=len(pending)),
+                    ))
+                docs = np.concatenate([p[0] for p in parts])
+                tfs = np.concatenate([p[1] for p in parts])
+
+                idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avg_length)
+                all_docs.append(docs)
+                all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+            if not all_docs:
+                return []
+
+            # Sum per-term scores over the matching documents only, then
+            # sort just the best k of the ones not deleted
+            docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+            totals = np.zeros(len(docs), dtype=np.float64)
+            np.add.at(totals, inverse, np.concatenate(all_scores))
+            if self._deleted:
+                if self._deleted_array is None:
+                    self._deleted_array = np.fromiter(self._deleted, dtype=np.int32, count=len(self._deleted))
+                live = ~np.isin(docs, self._deleted_array)
+                docs, totals = docs[live], totals[live]
+            if k < len(docs):
+                best = np.sort(np.argpartition(-totals, k - 1)[:k])
+                docs, totals = docs[best], totals[best]
+            order = np.argsort(-totals, kind="stable")
+            return [(self._doc_ids[int(doc)], float(score)) for doc, score in zip(docs[order], totals[order])]
@@ -0,0 +1,135 @@
+"""Answer languages: prompt instructions and query normalization.
+
+The chat UI sends ``english``, ``hindi`` or ``hinglish``. Prompts get a
+per-language instruction (the templates are built once per language by
+RAGChain), and questions are brought to a canonical form before they
+are embedded or searched, so the many ways of spelling Hinglish in Roman
+letters ("kya", "kyaa", "kia") share cache and index entries. The keyword
+indexes apply the same spelling normalization to document text, so the
+canonical query terms match however a document spells them.
+"""
+import re
+import unicodedata
+from typing import Optional
+
+from intents import phrase_trie_pattern
+
+
+LANGUAGES = ("english", "hindi", "hinglish")
+DEFAULT_LANGUAGE = "english"
+
+_ALIASES = {"en": "english", "hi": "hindi", "hi-latn": "hinglish"}
+
+# Appended to the prompts just before "Answer:"
+LANGUAGE_INSTRUCTIONS = {
+    "english": "",
+    "hindi": (
+        "Write your answer in Hindi (Devanagari script), even if the context or question is in English. "
+        "Keep names, numbers and technical terms as they appear in the context.\n\n"
+    ),
+    "hinglish": (
+        "Write your answer in Hinglish: conversational Hindi written in Roman (English) letters, "
+        "mixing in English words the way people chat. Do not use Devanagari script.\n\n"
+    ),
+}
+
+# Common Roman-script spellings of Hindi words -> one canonical spelling.
+# Only unambiguous words: English words that Hinglish also uses ("me",
+# "main", "he", "bare") are left alone unless part of a phrase.
+HINGLISH_VARIANTS = {
+    "kya": ["kyaa", "kia"],
+    "hai": ["hei", "hy"],
+    "hain": ["hn", "hein"],
+    "nahi": ["nahin", "nahii", "nhi", "nai", "nahee"],
+    "kaise": ["kese", "kaisay", "kaisey", "kaisse"],
+    "kaisa": ["kesa", "kaisaa"],
+    "kyun": ["kyu", "kyon", "kyoon", "kyoun"],
+    "kyunki": ["kyuki", "kyonki"],
+    "kaun": ["kon", "koun"],
+    "kaunsa": ["konsa", "kounsa", "kaun sa", "kon sa"],
+    "kitna": ["kitnaa", "kitana"],
+    "kitne": ["kitney", "kitane"],
+    "kahan": ["kahaan"],
+    "yeh": ["ye", "yah"],
+    "woh": ["wo", "vo", "voh"],
+    "kuch": ["kuchh", "kch"],
+    "mein": ["mei"],
+    "ke baare mein": ["ke bare me", "ke bare mein", "ke baare me", "k bare me"],
+    "kis baare mein": ["kis bare me", "kis bare mein", "kis baare me"],
+    "batao": ["btao", "bataao", "bta do", "bata do"],
+    "samjhao": ["smjhao", "samjhaao", "samjha do"],
+    "chahiye": ["chaiye", "chahie", "chahiyee", "chaahiye"],
+    "matlab": ["mtlb", "matlb"],
+    "accha": ["acha", "achha", "achchha"],
+    "theek": ["thik"],
+    "mujhe": ["muje", "mujhey", "mujhay"],
+    "aapka": ["apka"],
+    "aapki": ["apki"],
+    "aapko": ["apko"],
+    "sakte": ["skte"],
+    "sakta": ["skta"],
+    "raha": ["rha"],
+    "rahe": ["rhe"],
+    "rahi": ["rhi"],
+    "karo": ["kro", "karoo"],
+    "karna": ["krna"],
+    "karne": ["krne"],
+    "abhi": ["abi"],
+    "bahut": ["bahot", "bohot", "bhot", "bohat"],
+}
+
+_HINGLISH_LOOKUP = {
+    variant: canonical
+    for canonical, variants in HINGLISH_VARIANTS.items()
+    for variant in variants
+}
+_HINGLISH_PATTERN = re.compile(rf"\b{phrase_trie_pattern(_HINGLISH_LOOKUP)}\b")
+# Drawn-out vowels: "kyaaa", "nahiii" -> "kya", "nahi"
+_ELONGATION = re.compile(r"([aeiou])\1\1+")
+
+
+def _shorten(match: re.Match) -> str:
+    # A run that starts a word ("iii" as a numeral) is kept
+    start = match.start()
+    if start == 0 or not match.string[start - 1].isalpha():
+        return match.group()
+    return match.group(1)
+
+
+def _canonical(match: re.Match) -> str:
+    return _HINGLISH_LOOKUP[" ".join(match.group().split())]
+
+
+def resolve_language(language: Optional[str]) -> str:
+    """Canonical language name; unknown or missing languages are English"""
+    if not language:
+        return DEFAULT_LANGUAGE
+    language = language.strip().lower()
+    if language in LANGUAGE_INSTRUCTIONS:
+        return language
+    return _ALIASES.get(language, DEFAULT_LANGUAGE)
+
+
+def canonical_spelling(text: str) -> str:
+    """Lowercase text with drawn-out vowels shortened and Hinglish spellings
+    mapped to HINGLISH_VARIANTS' canonical forms"""
+    if "aaa" in text or "eee" in text or "iii" in text or "ooo" in text or "uuu" in text:
+        text = _ELONGATION.sub(_shorten, text)
+    return _HINGLISH_PATTERN.sub(_canonical, text)
+
+
+def normalize_query(question: str, language: str = DEFAULT_LANGUAGE) -> str:
+    """The form of a question that is embedded and searched.
+
+    Hindi and Hinglish questions are lowercased, Unicode-normalized (NFC,
+    so nukta letters typed either way match) and Hinglish spellings are
+    mapped to HINGLISH_VARIANTS' canonical forms. English questions are
+    returned unchanged.
+    """
+    if language == DEFAULT_LANGUAGE:
+        return question
+    text = question if question.isascii() else unicodedata.normalize("NFC", question)
+    text = text.lower()
+    if language == "hinglish":
+        text = canonical_spelling(text)
+    return " ".join(text.split())
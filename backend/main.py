@@ -1,15 +1,33 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
 import os
+import time
 import uuid
+import hashlib
 from datetime import datetime
 import json
 
 from document_processor import DocumentProcessor
 from rag_chain import RAGChain
 from chat_history import ChatHistoryManager
+from conversation_memory import ConversationMemory
+from metrics import (
+    REGISTRY,
+    REQUEST_SECONDS,
+    CallbackMetric,
+    current_trace,
+    report_error,
+    server_timing,
+    span,
+    start_trace,
+    trace_summary,
+)
+from ingestion_jobs import IngestionQueue, QueueFullError
+from vector_collections import DEFAULT_COLLECTION, validate_collection_name
 
 app = FastAPI(title="RAG Chatbot API")
 
@@ -24,8 +42,23 @@ app.add_middleware(
 
 # Initialize components
 doc_processor = DocumentProcessor()
-rag_chain = RAGChain()
 chat_history = ChatHistoryManager()
+rag_chain = RAGChain(
+    compact_vectors=os.getenv("COMPACT_VECTORS") == "1",
+    llm_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+    memory=ConversationMemory(chat_history),
+    extractive_rescore=os.getenv("EXTRACTIVE_RESCORE") == "1",
+)
+
+# Cache hit/miss counts are read from the caches when /metrics is scraped
+for _field in ("hits", "misses"):
+    REGISTRY.register(CallbackMetric(
+        f"rag_cache_{_field}_total",
+        f"Cache {_field} by cache",
+        lambda field=_field: {(name, ): stats[field] for name, stats in rag_chain.cache_stats().items()},
+        labelnames=["cache"],
+        kind="counter",
+    ))
 
 # Ensure directories exist
 os.makedirs("uploads", exist_ok=True)
@@ -33,10 +66,91 @@ os.makedirs("chat_history", exist_ok=True)
 os.makedirs("vectorstore", exist_ok=True)
 
 
+# Uploads are copied to disk in pieces of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Most questions one /chat/batch request may ask
+MAX_BATCH_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "100"))
+
+# How often a pending /chat answer checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Requests with this header set get their per-stage timings back in a
+# Server-Timing response header (or in the final event of /chat/stream)
+DEBUG_TIMING_HEADER = "x-debug-timing"
+
+
+# Responses sent as a stream of events; their headers go out before the
+# work is done, so their timings are reported in the stream itself
+STREAMED_MEDIA_TYPES = ("application/x-ndjson",)
+
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """Request latency histogram, plus the per-stage breakdown on request.
+
+    call_next returns as soon as the endpoint has produced its response
+    headers, so the latency is observed when the body has been sent - for
+    streamed answers, at the end of the stream.
+    """
+    trace = start_trace() if request.headers.get(DEBUG_TIMING_HEADER) else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/history/{session_id}) to keep the series count bounded
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, path=path)
+
+    response.body_iterator = timed_body()
+    streamed = response.headers.get("content-type", "").startswith(STREAMED_MEDIA_TYPES)
+    if trace is not None and not streamed:
+        response.headers["Server-Timing"] = server_timing(trace)
+    return response
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Persist pending vector store writes and stop worker processes"""
+    ingestion_queue.shutdown()
+    rag_chain.flush()
+    rag_chain.ollama.close()
+    doc_processor.shutdown()
+
+
 class QuestionRequest(BaseModel):
     question: str
     session_id: str
     language: str = "english"
+    collections: Optional[List[str]] = None
+
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    language: str = "english"
+    session_id: Optional[str] = None
+    max_concurrency: int = 4
+    collections: Optional[List[str]] = None
+
+
+def _check_collections(names: Optional[List[str]], must_exist: bool = False):
+    """Reject invalid collection names with 422 (and, with must_exist,
+    collections never created with 404) before any work starts"""
+    try:
+        for name in names or []:
+            validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if must_exist:
+        for name in names or []:
+            if not rag_chain.collections.exists(name):
+                raise HTTPException(status_code=404, detail=f"Collection {name!r} not found")
 
 
 @app.get("/")
@@ -44,10 +158,32 @@ def read_root():
     return {"message": "RAG Chatbot API is running", "status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    """Health check endpoint; ready stays false while warm-up runs or after a step failed.
+
+    The LLM is reported separately: the backend answers without it.
+    """
+    return {
+        "status": "healthy",
+        "ready": rag_chain.ready,
+        "warm_up_errors": rag_chain.warm_up_errors,
+        "embeddings_loaded": rag_chain.embeddings.loaded,
+        "ollama_available": rag_chain.ollama_available,
+        "llm": {
+            "available": rag_chain.ollama_available,
+            "model": rag_chain.llm_model,
+            "error": rag_chain.llm_error,
+        },
+        "cache": rag_chain.cache_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 @app.get("/features")
@@ -66,53 +202,171 @@ def get_features():
     }
 
 
-@app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and process documents"""
+def _ingest_document(
+    job,
+    file_path: str,
+    file_extension: str,
+    file_hash: str,
+    collection: Optional[str] = None,
+    replaces: Optional[str] = None,
+):
+    """Background ingestion: extract, chunk and embed one uploaded file.
+
+    Extraction errors and documents without text fail the job; a failed
+    replacement leaves the earlier version indexed.
+    """
+    if rag_chain.is_indexed(file_hash, collection=collection):
+        # Identical content is already indexed - nothing to extract or embed
+        job.duplicate = True
+        job.chunks_total = 0
+        return
+
+    def counted(chunks):
+        # chunks_total grows as the document is streamed through
+        job.chunks_total = 0
+        for chunk in chunks:
+            job.chunks_total += 1
+            yield chunk
+
+    chunks = doc_processor.iter_chunks(file_path, file_extension, on_pages=job.add_pages)
+    result = rag_chain.index_chunks(
+        counted(chunks),
+        filename=job.filename,
+        file_id=job.file_id,
+        file_hash=file_hash,
+        on_progress=job.add_chunks,
+        collection=collection,
+        replaces=replaces,
+    )
+    job.chunks_skipped = result["skipped"]
+    job.chunks_removed = result["removed"]
+
+
+# Ingestion runs on its own bounded worker pool so uploads can't starve /chat
+ingestion_queue = IngestionQueue(
+    _ingest_document,
+    max_workers=int(os.getenv("INGESTION_WORKERS", "2")),
+    max_pending=int(os.getenv("INGESTION_MAX_PENDING", "16")),
+    # Persist the indexes once the queue drains, not after every file
+    on_idle=rag_chain.flush,
+)
+
+
+@app.post("/upload", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...), collection: Optional[str] = None, replaces: Optional[str] = None
+):
+    """Upload a document and queue it for processing into a collection.
+
+    replaces is the file_id of an earlier version to update in place:
+    only its changed chunks are re-embedded.
+    """
+    if collection is not None:
+        _check_collections([collection])
     try:
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
         file_extension = os.path.splitext(file.filename)[1].lower()
-        file_path = f"uploads/{file_id}{file_extension}"
+        temp_path = f"uploads/{uuid.uuid4()}.part"
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Stream the upload to disk instead of holding it in memory,
+        # hashing the content on the way
+        hasher = hashlib.sha256()
+        with open(temp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                buffer.write(chunk)
         
-        # Process document
-        texts = await doc_processor.process_document(file_path, file_extension)
+        # Name the stored file after its content so identical uploads share it
+        file_hash = hasher.hexdigest()
+        file_id = file_hash[:32]
+        file_path = f"uploads/{file_id}{file_extension}"
+        os.replace(temp_path, file_path)
         
-        # Add to vector store (run in executor since it's synchronous)
-        import asyncio
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, rag_chain.add_documents, texts)
+        job = ingestion_queue.submit(
+            file.filename, file_id, file_path, file_extension, file_hash, collection, replaces
+        )
         
         return {
             "success": True,
+            "job_id": job.job_id,
             "file_id": file_id,
             "filename": file.filename,
-            "chunks": len(texts),
-            "message": "Document processed and added to knowledge base"
+            "collection": collection or DEFAULT_COLLECTION,
+            "status": job.status,
+            "message": "Document queued for processing"
         }
+    except QueueFullError:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many documents are being processed. Please retry shortly.",
+            headers={"Retry-After": "5"}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Get the status and progress of an ingestion job"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/collections")
+def list_collections():
+    """List the vector collections documents can be uploaded to and searched in"""
+    return {"collections": rag_chain.collections.list_names(), "default": DEFAULT_COLLECTION}
+
+
+@app.post("/collections/{name}", status_code=201)
+def create_collection(name: str):
+    """Create an empty collection (uploading to a new collection also creates it)"""
+    _check_collections([name])
+    rag_chain.collections.get(name, create=True)
+    return {"collection": name}
+
+
+async def _unless_disconnected(raw_request: Request, coro):
+    """Await coro, cancelling it if the client disconnects first.
+
+    Returns None when the client went away; cancelling the query cancels
+    its Ollama generation so abandoned questions stop using the model.
+    """
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await raw_request.is_disconnected():
+            task.cancel()
+            return None
+
+
 @app.post("/chat")
-async def chat(request: QuestionRequest):
+async def chat(request: QuestionRequest, raw_request: Request):
     """Handle chat questions - supports both document-based and generic questions"""
+    _check_collections(request.collections, must_exist=True)
     try:
         # Get answer from RAG chain (handles both document-based and generic)
-        answer = await rag_chain.query(request.question, request.language)
+        answer = await _unless_disconnected(
+            raw_request, rag_chain.query(request.question, request.language, request.collections, request.session_id)
+        )
+        if answer is None:
+            # Client is gone - nothing to send and nothing worth saving
+            return Response(status_code=499)
         
         # Save to chat history
-        chat_history.save_message(
-            session_id=request.session_id,
-            question=request.question,
-            answer=answer,
-            language=request.language
-        )
+        with span("history_save"):
+            chat_history.save_message(
+                session_id=request.session_id,
+                question=request.question,
+                answer=answer,
+                language=request.language
+            )
         
         return {
             "answer": answer,
@@ -121,6 +375,7 @@ async def chat(request: QuestionRequest):
     except Exception as e:
         import traceback
         traceback.print_exc()
+        report_error("chat", f"Chat error: {e}")
         # Always return a helpful response, never an error message
         try:
             # Try to get a fallback response
@@ -137,24 +392,163 @@ async def chat(request: QuestionRequest):
             }
 
 
+@app.post("/chat/stream")
+def chat_stream(request: QuestionRequest):
+    """Stream a chat answer as NDJSON: sources first, then tokens, then done"""
+    _check_collections(request.collections, must_exist=True)
+
+    def events():
+        answer_parts = []
+        try:
+            for event in rag_chain.stream_query(
+                request.question, request.language, request.collections, request.session_id
+            ):
+                if event["type"] == "token":
+                    answer_parts.append(event["content"])
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            report_error("chat_stream", f"Chat stream error: {e}")
+            if not answer_parts:
+                fallback_answer = rag_chain._get_fallback_response(request.question)
+                answer_parts.append(fallback_answer)
+                yield json.dumps({"type": "token", "content": fallback_answer}, ensure_ascii=False) + "\n"
+
+        answer = "".join(answer_parts)
+        # Save to chat history once the full answer is known
+        with span("history_save"):
+            chat_history.save_message(
+                session_id=request.session_id,
+                question=request.question,
+                answer=answer,
+                language=request.language
+            )
+        done = {"type": "done", "session_id": request.session_id}
+        # Headers are long gone by now, so debug timings travel in the last event
+        trace = current_trace()
+        if trace is not None:
+            done["timings"] = trace_summary(trace)
+        yield json.dumps(done) + "\n"
+
+    # Sync generator: Starlette iterates it in a worker thread
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return request.headers.get("if-none-match") == etag
+
+
+@app.post("/chat/batch")
+def chat_batch(request: BatchQuestionRequest):
+    """Answer many questions at once, streaming NDJSON results as each completes"""
+    if not 1 <= request.max_concurrency <= 32:
+        raise HTTPException(status_code=422, detail="max_concurrency must be between 1 and 32")
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=413, detail=f"A batch can have at most {MAX_BATCH_QUESTIONS} questions"
+        )
+    _check_collections(request.collections, must_exist=True)
+
+    def results():
+        answers = rag_chain.query_batch(
+            request.questions,
+            request.language,
+            max_concurrency=request.max_concurrency,
+            collections=request.collections,
+            session_id=request.session_id,
+        )
+        try:
+            for index, answer in answers:
+                question = request.questions[index]
+                if request.session_id:
+                    with span("history_save"):
+                        chat_history.save_message(
+                            session_id=request.session_id,
+                            question=question,
+                            answer=answer,
+                            language=request.language
+                        )
+                yield json.dumps({"index": index, "question": question, "answer": answer}, ensure_ascii=False) + "\n"
+        finally:
+            # Client gone: questions not started yet are dropped
+            answers.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.get("/history/{session_id}")
-def get_chat_history(session_id: str):
-    """Get chat history for a session"""
-    history = chat_history.get_history(session_id)
-    return {"history": history}
+def get_chat_history(
+    session_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    updated_since: Optional[str] = None,
+):
+    """Get chat history for a session, optionally paginated by message id cursors"""
+    summary = chat_history.get_session(session_id)
+    etag = _etag(
+        session_id,
+        summary and summary["message_count"],
+        summary and summary["updated_at"],
+        limit, before, after, updated_since
+    )
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    history, has_more = chat_history.get_messages(
+        session_id, limit=limit, before=before, after=after, updated_since=updated_since
+    )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return {
+        "history": history,
+        "has_more": has_more,
+        "before_cursor": history[0]["id"] if history else before,
+        "after_cursor": history[-1]["id"] if history else after,
+    }
 
 
 @app.get("/sessions")
-def get_all_sessions():
-    """Get all chat sessions"""
-    sessions = chat_history.get_all_sessions()
-    return {"sessions": sessions}
+def get_all_sessions(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    before: Optional[str] = None,
+    updated_since: Optional[str] = None,
+):
+    """Get chat sessions, most recent first; page with the returned next_cursor"""
+    etag = _etag(*chat_history.sessions_version(), limit, before, updated_since)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cursor = None
+    if before:
+        # Cursor format: "<updated_at>|<session_id>"
+        updated_at, _, last_session_id = before.partition("|")
+        cursor = (updated_at, last_session_id)
+
+    sessions, has_more = chat_history.list_sessions(limit=limit, before=cursor, updated_since=updated_since)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    last = sessions[-1] if sessions else None
+    return {
+        "sessions": sessions,
+        "has_more": has_more,
+        "next_cursor": f"{last['updated_at']}|{last['session_id']}" if has_more else None,
+    }
 
 
 @app.delete("/history/{session_id}")
 def delete_chat_history(session_id: str):
     """Delete chat history for a session"""
     chat_history.delete_session(session_id)
+    rag_chain.memory.forget(session_id)
     return {"success": True, "message": "Chat history deleted"}
 
 
@@ -0,0 +1,239 @@
+"""Counters, histograms and per-request timing spans.
+
+Metrics render in the Prometheus text format for ``/metrics`` without
+any client library. ``span(stage)`` times a block, records it in the
+``rag_stage_seconds`` histogram and - when a trace was started for the
+current request - adds it to that request's timing breakdown.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class CallbackMetric(_Metric):
+    """Values read at scrape time, e.g. from cache statistics"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        callback: Callable[[], Dict[Tuple[str, ...], float]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        try:
+            items = sorted(self.callback().items())
+        except Exception:
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*s[0]], s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric; registering a name again replaces the old metric"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent per pipeline stage", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rag_http_request_seconds", "HTTP request latency", ["method", "path"]
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "rag_fallbacks_total", "Answers produced without the LLM, by reason", ["reason"]
+))
+CHUNKS_INDEXED = REGISTRY.register(Counter(
+    "rag_chunks_indexed_total", "Chunks embedded and written to a collection"
+))
+OCR_IMAGES = REGISTRY.register(Counter(
+    "rag_ocr_images_total", "Images sent to OCR, by result (cached, recognized, failed)", ["result"]
+))
+RERANKS = REGISTRY.register(Counter(
+    "rag_rerank_total", "Reranking calls by outcome (reranked, timeout, not_loaded, failed)", ["result"]
+))
+ERRORS = REGISTRY.register(Counter(
+    "rag_errors_total", "Errors caught and handled, by stage", ["stage"]
+))
+
+
+# -------------------------------------------------------
+# PER-REQUEST TRACES
+# -------------------------------------------------------
+# stage -> [total seconds, calls] for the request being handled, if traced
+_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+def start_trace() -> Dict[str, list]:
+    """Collect the spans of the current request (and the threads it hands work to)"""
+    trace = {}
+    _trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Dict[str, list]]:
+    return _trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            entry = trace.setdefault(stage, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def in_context(fn: Callable) -> Callable:
+    """Bind fn to a copy of the current context so spans it records in a
+    worker thread still reach the request's trace"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def report_error(stage: str, message: str):
+    """Print a handled error and count it under its stage"""
+    print(message)
+    ERRORS.inc(stage=stage)
+
+
+def server_timing(trace: Dict[str, list]) -> str:
+    """Render a trace as a Server-Timing header value (durations in ms)"""
+    return ", ".join(
+        f'{stage};dur={seconds * 1000:.1f};desc="{calls}x"' for stage, (seconds, calls) in trace.items()
+    )
+
+
+def trace_summary(trace: Dict[str, list]) -> Dict[str, dict]:
+    return {stage: {"ms": round(seconds * 1000, 2), "calls": calls} for stage, (seconds, calls) in trace.items()}
@@ -0,0 +1,148 @@
+"""OCR for scanned PDF pages and uploaded images.
+
+Images are decoded, converted to grayscale, downscaled to ``OCR_DPI``
+(Tesseract gains nothing from more pixels, only time) and binarized with
+an Otsu threshold before recognition. Recognized text is cached on disk
+by a hash of the encoded image, so re-uploading a scan costs nothing.
+"""
+import hashlib
+import io
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import PyPDF2
+import pytesseract
+from PIL import Image
+
+
+# -------------------------------------------------------
+# Configure Tesseract path for Windows
+# -------------------------------------------------------
+try:
+    import platform
+    if platform.system() == 'Windows':
+        tesseract_paths = [
+            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+        ]
+        for path in tesseract_paths:
+            if os.path.exists(path):
+                pytesseract.pytesseract.tesseract_cmd = path
+                break
+except:
+    pass
+
+
+OCR_LANG = "eng+hin"
+OCR_DPI = 300
+
+# Longest side for images whose resolution is unknown (A4 at 300 DPI)
+MAX_SIDE_PIXELS = 3508
+
+# Images smaller than this on both sides are logos or bullets, not scans
+MIN_SCAN_PIXELS = 200
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """Gray level that best separates ink from paper"""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = background_sum = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        background_sum += level * count
+        mean_background = background_sum / background
+        mean_foreground = (weighted_total - background_sum) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def preprocess(image: Image.Image, source_dpi: Optional[float] = None, target_dpi: int = OCR_DPI) -> Image.Image:
+    """Grayscale, downscale to target_dpi (never upscale) and binarize"""
+    image = image.convert("L")
+    if source_dpi and source_dpi > target_dpi:
+        scale = target_dpi / source_dpi
+    else:
+        scale = min(1.0, MAX_SIDE_PIXELS / max(image.size))
+    if scale < 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    threshold = _otsu_threshold(image.histogram())
+    return image.point(lambda level: 255 if level > threshold else 0)
+
+
+def _image_dpi(image: Image.Image) -> Optional[float]:
+    dpi = image.info.get("dpi")
+    return float(dpi[0]) if dpi and dpi[0] else None
+
+
+def ocr_image_bytes(data: bytes, source_dpi: Optional[float] = None, lang: str = OCR_LANG) -> str:
+    """Recognize one encoded image (module level so the process pool can pickle it)"""
+    image = Image.open(io.BytesIO(data))
+    image = preprocess(image, source_dpi or _image_dpi(image))
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def extract_page_images(file_path: str, page_indexes: List[int]) -> List[Tuple[int, bytes, Optional[float]]]:
+    """(page index, encoded image, effective DPI) for the scan-sized images on the given pages"""
+    found = []
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for index in page_indexes:
+            page = reader.pages[index]
+            page_width_inches = float(page.mediabox.width) / 72 or None
+            try:
+                images = list(page.images)
+            except Exception:
+                continue
+            for image_file in images:
+                try:
+                    width, height = Image.open(io.BytesIO(image_file.data)).size
+                except Exception:
+                    continue
+                if max(width, height) < MIN_SCAN_PIXELS:
+                    continue
+                dpi = width / page_width_inches if page_width_inches else None
+                found.append((index, image_file.data, dpi))
+    return found
+
+
+class OcrCache:
+    """Recognized text on disk, one file per (image, language, DPI)"""
+
+    def __init__(self, directory: str = "ocr_cache"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data: bytes, lang: str = OCR_LANG) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(f"\0{lang}\0{OCR_DPI}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+import aiohttp
+
+
+class OllamaError(Exception):
+    """Ollama answered with an error status or an unusable response"""
+
+
+class OllamaClient:
+    """Asyncio client for the Ollama HTTP API.
+
+    Requests share one pooled aiohttp session that lives on the client's
+    own event-loop thread, so the client can be used from FastAPI handlers
+    (``generate``), from worker threads (``generate_sync``/``stream_sync``)
+    and from other event loops alike. Each model gets at
+    most ``max_concurrency`` generations at a time; identical in-flight
+    ``generate`` calls (same model, prompt and options) share a single
+    generation. Cancelling a caller - e.g. when its HTTP client disconnects -
+    cancels the request to Ollama once no other caller is waiting on it.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_concurrency: int = 2,
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 16,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.stats = {"generations": 0, "coalesced": 0, "cancelled": 0}
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._session = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[tuple, list] = {}
+
+    # -------------------------------------------------------
+    # EVENT LOOP AND SESSION
+    # -------------------------------------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _limit(self, model: str) -> asyncio.Semaphore:
+        if model not in self._limits:
+            self._limits[model] = asyncio.Semaphore(self.max_concurrency)
+        return self._limits[model]
+
+    def close(self):
+        """Close the pooled connections and stop the client's event loop"""
+        if self._loop is None:
+            return
+        if self._session is not None:
+            self._submit(self._session.close()).result(timeout=5)
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    # -------------------------------------------------------
+    # REQUESTS (run on the client loop)
+    # -------------------------------------------------------
+    async def _generate_once(self, model: str, prompt: str, options: Optional[dict]) -> str:
+        payload = {"model": model, "prompt": prompt, "stream": False, "options": options or {}}
+        timeout = aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+        async with self._limit(model):
+            self.stats["generations"] += 1
+            async with self._get_session().post(f"{self.base_url}/api/generate", json=payload, timeout=timeout) as response:
+                if response.status != 200:
+                    raise OllamaError(f"Ollama returned HTTP {response.status}: {(await response.text())[:200]}")
+                data = await response.json(content_type=None)
+        if "error" in data:
+            raise OllamaError(data["error"])
+        return data.get("response", "")
+
+    async def _generate_shared(self, model: str, prompt: str, options: Optional[dict]) -> str:
+        key = (model, prompt, json.dumps(options or {}, sort_keys=True))
+        shared = self._inflight.get(key)
+        if shared is None:
+            task = asyncio.ensure_future(self._generate_once(model, prompt, options))
+            shared = [task, 0]
+            self._inflight[key] = shared
+            task.add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is shared else None)
+        else:
+            self.stats["coalesced"] += 1
+
+        shared[1] += 1
+        try:
+            return await asyncio.shield(shared[0])
+        except asyncio.CancelledError:
+            # The last waiter gone means nobody wants this generation any more
+            if shared[1] == 1 and not shared[0].done():
+                shared[0].cancel()
+                self.stats["cancelled"] += 1
+            raise
+        finally:
+            shared[1] -= 1
+
+    async def _stream(self, model: str, prompt: str, options: Optional[dict]) -> AsyncIterator[str]:
+        payload = {"model": model, "prompt": prompt, "stream": True, "options": options or {}}
+        # No total limit for streams - only the wait for each next chunk is bounded
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=self.timeout)
+        async with self._limit(model):
+            self.stats["generations"] += 1
+            async with self._get_session().post(f"{self.base_url}/api/generate", json=payload, timeout=timeout) as response:
+                if response.status != 200:
+                    raise OllamaError(f"Ollama returned HTTP {response.status}: {(await response.text())[:200]}")
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise OllamaError(data["error"])
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done"):
+                        break
+
+    # -------------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------------
+    async def generate(self, model: str, prompt: str, options: Optional[dict] = None) -> str:
+        """Generate a full answer; awaitable from any event loop"""
+        return await asyncio.wrap_future(self._submit(self._generate_shared(model, prompt, options)))
+
+    def generate_sync(self, model: str, prompt: str, options: Optional[dict] = None) -> str:
+        """Blocking generate for worker threads"""
+        return self._submit(self._generate_shared(model, prompt, options)).result()
+
+    def stream_sync(self, model: str, prompt: str, options: Optional[dict] = None) -> Iterator[str]:
+        """Blocking stream for worker threads; closing the iterator cancels the request.
+
+        Raises OllamaError when no chunk arrives within the client timeout.
+        """
+        events = queue.Queue()
+        task = self._submit(self._pump(model, prompt, options, events.put))
+        try:
+            while True:
+                try:
+                    kind, value = events.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise OllamaError(f"No response from Ollama within {self.timeout:g} s") from None
+                if kind == "token":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            task.cancel()
+
+    async def _pump(self, model: str, prompt: str, options: Optional[dict], put: Callable[[tuple], None]):
+        """Forward stream chunks to another thread or loop as (kind, value) events"""
+        try:
+            async for text in self._stream(model, prompt, options):
+                put(("token", text))
+            put(("done", None))
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            put(("error", e))
@@ -1,177 +1,1000 @@
 import os
+import json
+import hashlib
 import asyncio
-from typing import List, Optional
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
-from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores.chroma import Chroma
-from langchain_community.llms.ollama import Ollama
 
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
-from langchain.schema.runnable import RunnableMap, RunnablePassthrough
+
+from cache import LRUCache, normalize_text
+from embeddings import LazyEmbeddings, create_embeddings
+from intents import IntentMatcher
+from languages import DEFAULT_LANGUAGE, LANGUAGE_INSTRUCTIONS, normalize_query, resolve_language
+from context_builder import ContextBuilder
+from conversation_memory import ConversationContext, ConversationMemory
+from metrics import CHUNKS_INDEXED, FALLBACKS, in_context, report_error, span
+from ollama_client import OllamaClient
+from reranker import Reranker, create_scorer
+from vector_collections import CollectionHandle, CollectionManager
+
+
+# Models tried in order of preference when Ollama is reachable
+OLLAMA_MODELS = ["llama3", "llama2", "mistral", "phi"]
 
 
 class RAGChain:
-    def __init__(self, persist_directory: str = "vectorstore"):
+    def __init__(
+        self,
+        persist_directory: str = "vectorstore",
+        ollama_base_url: Optional[str] = None,
+        probe_timeout: float = 2.0,
+        background: bool = True,
+        embedding_cache_size: int = 1024,
+        answer_cache_size: int = 256,
+        answer_cache_ttl: Optional[float] = 3600,
+        embedding_batch_size: int = 64,
+        persist_every: int = 2000,
+        persist_interval: float = 30.0,
+        hybrid: bool = True,
+        context_token_budget: int = 1500,
+        max_open_collections: int = 16,
+        compact_vectors: bool = False,
+        embedding_backend: Optional[str] = None,
+        embedding_threads: Optional[int] = None,
+        llm_concurrency: int = 2,
+        llm_timeout: float = 120.0,
+        llm_reprobe_interval: float = 30.0,
+        memory: Optional[ConversationMemory] = None,
+        reranker_backend: Optional[str] = None,
+        rerank_candidates: int = 30,
+        rerank_budget: Optional[float] = None,
+        extractive_rescore: bool = False,
+        intents_file: Optional[str] = None,
+    ):
 
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        # The embedding model (backend chosen by EMBEDDING_BACKEND) is loaded
+        # in the background or on first use
+        self.embeddings = LazyEmbeddings(
+            lambda: create_embeddings(embedding_backend, num_threads=embedding_threads)
         )
 
-        self.vectorstore = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=self.embeddings
+        # Named Chroma collections (per tenant or workspace), opened on demand.
+        # With compact_vectors each collection also keeps an int8 vector index
+        # that serves searches with far less memory than Chroma's float32 one.
+        # Each collection's side indexes are checked against Chroma when it opens.
+        self.collections = CollectionManager(
+            persist_directory,
+            self.embeddings,
+            max_open=max_open_collections,
+            compact=compact_vectors,
+            on_open=self._open_collection,
         )
+        self._search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
 
-        # Try to initialize Ollama, with fallback handling
-        self.llm = None
+        # Ollama is probed in the background with a cheap model-list request;
+        # until then (and while it fails) the fallback response system is
+        # used. An unavailable Ollama is probed again every
+        # llm_reprobe_interval seconds, and an available one after a failed
+        # LLM call, so it comes back without a restart.
+        self.ollama_base_url = ollama_base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.probe_timeout = probe_timeout
+        self.llm_model = None
         self.ollama_available = False
+        self.llm_error = None
+        self.llm_reprobe_interval = llm_reprobe_interval
+        self._llm_checked_at = time.monotonic()
+        self._llm_probing = threading.Lock()
+        # Pooled asyncio client: at most llm_concurrency generations per model,
+        # identical in-flight prompts share one generation
+        self.ollama = OllamaClient(
+            self.ollama_base_url,
+            max_concurrency=llm_concurrency,
+            timeout=llm_timeout,
+            connect_timeout=probe_timeout,
+        )
+        self._llm_probed = threading.Event()
+        self._warmed_up = threading.Event()
+        # Warm-up step -> error, for the steps that failed (shown on /health)
+        self.warm_up_errors = {}
+
+        # Recent turns and rolling summary of the asker's session (optional);
+        # they rewrite follow-up questions for retrieval and prefix the prompts
+        self.memory = memory
+
+        # RAG and generic prompts for each answer language, built once; the
+        # language's instruction goes right before "Answer:"
+        self.prompts = {}
+        for language, instruction in LANGUAGE_INSTRUCTIONS.items():
+            # RAG prompt for document-based questions
+            rag_prompt = PromptTemplate(
+                input_variables=["context", "question", "history"],
+                template=(
+                    "You are a helpful assistant. Use the following context from uploaded documents to answer the question. "
+                    "If the context contains relevant information, use it to provide a detailed answer. "
+                    "If the context doesn't contain enough information, you can provide a general answer based on your knowledge.\n\n"
+                    "{history}"
+                    "Context from documents:\n{context}\n\n"
+                    "Question: {question}\n\n"
+                    + instruction
+                    + "Answer:"
+                ),
+            )
+            # Generic prompt for general questions
+            generic_prompt = PromptTemplate(
+                input_variables=["question", "history"],
+                template=(
+                    "You are a helpful AI assistant. Answer the following question in a friendly and informative way.\n\n"
+                    "{history}"
+                    "Question: {question}\n\n"
+                    + instruction
+                    + "Answer:"
+                ),
+            )
+            self.prompts[language] = (rag_prompt, generic_prompt)
+        self.rag_prompt, self.generic_prompt = self.prompts[DEFAULT_LANGUAGE]
+
+        # Ingestion: chunks are embedded in batches and the store (with the
+        # memory-mapped side indexes) is persisted once persist_every chunks
+        # or persist_interval seconds have accumulated, and by flush() at
+        # the end of a batch of uploads. Chunks lost to a crash before that
+        # are restored from Chroma by _reconcile_indexes.
+        self.embedding_batch_size = embedding_batch_size
+        self.persist_every = persist_every
+        self.persist_interval = persist_interval
+        self._write_lock = threading.Lock()
+
+        self.top_k = 4
+
+        # Optional cross-encoder stage (RERANKER_BACKEND): retrieval returns
+        # rerank_candidates chunks and only the best top_k reach the prompt.
+        # Past the time budget (RERANK_BUDGET_MS) the retrieval order is kept.
+        reranker_backend = reranker_backend or os.getenv("RERANKER_BACKEND") or None
+        if rerank_budget is None:
+            rerank_budget = float(os.getenv("RERANK_BUDGET_MS", "250")) / 1000
+        self.reranker = Reranker(
+            lambda: create_scorer(reranker_backend, num_threads=embedding_threads),
+            budget_seconds=rerank_budget,
+        ) if reranker_backend else None
+        self.rerank_candidates = rerank_candidates
+
+        # Without an LLM, answers are the best-matching sentences from the
+        # per-collection sentence index, with citations. With
+        # extractive_rescore the lexical scores are blended with the
+        # similarity of each sentence's chunk to the question embedding.
+        self.extractive_sentences = 3
+        self.extractive_candidates = 20
+        self.extractive_rescore = extractive_rescore
+
+        # Greetings and small talk get canned answers (intents.json, or
+        # INTENTS_FILE); the phrases are compiled into one regex up front
+        self.intents = IntentMatcher.load(intents_file)
+
+        # Each collection keeps a BM25 keyword index next to the vector
+        # store; its hits are fused with the dense hits by reciprocal-rank fusion
+        self.hybrid = hybrid
+
+        # Per-question cost counters (query embeddings / vector searches)
+        # and prompt sizes produced by the context builder
+        self.stats = {"embeddings": 0, "searches": 0, "prompt_tokens": 0, "context_tokens_saved": 0}
+
+        # Dedupes chunk overlap and keeps the RAG context within a token budget
+        self.context_builder = ContextBuilder(max_tokens=context_token_budget)
+
+        # Question embeddings keyed on (normalized question, language), and
+        # LLM answers on the same plus the retrieved chunk IDs. The answer
+        # cache is cleared whenever add_documents changes the corpus.
+        self.embedding_cache = LRUCache(maxsize=embedding_cache_size)
+        self.answer_cache = LRUCache(maxsize=answer_cache_size, ttl=answer_cache_ttl)
+
+        if background:
+            threading.Thread(target=self._warm_up, daemon=True).start()
+        else:
+            self._warm_up()
+
+    @property
+    def vectorstore(self) -> Chroma:
+        """Vector store of the default collection"""
+        return self.collections.get().vectorstore
+
+    # ---------------------------------------------------
+    # STARTUP - Probe Ollama and load the embedder off the request path
+    # ---------------------------------------------------
+    @property
+    def ready(self) -> bool:
+        """True once warm-up has finished and every step succeeded: the
+        embedder is loaded and the default collection is open. The LLM is
+        not part of it - without one, questions get extractive answers - and
+        its state is reported by ollama_available and llm_error."""
+        return self._warmed_up.is_set() and not self.warm_up_errors
+
+    def _warm_up(self):
         try:
-            # Try different models
-            models_to_try = ["llama3", "llama2", "mistral", "phi"]
-            for model_name in models_to_try:
-                try:
-                    self.llm = Ollama(model=model_name)
-                    # Quick test
-                    test_result = str(self.llm.invoke("hi"))
-                    if test_result and len(test_result) > 0:
-                        self.ollama_available = True
-                        print(f"✅ Ollama LLM initialized successfully with model: {model_name}")
-                        break
-                except:
-                    continue
-            
-            if not self.ollama_available:
-                print("⚠️ Ollama not available or no models found")
-                print("Using fallback response system")
+            self._probe_llm()
+        finally:
+            self._llm_probed.set()
+        try:
+            self.embeddings.load()
         except Exception as e:
-            print(f"⚠️ Ollama initialization error: {e}")
+            self._warm_up_failed("embeddings", f"⚠️ Embedding model load error: {e}")
+        if self.reranker is not None:
+            try:
+                self.reranker.load()
+            except Exception as e:
+                self._warm_up_failed("reranker", f"⚠️ Reranker model load error: {e}")
+        try:
+            # Opening the default collection reconciles its indexes
+            self.collections.get()
+        except Exception as e:
+            self._warm_up_failed("collections", f"⚠️ Could not open the default collection: {e}")
+        self._warmed_up.set()
+
+    def _warm_up_failed(self, step: str, message: str):
+        self.warm_up_errors[step] = message
+        report_error("warm_up", message)
+
+    def _open_collection(self, handle: CollectionHandle):
+        try:
+            self._reconcile_indexes(handle)
+        except Exception as e:
+            report_error("collections", f"⚠️ Index reconcile error in {handle.name}: {e}")
+
+    def _reconcile_indexes(self, handle: CollectionHandle):
+        """Bring a collection's keyword, sentence and compact indexes in line with Chroma.
+
+        The indexes are persisted separately from Chroma, so a crash can
+        leave them behind, and collections stored before an index existed
+        have none. They are always written and flushed together, so their
+        counts against Chroma's tell when ID sets must be compared: missing
+        chunks are indexed from the text and vectors stored in Chroma, and
+        chunks Chroma no longer has are dropped. A keyword index written by
+        an older tokenizer is emptied first, and so rebuilt the same way.
+        """
+        for index in (handle.keyword_index, handle.sentence_index):
+            if index.outdated:
+                index.clear()
+        count = handle.collection.count()
+        compact = handle.compact_index
+        if (
+            len(handle.keyword_index) == count
+            and (compact is None or len(compact) == count)
+            and (len(handle.sentence_index) > 0 or count == 0)
+        ):
+            return
+        with self._write_lock:
+            stored = set()
+            offset = 0
+            while True:
+                page = handle.collection.get(limit=10000, offset=offset, include=[])
+                if not page["ids"]:
+                    break
+                stored.update(page["ids"])
+                offset += len(page["ids"])
+
+            keyword_ids = handle.keyword_index.ids()
+            sentence_ids = handle.sentence_index.chunk_ids()
+            # Chunks too short to have a sentence are fetched again here;
+            # adding them to an index a second time is a no-op
+            missing = sorted((stored - keyword_ids) | (stored - sentence_ids))
+            for start in range(0, len(missing), 1000):
+                page = handle.collection.get(ids=missing[start:start + 1000], include=["documents"])
+                texts = [text or "" for text in page["documents"]]
+                handle.keyword_index.add(page["ids"], texts)
+                handle.sentence_index.add_chunks(page["ids"], texts)
+            if keyword_ids - stored:
+                handle.keyword_index.delete(list(keyword_ids - stored))
+            if sentence_ids - stored:
+                handle.sentence_index.delete_chunks(list(sentence_ids - stored))
+
+            if compact is not None:
+                compact_ids = compact.ids()
+                missing = sorted(stored - compact_ids)
+                for start in range(0, len(missing), 1000):
+                    page = handle.collection.get(ids=missing[start:start + 1000], include=["embeddings"])
+                    compact.add(page["ids"], page["embeddings"])
+                compact.delete(list(compact_ids - stored))
+            handle.flush()
+        print(f"Reconciled the indexes of collection {handle.name} with {len(stored)} stored chunks")
+
+    def _list_ollama_models(self) -> List[str]:
+        """Return the names of locally installed Ollama models"""
+        url = f"{self.ollama_base_url.rstrip('/')}/api/tags"
+        with urllib.request.urlopen(url, timeout=self.probe_timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        return [m.get("name", "") for m in payload.get("models", [])]
+
+    def _probe_llm(self):
+        """Pick the preferred installed model, or record why there is none"""
+        try:
+            installed = self._list_ollama_models()
+        except Exception as e:
+            self._llm_unavailable(f"⚠️ Ollama not reachable at {self.ollama_base_url}: {e}")
+            return
+        finally:
+            self._llm_checked_at = time.monotonic()
+
+        for model_name in OLLAMA_MODELS:
+            match = next(
+                (m for m in installed if m == model_name or m.startswith(model_name + ":")),
+                None
+            )
+            if match:
+                changed = match != self.llm_model or not self.ollama_available
+                self.llm_model = match
+                self.llm_error = None
+                self.ollama_available = True
+                if changed:
+                    print(f"✅ Ollama LLM initialized successfully with model: {match}")
+                return
+
+        self._llm_unavailable(f"⚠️ None of the models {', '.join(OLLAMA_MODELS)} is installed in Ollama")
+
+    def _llm_unavailable(self, message: str):
+        self.ollama_available = False
+        if message != self.llm_error:
+            report_error("ollama", message)
             print("Using fallback response system")
-            self.ollama_available = False
-
-        # RAG prompt for document-based questions
-        self.rag_prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template=(
-                "You are a helpful assistant. Use the following context from uploaded documents to answer the question. "
-                "If the context contains relevant information, use it to provide a detailed answer. "
-                "If the context doesn't contain enough information, you can provide a general answer based on your knowledge.\n\n"
-                "Context from documents:\n{context}\n\n"
-                "Question: {question}\n\n"
-                "Answer:"
-            ),
+        self.llm_error = message
+
+    def _reprobe_llm(self, failed: bool = False):
+        """Probe Ollama again in the background: every llm_reprobe_interval
+        seconds while it is unavailable, or right after a failed LLM call"""
+        if not failed and (
+            self.ollama_available or time.monotonic() - self._llm_checked_at < self.llm_reprobe_interval
+        ):
+            return
+        if not self._llm_probing.acquire(blocking=False):
+            return  # A probe is already running
+
+        def probe():
+            try:
+                self._probe_llm()
+            finally:
+                self._llm_probing.release()
+
+        threading.Thread(target=probe, daemon=True).start()
+
+    # ---------------------------------------------------
+    # ADD DOCUMENTS — Batched embedding, grouped persistence
+    # ---------------------------------------------------
+    def add_documents(
+        self,
+        texts: List[str],
+        metadata: Optional[List[dict]] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        ids: Optional[List[str]] = None,
+        collection: Optional[str] = None,
+    ) -> int:
+        """Embed chunks in batches and write them straight to the collection.
+
+        When ids are given, chunks whose ID is already stored (or repeated in
+        this call) are skipped without being embedded. on_progress is called
+        with the size of each batch once it is stored. Writes are persisted in
+        groups (see _maybe_persist); call flush() after the last one. Returns
+        the number of chunks added.
+        """
+        with self.collections.use(collection, create=True) as handle:
+            batch_size = max(1, self.embedding_batch_size)
+            metadata = metadata or [{} for _ in texts]
+
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in texts]
+            else:
+                existing = self._existing_ids(handle, ids)
+                keep = []
+                for i, chunk_id in enumerate(ids):
+                    if chunk_id not in existing:
+                        existing.add(chunk_id)
+                        keep.append(i)
+                texts = [texts[i] for i in keep]
+                metadata = [metadata[i] for i in keep]
+                ids = [ids[i] for i in keep]
+
+            for start in range(0, len(texts), batch_size):
+                batch = texts[start:start + batch_size]
+                batch_metadata = metadata[start:start + batch_size]
+                batch_ids = ids[start:start + batch_size]
+                with span("index_embed"):
+                    embeddings = self.embeddings.embed_documents(batch)
+                with span("index_write"), self._write_lock:
+                    # Chroma rejects empty metadata dicts, so those rows go in a
+                    # separate add without metadatas
+                    with_meta = [i for i, m in enumerate(batch_metadata) if m]
+                    without_meta = [i for i, m in enumerate(batch_metadata) if not m]
+                    for rows, include_meta in ((with_meta, True), (without_meta, False)):
+                        if rows:
+                            handle.collection.add(
+                                ids=[batch_ids[i] for i in rows],
+                                embeddings=[embeddings[i] for i in rows],
+                                documents=[batch[i] for i in rows],
+                                metadatas=[batch_metadata[i] for i in rows] if include_meta else None,
+                            )
+                with span("index_keywords"):
+                    handle.keyword_index.add(batch_ids, batch)
+                    handle.sentence_index.add_chunks(batch_ids, batch)
+                    if handle.compact_index is not None:
+                        handle.compact_index.add(batch_ids, embeddings)
+                CHUNKS_INDEXED.inc(len(batch))
+                if on_progress:
+                    on_progress(len(batch))
+
+            with self._write_lock:
+                if handle.doc_count is not None:
+                    handle.doc_count += len(texts)
+                handle.unpersisted += len(texts)
+            self._maybe_persist(handle)
+
+            self.answer_cache.clear()
+            return len(texts)
+
+    @staticmethod
+    def _existing_ids(handle: CollectionHandle, ids: List[str]) -> set:
+        # Chroma rejects repeated IDs, and identical chunks (headers, footers,
+        # boilerplate pages) share one
+        ids = list(dict.fromkeys(ids))
+        found = set()
+        for start in range(0, len(ids), 1000):
+            found.update(handle.collection.get(ids=ids[start:start + 1000], include=[])["ids"])
+        return found
+
+    # ---------------------------------------------------
+    # INDEX FILE — Content hashing and incremental re-indexing
+    # ---------------------------------------------------
+    @staticmethod
+    def chunk_id(source: str, text: str) -> str:
+        """Stable chunk ID: hash of the source document name and chunk text"""
+        return hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()
+
+    def is_indexed(self, file_hash: str, collection: Optional[str] = None) -> bool:
+        """True if a file with this content hash is already in the collection"""
+        if not self.collections.exists(collection):
+            return False
+        result = self.collections.get(collection).collection.get(
+            where={"file_hash": file_hash}, limit=1, include=[]
         )
+        return len(result["ids"]) > 0
 
-        # Generic prompt for general questions
-        self.generic_prompt = PromptTemplate(
-            input_variables=["question"],
-            template=(
-                "You are a helpful AI assistant. Answer the following question in a friendly and informative way.\n\n"
-                "Question: {question}\n\n"
-                "Answer:"
-            ),
+    def index_file(
+        self,
+        texts: List[str],
+        metadata: List[dict],
+        filename: str,
+        file_id: str,
+        file_hash: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        collection: Optional[str] = None,
+        replaces: Optional[str] = None,
+    ) -> dict:
+        """Index one uploaded file given as lists of chunks and metadata"""
+        return self.index_chunks(
+            zip(texts, metadata), filename, file_id, file_hash,
+            on_progress=on_progress, collection=collection, replaces=replaces,
         )
 
-        self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 4})
+    def index_chunks(
+        self,
+        chunks: Iterable[Tuple[str, dict]],
+        filename: str,
+        file_id: str,
+        file_hash: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        collection: Optional[str] = None,
+        replaces: Optional[str] = None,
+    ) -> dict:
+        """Index one uploaded file, re-embedding only chunks that changed.
 
-        # Convert all items from retriever → Document object
-        def normalize(doc):
-            if isinstance(doc, Document):
-                return doc
-            if isinstance(doc, dict):
-                return Document(
-                    page_content=doc.get("page_content", ""),
-                    metadata=doc.get("metadata", {})
+        A file is identified by its file_id (derived from the content hash),
+        so unrelated uploads sharing a name never touch each other. To index
+        a modified file over an earlier version, pass that version's file_id
+        as replaces: unchanged chunks are kept, new ones embedded, and chunks
+        that no longer appear are deleted once the whole file has been
+        indexed. If extraction fails or yields no chunks, the error is
+        raised, chunks added by this call are removed and the earlier
+        version is left as it was.
+
+        chunks can be a generator of (text, metadata): they are consumed one
+        embedding batch at a time, so a document never has to be held in
+        memory as a whole.
+        """
+        with self.collections.use(collection, create=True) as handle:
+            batch_size = max(1, self.embedding_batch_size)
+            # Chunk IDs hash a document key with the text. A replacement keeps
+            # the key of the version it replaces (its filename for chunks
+            # stored before keys existed), so its unchanged chunks keep their IDs.
+            source = {"file_id": replaces or file_id}
+            previous = set(handle.collection.get(where=source, include=[])["ids"])
+            doc_key = file_id
+            if previous:
+                stored = handle.collection.get(where=source, limit=1, include=["metadatas"])["metadatas"][0] or {}
+                doc_key = stored.get("doc_key") or stored.get("filename") or doc_key
+            seen = set()
+            kept = {}
+            total = added = 0
+
+            def index_batch(batch: List[Tuple[str, dict]]) -> int:
+                texts = [text for text, _ in batch]
+                ids = [self.chunk_id(doc_key, text) for text in texts]
+                metadatas = [
+                    {**(m or {}), "file_id": file_id, "filename": filename, "file_hash": file_hash, "doc_key": doc_key}
+                    for _, m in batch
+                ]
+                for chunk_id, m in zip(ids, metadatas):
+                    if chunk_id in previous and chunk_id not in seen:
+                        kept[chunk_id] = m
+                    seen.add(chunk_id)
+                return self.add_documents(
+                    texts, metadatas, on_progress=on_progress, ids=ids, collection=handle.name
                 )
-            return Document(page_content=str(doc))
-
-        # Build RAG chain for document-based queries (only if LLM is available)
-        if self.ollama_available:
-            self.rag_chain = (
-                RunnableMap({
-                    "context": self.retriever | (lambda docs: "\n\n".join(
-                        normalize(d).page_content for d in docs
-                    )),
-                    "question": RunnablePassthrough(),
-                })
-                | self.rag_prompt
-                | self.llm
-            )
 
-            # Build generic chain for general questions
-            self.generic_chain = (
-                self.generic_prompt
-                | self.llm
+            try:
+                batch = []
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        added += index_batch(batch)
+                        total += len(batch)
+                        batch = []
+                if batch:
+                    added += index_batch(batch)
+                    total += len(batch)
+                if total == 0:
+                    raise ValueError(f"No text could be extracted from {filename}")
+            except Exception:
+                added_ids = [chunk_id for chunk_id in seen if chunk_id not in previous]
+                self._delete_chunks(handle, self._existing_ids(handle, added_ids))
+                self._maybe_persist(handle)
+                raise
+
+            if kept:
+                # Unchanged chunks only need their source metadata refreshed
+                with self._write_lock:
+                    handle.collection.update(ids=list(kept), metadatas=list(kept.values()))
+            stale = [chunk_id for chunk_id in previous if chunk_id not in seen]
+            self._delete_chunks(handle, stale)
+            self._maybe_persist(handle)
+            return {"added": added, "skipped": total - added, "removed": len(stale)}
+
+    def _maybe_persist(self, handle: CollectionHandle):
+        """Persist a collection once persist_every writes or persist_interval seconds have built up"""
+        with self._write_lock:
+            due = (
+                handle.unpersisted >= self.persist_every
+                or time.monotonic() - handle.persisted_at >= self.persist_interval
             )
-        else:
-            self.rag_chain = None
-            self.generic_chain = None
+            if handle.unpersisted and due:
+                with span("index_persist"):
+                    handle.flush()
+
+    def _delete_chunks(self, handle: CollectionHandle, ids: Iterable[str]):
+        """Remove chunks from the collection and its side indexes"""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._write_lock:
+            handle.collection.delete(ids=ids)
+            handle.keyword_index.delete(ids)
+            handle.sentence_index.delete_chunks(ids)
+            if handle.compact_index is not None:
+                handle.compact_index.delete(ids)
+            if handle.doc_count is not None:
+                handle.doc_count -= len(ids)
+            handle.unpersisted += len(ids)
+        self.answer_cache.clear()
+
+    def flush(self):
+        """Persist any chunks written since the last persist"""
+        with self._write_lock:
+            for handle in self.collections.open_handles():
+                if handle.unpersisted:
+                    handle.flush()
+
+    def cache_stats(self) -> dict:
+        stats = {
+            "embeddings": self.embedding_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
+        if self.reranker is not None:
+            stats["rerank_scores"] = self.reranker.cache.stats()
+        return stats
 
     # ---------------------------------------------------
-    # ADD DOCUMENTS — Always store Document objects
+    # RETRIEVAL - One query embedding, one vector search
     # ---------------------------------------------------
-    def add_documents(self, texts: List[str], metadata: Optional[List[dict]] = None):
+    def _embed_query(self, question: str, language: str = DEFAULT_LANGUAGE) -> List[float]:
+        key = self._query_key(question, language)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            self.stats["embeddings"] += 1
+            embedding = self.embeddings.embed_query(question)
+            self.embedding_cache.put(key, embedding)
+        return embedding
 
-        documents = [
-            Document(
-                page_content=text,
-                metadata=metadata[i] if metadata else {}
-            )
-            for i, text in enumerate(texts)
+    def _embed_queries(self, questions: List[str], language: str = DEFAULT_LANGUAGE) -> List[List[float]]:
+        """Embed many questions, computing all cache misses in one embed_documents call"""
+        keys = [self._query_key(q, language) for q in questions]
+        found = {key: self.embedding_cache.get(key) for key in set(keys)}
+        missing = [key for key, embedding in found.items() if embedding is None]
+        if missing:
+            originals = {key: q for key, q in zip(keys, questions)}
+            self.stats["embeddings"] += len(missing)
+            computed = self.embeddings.embed_documents([originals[key] for key in missing])
+            for key, embedding in zip(missing, computed):
+                self.embedding_cache.put(key, embedding)
+                found[key] = embedding
+        return [found[key] for key in keys]
+
+    def _search(self, handle: CollectionHandle, embedding: List[float], k: int) -> List[Document]:
+        """Nearest-neighbour search returning Documents tagged with their chunk_id"""
+        return self._search_many(handle, [embedding], k)[0]
+
+    def _search_many(
+        self, handle: CollectionHandle, embeddings: List[List[float]], k: int
+    ) -> List[List[Document]]:
+        """Run the searches for several query embeddings in one collection query"""
+        self.stats["searches"] += len(embeddings)
+        if handle.compact_index is not None and len(handle.compact_index) > 0:
+            return self._search_compact(handle, embeddings, k)
+        results = handle.collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas"],
+        )
+        docs_per_query = []
+        for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"]):
+            metadatas = metadatas or [None] * len(ids)
+            docs_per_query.append([
+                self._make_doc(handle, chunk_id, text, metadata)
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ])
+        return docs_per_query
+
+    def _search_compact(
+        self, handle: CollectionHandle, embeddings: List[List[float]], k: int
+    ) -> List[List[Document]]:
+        """Search the int8 index, then load the hit texts from Chroma by id"""
+        hits = handle.compact_index.search_many(embeddings, k)
+        wanted = list(dict.fromkeys(chunk_id for ranked in hits for chunk_id, _ in ranked))
+        if not wanted:
+            return [[] for _ in embeddings]
+        fetched = handle.collection.get(ids=wanted, include=["documents", "metadatas"])
+        metadatas = fetched["metadatas"] or [None] * len(fetched["ids"])
+        docs_by_id = {
+            chunk_id: self._make_doc(handle, chunk_id, text, metadata)
+            for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], metadatas)
+        }
+        return [
+            [docs_by_id[chunk_id] for chunk_id, _ in ranked if chunk_id in docs_by_id]
+            for ranked in hits
         ]
 
-        self.vectorstore.add_documents(documents)
-        self.vectorstore.persist()
+    @staticmethod
+    def _make_doc(handle: CollectionHandle, chunk_id: str, text: Optional[str], metadata: Optional[dict]) -> Document:
+        return Document(
+            page_content=text or "",
+            metadata={**(metadata or {}), "chunk_id": chunk_id, "collection": handle.name}
+        )
+
+    @staticmethod
+    def _query_key(question: str, language: str) -> tuple:
+        """Cache key of a question already in its normalize_query form"""
+        return (normalize_text(question), language)
+
+    @classmethod
+    def _answer_key(cls, question: str, language: str, docs: List[Document], history: str = "") -> tuple:
+        chunk_ids = tuple(
+            (doc.metadata.get("collection", ""), doc.metadata.get("chunk_id", "")) for doc in docs
+        )
+        return (*cls._query_key(normalize_query(question, language), language), chunk_ids, history)
+
+    def _conversation(self, session_id: Optional[str]) -> Optional[ConversationContext]:
+        """Session context for a question, or None without memory or history"""
+        if self.memory is None or not session_id:
+            return None
+        try:
+            with span("conversation"):
+                return self.memory.context(session_id)
+        except Exception as e:
+            report_error("conversation", f"Conversation memory error: {e}")
+            return None
+
+    @staticmethod
+    def _history_text(question: str, conversation: Optional[ConversationContext]) -> str:
+        """Prompt prefix for a follow-up question; a self-contained one gets
+        none, which keeps its prompt short and its answer cache key shared
+        with the same question asked outside the conversation"""
+        if conversation is None or not conversation.is_follow_up(question):
+            return ""
+        return f"{conversation.prefix}\n\n"
+
+    @staticmethod
+    def _search_query(question: str, conversation: Optional[ConversationContext]) -> str:
+        return conversation.search_query(question) if conversation else question
+
+    def _pool_k(self) -> int:
+        """How many fused chunks retrieval keeps: top_k, or the reranker's candidates"""
+        return max(self.top_k, self.rerank_candidates) if self.reranker is not None else self.top_k
+
+    def _candidate_k(self) -> int:
+        # Fusion needs a deeper dense list than the chunks it keeps
+        return self._pool_k() * 2 if self.hybrid else self._pool_k()
+
+    def _retrieve(
+        self, question: str, collections: Optional[List[str]] = None, language: str = DEFAULT_LANGUAGE
+    ) -> List[Document]:
+        """Embed the question once and run one vector search per collection"""
+        return self._retrieve_many([question], collections, language)[0]
+
+    def _retrieve_many(
+        self, questions: List[str], collections: Optional[List[str]] = None, language: str = DEFAULT_LANGUAGE
+    ) -> List[List[Document]]:
+        """Retrieve for several questions with one embedding call and one search per collection.
+
+        With several collections the searches run in parallel and the
+        per-collection rankings are merged into one top-k. Questions are
+        searched in their normalized form for the language (see languages.py).
+        """
+        if not questions:
+            return []
+        questions = [normalize_query(q, language) for q in questions]
+        try:
+            handles = [h for h in self.collections.get_many(collections) if h.has_documents()]
+            if not handles:
+                return [[] for _ in questions]
+            with span("embed"):
+                embeddings = self._embed_queries(questions, language)
+
+            def search(handle):
+                dense = self._search_many(handle, embeddings, self._candidate_k())
+                return [self._fuse(handle, q, docs) for q, docs in zip(questions, dense)]
+
+            with span("search"):
+                if len(handles) == 1:
+                    per_handle = [search(handles[0])]
+                else:
+                    per_handle = list(self._search_pool.map(search, handles))
+
+            results = []
+            for i in range(len(questions)):
+                scored = [hit for ranked in per_handle for hit in ranked[i]]
+                scored.sort(key=lambda hit: hit[1], reverse=True)
+                results.append([doc for doc, _ in scored[:self._pool_k()]])
+
+            if self.reranker is not None:
+                with span("rerank"):
+                    results = [
+                        self.reranker.rerank(question, docs, self.top_k)
+                        for question, docs in zip(questions, results)
+                    ]
+            return results
+        except Exception as e:
+            report_error("search", f"Document search error: {e}")
+            return [[] for _ in questions]
+
+    def _fuse(
+        self, handle: CollectionHandle, question: str, dense_docs: List[Document], rrf_k: int = 60
+    ) -> List[Tuple[Document, float]]:
+        """Merge dense hits with BM25 hits by reciprocal-rank fusion, best first"""
+        if not self.hybrid:
+            return [
+                (doc, 1.0 / (rrf_k + rank + 1)) for rank, doc in enumerate(dense_docs[:self._pool_k()])
+            ]
+
+        keyword_hits = handle.keyword_index.search(question, k=self._candidate_k())
+        scores = {}
+        docs_by_id = {}
+        for rank, doc in enumerate(dense_docs):
+            chunk_id = doc.metadata.get("chunk_id")
+            docs_by_id[chunk_id] = doc
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+        for rank, (chunk_id, _) in enumerate(keyword_hits):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:self._pool_k()]
+        missing = [chunk_id for chunk_id in ranked if chunk_id not in docs_by_id]
+        if missing:
+            fetched = handle.collection.get(ids=missing, include=["documents", "metadatas"])
+            metadatas = fetched["metadatas"] or [None] * len(fetched["ids"])
+            for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], metadatas):
+                docs_by_id[chunk_id] = self._make_doc(handle, chunk_id, text, metadata)
+        return [(docs_by_id[chunk_id], scores[chunk_id]) for chunk_id in ranked if chunk_id in docs_by_id]
 
     # ---------------------------------------------------
     # QUERY - Handles both document-based and generic questions
     # ---------------------------------------------------
-    async def query(self, question: str, language: str = "english") -> str:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._query_sync, question, language)
+    async def query(
+        self,
+        question: str,
+        language: str = "english",
+        collections: Optional[List[str]] = None,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """Answer one question; retrieval runs in the default executor and
+        generation on the async Ollama client, so no thread is held while
+        the LLM is generating. Cancelling the caller cancels the generation."""
+        loop = asyncio.get_running_loop()
+        language = resolve_language(language)
+        try:
+            # in_context: spans recorded in the executor still reach this request's trace
+            conversation = await loop.run_in_executor(None, in_context(self._conversation), session_id)
+            answer, docs, answer_key = await loop.run_in_executor(
+                None, in_context(self._prepare_answer), question, language, None, collections, conversation
+            )
+            if answer is not None:
+                return answer
+
+            history = self._history_text(question, conversation)
+            result = None
+            context = self._build_context(question, docs, history, language)[0]
+            for prompt in self._llm_prompts(question, context, history, language):
+                try:
+                    with span("generate"):
+                        result = await self.ollama.generate(self.llm_model, prompt)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    report_error("generate", f"LLM generate error: {e}")
+                    self._reprobe_llm(failed=True)
+                    continue
+                if self._usable(result):
+                    break
+                result = None
+
+            if result is not None:
+                self.answer_cache.put(answer_key, result)
+                return result
+            FALLBACKS.inc(reason="llm_failed")
+            return self._get_fallback_response(question, docs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            report_error("query", f"Query error: {e}")
+            FALLBACKS.inc(reason="error")
+            return self._get_fallback_response(question)
+
+    def query_batch(
+        self,
+        questions: List[str],
+        language: str = "english",
+        max_concurrency: int = 4,
+        collections: Optional[List[str]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[Tuple[int, str]]:
+        """Answer many questions, yielding (index, answer) as each one completes.
+
+        Retrieval for the whole batch shares one embedding call and one
+        vector search call; LLM generations run on at most max_concurrency
+        threads. All questions see the session as it was before the batch.
+        Closing the iterator early cancels the questions not started yet.
+        """
+        language = resolve_language(language)
+        conversation = self._conversation(session_id)
+        self._llm_probed.wait(self.probe_timeout)
+        self._reprobe_llm()
+        # Without an LLM each question is answered from the sentence index instead
+        routed = [i for i, q in enumerate(questions) if not self._is_simple_greeting(q)] if self.ollama_available else []
+        retrieved = self._retrieve_many(
+            [self._search_query(questions[i], conversation) for i in routed], collections, language
+        )
+        docs_by_index = dict(zip(routed, retrieved))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+        try:
+            futures = {
+                pool.submit(
+                    in_context(self._query_sync), question, language, docs_by_index.get(i), collections, conversation
+                ): i
+                for i, question in enumerate(questions)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Runs when the consumer stops early too (GeneratorExit)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------------------------------------------------
+    # STREAM - Sources first, then LLM tokens as they arrive
+    # ---------------------------------------------------
+    def stream_query(
+        self,
+        question: str,
+        language: str = "english",
+        collections: Optional[List[str]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[dict]:
+        """Yield a "sources" event followed by "token" events for the answer"""
+        language = resolve_language(language)
+        if self._is_simple_greeting(question):
+            FALLBACKS.inc(reason="greeting")
+            yield {"type": "sources", "sources": []}
+            yield {"type": "token", "content": self._get_fallback_response(question)}
+            return
+
+        conversation = self._conversation(session_id)
+        history = self._history_text(question, conversation)
+        self._llm_probed.wait(self.probe_timeout)
+        self._reprobe_llm()
+
+        if not self.ollama_available:
+            FALLBACKS.inc(reason="no_llm")
+            answer, docs = self._answer_without_llm(question, collections, conversation, language)
+            yield {"type": "sources", "sources": self._format_sources(docs)}
+            yield {"type": "token", "content": answer}
+            return
+
+        docs = self._retrieve(self._search_query(question, conversation), collections, language)
+
+        context, context_info = self._build_context(question, docs, history, language)
+        yield {"type": "sources", "sources": self._format_sources(docs), "context": context_info}
 
-    def _has_documents(self) -> bool:
-        """Check if vector store has any documents"""
+        answer_key = self._answer_key(question, language, docs, history)
+        cached = self.answer_cache.get(answer_key)
+        if cached is not None:
+            yield {"type": "token", "content": cached}
+            return
+
+        for prompt in self._llm_prompts(question, context, history, language):
+            parts = []
+            try:
+                # Closing this generator (client disconnect) cancels the request.
+                # The span covers the whole stream, including time the client
+                # takes to read it.
+                with span("generate"):
+                    for text in self.ollama.stream_sync(self.llm_model, prompt):
+                        if text:
+                            parts.append(text)
+                            yield {"type": "token", "content": text}
+            except Exception as e:
+                report_error("generate", f"LLM stream error: {e}")
+                self._reprobe_llm(failed=True)
+                if parts:
+                    # Part of the answer is already on the wire - stop here
+                    return
+            if parts:
+                self.answer_cache.put(answer_key, "".join(parts))
+                return
+
+        FALLBACKS.inc(reason="llm_failed")
+        yield {"type": "token", "content": self._get_fallback_response(question, docs)}
+
+    @staticmethod
+    def _format_sources(docs: List[Document]) -> List[dict]:
+        return [
+            {"content": doc.page_content[:300], "metadata": doc.metadata or {}}
+            for doc in docs
+        ]
+
+    def _has_documents(self, collections: Optional[List[str]] = None) -> bool:
+        """Check if any of the collections has documents (cached counts, no search)"""
         try:
-            # Try to get a sample document
-            results = self.vectorstore.similarity_search("test", k=1)
-            return len(results) > 0
-        except:
+            return any(h.has_documents() for h in self.collections.get_many(collections))
+        except ValueError:
             return False
 
-    def _get_fallback_response(self, question: str) -> str:
+    def _get_fallback_response(self, question: str, docs: Optional[List[Document]] = None) -> str:
         """Fallback response system when LLM is not available"""
-        question_lower = question.lower().strip()
-        
-        # Greetings
-        if any(word in question_lower for word in ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]):
-            return "Hello! 👋 I'm your RAG chatbot assistant. I can help you with questions about uploaded documents or answer general questions. How can I assist you today?"
-        
-        # How are you
-        if "how are you" in question_lower or "how's it going" in question_lower:
-            return "I'm doing great, thank you for asking! I'm here and ready to help you with any questions you have. What would you like to know?"
-        
-        # Weather questions
-        if "weather" in question_lower:
-            return "I don't have access to real-time weather data, but I'd be happy to help you with other questions! You can ask me about uploaded documents or general knowledge topics."
-        
-        # What can you do / help
-        if any(phrase in question_lower for phrase in ["what can you do", "help", "what do you do", "capabilities"]):
-            return "I'm a RAG (Retrieval-Augmented Generation) chatbot! I can:\n• Answer questions about uploaded documents (PDF, PPT, DOCX, images)\n• Have general conversations\n• Help you find information from your documents\n\nUpload some documents and ask me questions about them!"
-        
-        # Document-related questions
-        if any(word in question_lower for word in ["document", "upload", "file", "pdf", "ppt", "docx"]):
-            has_docs = self._has_documents()
-            if has_docs:
-                return "I have access to your uploaded documents! Feel free to ask me specific questions about their content, and I'll search through them to find relevant information."
-            else:
-                return "I don't have any documents uploaded yet. Please go to the 'Upload Documents' tab and upload some files (PDF, PPT, DOCX, images, etc.), and then I can answer questions about them!"
-        
+        # Canned answers for greetings, small talk and questions about the bot
+        intent = self.intents.classify(question)
+        if intent is not None:
+            if intent.response_without_documents is not None and not (docs or self._has_documents()):
+                return intent.response_without_documents
+            return intent.response
+
         # Try to find relevant document content for the question
-        has_docs = self._has_documents()
+        has_docs = bool(docs) or self._has_documents()
         if has_docs:
             try:
-                docs = self.retriever.get_relevant_documents(question)
+                if docs is None:
+                    # Sentence index only - cheap enough for degraded mode
+                    answer, _ = self._extractive_answer(question)
+                    if answer is not None:
+                        return answer
                 if docs and len(docs) > 0:
                     # Extract relevant snippets
                     relevant_snippets = []
@@ -186,7 +1009,7 @@ class RAGChain:
                         response += "\n\n(Note: For AI-generated summaries and answers, please install Ollama: https://ollama.ai)"
                         return response
             except Exception as e:
-                print(f"Document search error: {e}")
+                report_error("search", f"Document search error: {e}")
         
         # Generic helpful responses
         if "?" in question:
@@ -197,79 +1020,237 @@ class RAGChain:
     
     def _is_simple_greeting(self, question: str) -> bool:
         """Check if question is a simple greeting that should use fallback"""
-        question_lower = question.lower().strip()
-        greetings = ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening", 
-                    "how are you", "how's it going", "what's up", "sup", "hi there", "hello there",
-                    "what can you do", "help", "what do you do", "capabilities"]
-        return any(greeting in question_lower for greeting in greetings)
+        intent = self.intents.classify(question)
+        return intent is not None and intent.route
+
+    def _answer_without_llm(
+        self,
+        question: str,
+        collections: Optional[List[str]] = None,
+        conversation: Optional[ConversationContext] = None,
+        language: str = DEFAULT_LANGUAGE,
+    ) -> Tuple[str, List[Document]]:
+        """Extractive answer when no LLM is available: (answer, cited chunks)"""
+        answer, docs = self._extractive_answer(self._search_query(question, conversation), collections, language)
+        if answer is not None:
+            return answer, docs
+
+        # Nothing matched - use fallback response system
+        return self._get_fallback_response(question, []), []
 
-    def _query_sync(self, question: str, language: str = "english") -> str:
+    # ---------------------------------------------------
+    # EXTRACTIVE ANSWERS - Sentence index, no LLM or embedding
+    # ---------------------------------------------------
+    def _extractive_answer(
+        self, question: str, collections: Optional[List[str]] = None, language: str = DEFAULT_LANGUAGE
+    ) -> Tuple[Optional[str], List[Document]]:
+        """The best-matching sentences with numbered source citations, or
+        (None, []) when no sentence shares a term with the question"""
+        question = normalize_query(question, language)
         try:
-            # Always use fallback for simple greetings first
-            if self._is_simple_greeting(question):
-                return self._get_fallback_response(question)
-            
-            # If LLM is not available, use fallback
-            if not self.ollama_available:
-                # Check if we have documents for document-based search (only for non-greeting questions)
-                has_docs = self._has_documents()
-                if has_docs:
-                    try:
-                        # Try to find relevant document content
-                        docs = self.retriever.get_relevant_documents(question)
-                        if docs and len(docs) > 0:
-                            context = "\n\n".join([doc.page_content[:500] for doc in docs if doc.page_content][:3])
-                            if len(context.strip()) > 10:
-                                return f"Based on your uploaded documents, here's what I found:\n\n{context[:1000]}...\n\n(Note: For full AI-powered responses, please install and run Ollama)"
-                    except Exception as e:
-                        print(f"Document search error in fallback: {e}")
-                        pass
-                
-                # Use fallback response system
-                return self._get_fallback_response(question)
-            
-            # LLM is available - use it
-            # Check if we have documents in the vector store
-            has_docs = self._has_documents()
-            
-            if has_docs:
-                # Try RAG first - retrieve relevant documents
-                try:
-                    docs = self.retriever.get_relevant_documents(question)
-                    
-                    if docs and len(docs) > 0:
-                        # We have relevant documents, use RAG
-                        context = "\n\n".join([doc.page_content for doc in docs if doc.page_content])
-                        
-                        # Check if context is meaningful (not just empty or very short)
-                        if len(context.strip()) > 10:
-                            # Use RAG with document context
-                            try:
-                                result = self.rag_chain.invoke(question)
-                                if result and len(result.strip()) > 0 and not result.strip().startswith("Error"):
-                                    return result
-                            except Exception as chain_error:
-                                print(f"RAG chain invoke error: {chain_error}")
-                                # Fall through to generic response
-                except Exception as rag_error:
-                    print(f"RAG retrieval error: {rag_error}")
-                    # Fall through to generic response
-            
-            # Fallback to generic response (no documents or RAG failed)
+            with span("extract_answer"):
+                handles = [h for h in self.collections.get_many(collections) if h.has_documents()]
+                hits = []
+                for handle in handles:
+                    for chunk_id, start, end, score in handle.sentence_index.search_sentences(
+                        question, k=self.extractive_candidates
+                    ):
+                        hits.append((score, handle, chunk_id, start, end))
+                if not hits:
+                    return None, []
+
+                hits.sort(key=lambda hit: hit[0], reverse=True)
+                rescore = self.extractive_rescore and self.embeddings.loaded
+                if not rescore:
+                    # Only the leading sentences can make it into the answer
+                    hits = hits[:self.extractive_sentences * 3]
+                chunks = self._fetch_chunks(hits, embeddings=rescore)
+                if rescore:
+                    hits = self._rescore_sentences(question, hits, chunks, language)
+                    hits.sort(key=lambda hit: hit[0], reverse=True)
+
+                lines, cited, seen = [], {}, set()
+                for _, handle, chunk_id, start, end in hits:
+                    found = chunks.get((handle.name, chunk_id))
+                    if found is None:
+                        continue
+                    sentence = " ".join(found[0].page_content[start:end].split())
+                    if normalize_text(sentence) in seen:
+                        # Chunk overlap repeats sentences
+                        continue
+                    seen.add(normalize_text(sentence))
+                    number = cited.setdefault((handle.name, chunk_id), len(cited) + 1)
+                    lines.append(f"• {sentence} [{number}]")
+                    if len(lines) == self.extractive_sentences:
+                        break
+                if not lines:
+                    return None, []
+
+                docs = [chunks[key][0] for key in cited]
+                sources = [f"[{n}] {self._citation(doc)}" for n, doc in enumerate(docs, start=1)]
+                answer = (
+                    "Based on your uploaded documents:\n\n" + "\n".join(lines)
+                    + "\n\nSources:\n" + "\n".join(sources)
+                    + "\n\n(Note: For full AI-powered responses, please install and run Ollama)"
+                )
+                return answer, docs
+        except Exception as e:
+            report_error("extract_answer", f"Extractive answer error: {e}")
+            return None, []
+
+    def _fetch_chunks(self, hits: list, embeddings: bool = False) -> dict:
+        """(collection, chunk_id) -> (Document, embedding or None) for the hit chunks"""
+        include = ["documents", "metadatas"] + (["embeddings"] if embeddings else [])
+        by_handle = {}
+        for _, handle, chunk_id, _, _ in hits:
+            by_handle.setdefault(handle.name, (handle, {}))[1][chunk_id] = None
+
+        chunks = {}
+        for handle, wanted in by_handle.values():
+            fetched = handle.collection.get(ids=list(wanted), include=include)
+            metadatas = fetched["metadatas"] or [None] * len(fetched["ids"])
+            embeddings = fetched.get("embeddings")
+            if embeddings is None:
+                embeddings = [None] * len(fetched["ids"])
+            for chunk_id, text, metadata, embedding in zip(fetched["ids"], fetched["documents"], metadatas, embeddings):
+                chunks[(handle.name, chunk_id)] = (self._make_doc(handle, chunk_id, text, metadata), embedding)
+        return chunks
+
+    def _rescore_sentences(
+        self, question: str, hits: list, chunks: dict, language: str = DEFAULT_LANGUAGE, weight: float = 0.5
+    ) -> list:
+        """Blend normalized BM25 with the cosine similarity of each sentence's chunk to the question"""
+        query = self._embed_query(question, language)
+        query_norm = sum(v * v for v in query) ** 0.5 or 1.0
+        top = max(hit[0] for hit in hits) or 1.0
+        rescored = []
+        for score, handle, chunk_id, start, end in hits:
+            found = chunks.get((handle.name, chunk_id))
+            similarity = 0.0
+            if found is not None and found[1] is not None:
+                vector = found[1]
+                norm = sum(v * v for v in vector) ** 0.5 or 1.0
+                similarity = sum(a * b for a, b in zip(query, vector)) / (query_norm * norm)
+            rescored.append(((1 - weight) * score / top + weight * similarity, handle, chunk_id, start, end))
+        return rescored
+
+    @staticmethod
+    def _citation(doc: Document) -> str:
+        metadata = doc.metadata or {}
+        label = metadata.get("filename") or "document"
+        for unit in ("page", "slide"):
+            if metadata.get(unit):
+                return f"{label}, {unit} {metadata[unit]}"
+        return label
+
+    def _build_context(
+        self, question: str, docs: List[Document], history: str = "", language: str = DEFAULT_LANGUAGE
+    ) -> Tuple[str, dict]:
+        """Budgeted, deduplicated context plus its token counts"""
+        with span("prompt"):
+            context, info = self.context_builder.build(docs)
+            info["history_tokens"] = self.context_builder.count_tokens(history)
+            info["prompt_tokens"] = self.context_builder.count_tokens(
+                self.prompts[language][0].format(context=context, question=question, history=history)
+            )
+        self.stats["prompt_tokens"] += info["prompt_tokens"]
+        self.stats["context_tokens_saved"] += info["raw_tokens"] - info["context_tokens"]
+        return context, info
+
+    def _llm_prompts(
+        self, question: str, context: str, history: str = "", language: str = DEFAULT_LANGUAGE
+    ) -> List[str]:
+        """Prompts to try in order: RAG when the context is meaningful, then generic"""
+        rag_prompt, generic_prompt = self.prompts[language]
+        prompts = []
+        if len(context.strip()) > 10:
+            prompts.append(rag_prompt.format(context=context, question=question, history=history))
+        prompts.append(generic_prompt.format(question=question, history=history))
+        return prompts
+
+    @staticmethod
+    def _usable(result: Optional[str]) -> bool:
+        return bool(result and result.strip()) and not result.strip().startswith("Error")
+
+    def _generate(
+        self, question: str, docs: List[Document], history: str = "", language: str = DEFAULT_LANGUAGE
+    ) -> Optional[str]:
+        """Try the RAG prompt (or the generic prompt) and return None on failure"""
+        context = self._build_context(question, docs, history, language)[0] if docs else ""
+        for prompt in self._llm_prompts(question, context, history, language):
             try:
-                result = self.generic_chain.invoke({"question": question})
-                if result and len(result.strip()) > 0:
+                with span("generate"):
+                    result = self.ollama.generate_sync(self.llm_model, prompt)
+                if self._usable(result):
                     return result
-            except Exception as generic_error:
-                print(f"Generic LLM error: {generic_error}")
-                # Use fallback
-                return self._get_fallback_response(question)
-            
+            except Exception as e:
+                report_error("generate", f"LLM generate error: {e}")
+                self._reprobe_llm(failed=True)
+        return None
+
+    def _prepare_answer(
+        self,
+        question: str,
+        language: str = "english",
+        docs: Optional[List[Document]] = None,
+        collections: Optional[List[str]] = None,
+        conversation: Optional[ConversationContext] = None,
+    ) -> Tuple[Optional[str], List[Document], Optional[tuple]]:
+        """Everything before generation: (answer, docs, answer_key).
+
+        The answer is set when no LLM call is needed - greetings, no LLM
+        available, or a cached answer for the same context.
+        """
+        # Always use fallback for simple greetings first
+        if self._is_simple_greeting(question):
+            FALLBACKS.inc(reason="greeting")
+            return self._get_fallback_response(question), [], None
+
+        # Give a still-running Ollama probe a moment to finish
+        self._llm_probed.wait(self.probe_timeout)
+        self._reprobe_llm()
+
+        # If LLM is not available, answer from the sentence index - no
+        # embedding or vector search needed
+        if not self.ollama_available:
+            FALLBACKS.inc(reason="no_llm")
+            answer, docs = self._answer_without_llm(question, collections, conversation, language)
+            return answer, docs, None
+
+        # Retrieve once - the same documents feed generation and the answer cache
+        if docs is None:
+            docs = self._retrieve(self._search_query(question, conversation), collections, language)
+
+        # LLM is available - reuse a stored answer for the same context
+        answer_key = self._answer_key(question, language, docs, self._history_text(question, conversation))
+        return self.answer_cache.get(answer_key), docs, answer_key
+
+    def _query_sync(
+        self,
+        question: str,
+        language: str = "english",
+        docs: Optional[List[Document]] = None,
+        collections: Optional[List[str]] = None,
+        conversation: Optional[ConversationContext] = None,
+    ) -> str:
+        """Answer one question; docs are retrieved here unless already provided"""
+        try:
+            answer, docs, answer_key = self._prepare_answer(question, language, docs, collections, conversation)
+            if answer is not None:
+                return answer
+
+            result = self._generate(question, docs, self._history_text(question, conversation), language)
+            if result is not None:
+                self.answer_cache.put(answer_key, result)
+                return result
+
             # If both fail, return a helpful message
-            return self._get_fallback_response(question)
+            FALLBACKS.inc(reason="llm_failed")
+            return self._get_fallback_response(question, docs)
             
         except Exception as e:
-            print(f"Query error: {e}")
+            report_error("query", f"Query error: {e}")
+            FALLBACKS.inc(reason="error")
             import traceback
             traceback.print_exc()
             # Always use fallback response - never return error messages
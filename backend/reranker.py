@@ -0,0 +1,240 @@
+"""Cross-encoder reranking of retrieved chunks.
+
+Retrieval hands over a deep candidate list (dense + BM25, ~30 chunks) and
+the reranker rescores each (question, chunk) pair with a small local
+cross-encoder, so only the best few chunks reach the LLM prompt. Scores
+are cached by (question, chunk ID). Every call has a hard time budget:
+when scoring would run past it, the candidates keep their retrieval order.
+"""
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+from cache import LRUCache, normalize_text
+from keyword_index import tokenize
+from metrics import RERANKS, report_error
+
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+ONNX_RERANK_MODEL_FILE = "onnx/model.onnx"
+
+RERANKER_BACKENDS = ("onnx", "huggingface", "overlap")
+
+
+# -------------------------------------------------------
+# SCORERS - (question, passages) -> one relevance score per passage
+# -------------------------------------------------------
+class OnnxCrossEncoder:
+    """ms-marco MiniLM cross-encoder on ONNX Runtime (no PyTorch needed)"""
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        model_file: str = ONNX_RERANK_MODEL_FILE,
+        model_dir: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        max_length: int = 256,
+    ):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+
+        def resolve(filename: str) -> str:
+            if model_dir:
+                return os.path.join(model_dir, filename)
+            from huggingface_hub import hf_hub_download
+            return hf_hub_download(model_name, filename)
+
+        self.tokenizer = Tokenizer.from_file(resolve("tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            resolve(model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def score(self, question: str, passages: Sequence[str]) -> List[float]:
+        np = self._np
+        encodings = self.tokenizer.encode_batch([(question, passage) for passage in passages])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        return [float(row[0]) for row in logits]
+
+
+class TorchCrossEncoder:
+    """The same cross-encoder through sentence-transformers (PyTorch)"""
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = 256):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=max_length)
+
+    def score(self, question: str, passages: Sequence[str]) -> List[float]:
+        scores = self.model.predict([(question, passage) for passage in passages], batch_size=len(passages))
+        return [float(s) for s in scores]
+
+
+class OverlapScorer:
+    """Model-free scorer: share of question terms and word pairs found in the passage.
+
+    Used by the benchmarks and for trying the stage out offline. Rewarding
+    word pairs in question order picks up phrasing that bag-of-words
+    retrieval misses, but it understands nothing a cross-encoder does.
+    """
+
+    def score(self, question: str, passages: Sequence[str]) -> List[float]:
+        terms = tokenize(question)
+        unique = set(terms)
+        pairs = set(zip(terms, terms[1:]))
+        scores = []
+        for passage in passages:
+            words = tokenize(passage)
+            present = set(words)
+            passage_pairs = set(zip(words, words[1:]))
+            score = len(unique & present) / (len(unique) or 1)
+            score += 2 * len(pairs & passage_pairs) / (len(pairs) or 1)
+            scores.append(score)
+        return scores
+
+
+def create_scorer(backend: str, num_threads: Optional[int] = None):
+    """Build the cross-encoder named by ``backend`` (see RERANKER_BACKENDS)"""
+    backend = backend.lower()
+    if backend == "onnx":
+        return OnnxCrossEncoder(model_dir=os.getenv("RERANK_MODEL_DIR") or None, num_threads=num_threads)
+    if backend == "huggingface":
+        return TorchCrossEncoder()
+    if backend == "overlap":
+        return OverlapScorer()
+    raise ValueError(f"Unknown reranker backend {backend!r}; expected one of {', '.join(RERANKER_BACKENDS)}")
+
+
+# -------------------------------------------------------
+# RERANKING STAGE
+# -------------------------------------------------------
+class Reranker:
+    """Batched, cached cross-encoder reranking with a per-call time budget.
+
+    Candidates are scored in retrieval order, ``batch_size`` pairs per model
+    call. Before each batch the reranker checks that the batch - at the
+    recently measured cost per pair, seeded by a timed batch when the model
+    loads - still fits in ``budget_seconds``; if not, or if a batch ran past
+    the deadline anyway, the call returns the retrieval order. Scores
+    computed before the budget ran out are still cached, so a repeated
+    question finishes. The scorer is built by ``factory`` on first use (or
+    by ``load``).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], object],
+        batch_size: int = 16,
+        budget_seconds: float = 0.25,
+        cache_size: int = 4096,
+    ):
+        self._factory = factory
+        self._scorer = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self.batch_size = max(1, batch_size)
+        self.budget_seconds = budget_seconds
+        # Moving average of model time per (question, chunk) pair
+        self.pair_seconds = 0.0
+        # (normalized question, collection, chunk_id) -> score
+        self.cache = LRUCache(maxsize=cache_size)
+
+    @property
+    def loaded(self) -> bool:
+        return self._scorer is not None
+
+    def load(self):
+        if self._scorer is None:
+            with self._lock:
+                if self._scorer is None:
+                    scorer = self._factory()
+                    self.pair_seconds = self._measure(scorer)
+                    self._scorer = scorer
+        return self._scorer
+
+    def _measure(self, scorer) -> float:
+        """Model time per pair for one full batch of chunk-sized passages"""
+        passage = " ".join(["retrieved chunk text"] * 60)
+        passages = [passage] * self.batch_size
+        scorer.score("warm-up question", passages)  # first call pays one-off setup
+        start = time.perf_counter()
+        scorer.score("warm-up question", passages)
+        return (time.perf_counter() - start) / self.batch_size
+
+    @staticmethod
+    def _key(question: str, doc: Document) -> Tuple[str, str, str]:
+        return (question, doc.metadata.get("collection", ""), doc.metadata.get("chunk_id", ""))
+
+    def rerank(self, question: str, docs: List[Document], top_k: int) -> List[Document]:
+        """The top_k of docs by cross-encoder score, or docs[:top_k] in
+        their given order when the budget runs out or scoring fails"""
+        if len(docs) <= 1:
+            return docs[:top_k]
+        deadline = time.perf_counter() + self.budget_seconds
+        if not self.loaded:
+            # A cold model would blow the budget on its own; load it for next time
+            if not self._loading:
+                self._loading = True
+                threading.Thread(target=self._load_quietly, daemon=True).start()
+            RERANKS.inc(result="not_loaded")
+            return docs[:top_k]
+
+        normalized = normalize_text(question)
+        keys = [self._key(normalized, doc) for doc in docs]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            now = time.perf_counter()
+            if now + self.pair_seconds * len(batch) > deadline:
+                # Let the estimate recover if a slow batch inflated it
+                self.pair_seconds *= 0.9
+                RERANKS.inc(result="timeout")
+                return docs[:top_k]
+            try:
+                batch_scores = self._scorer.score(question, [docs[i].page_content for i in batch])
+            except Exception as e:
+                report_error("rerank", f"Reranking error: {e}")
+                RERANKS.inc(result="failed")
+                return docs[:top_k]
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+            finished = time.perf_counter()
+            per_pair = (finished - now) / len(batch)
+            self.pair_seconds = per_pair if not self.pair_seconds else 0.7 * self.pair_seconds + 0.3 * per_pair
+            if finished > deadline:
+                # The estimate was too low: this call is late already
+                RERANKS.inc(result="timeout")
+                return docs[:top_k]
+
+        RERANKS.inc(result="reranked")
+        # Stable sort: ties keep their retrieval order
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [docs[i] for i in order[:top_k]]
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception as e:
+            report_error("rerank", f"⚠️ Reranker model load error: {e}")
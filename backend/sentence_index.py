@@ -0,0 +1,69 @@
+import re
+from typing import Iterator, List, Tuple
+
+from keyword_index import KeywordIndex
+
+
+# Sentence ends: . ! ? or the Devanagari danda, followed by whitespace; or a line break
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n+")
+
+# Sentences without punctuation (e.g. PDF tables) are cut to this length
+MAX_SENTENCE_CHARS = 400
+# Fragments with fewer words than this ("Page 3", "Figure 2.") are not indexed
+MIN_SENTENCE_WORDS = 3
+
+
+def split_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in text"""
+    start = 0
+    for match in _SENTENCE_END.finditer(text + "\n"):
+        end = match.start()
+        while end - start > MAX_SENTENCE_CHARS:
+            cut = text.rfind(" ", start, start + MAX_SENTENCE_CHARS)
+            cut = cut if cut > start else start + MAX_SENTENCE_CHARS
+            yield start, cut
+            start = cut + 1
+        if text[start:end].strip():
+            yield start, end
+        start = match.end()
+
+
+class SentenceIndex(KeywordIndex):
+    """BM25 index over the sentences of every chunk, for extractive answers.
+
+    Each sentence is a document with the ID ``<chunk_id>:<start>:<end>``
+    (its character span in the chunk), so a hit names its chunk - and
+    through it the text and source metadata stored in Chroma - without
+    keeping a second copy of the text.
+    """
+
+    def add_chunks(self, chunk_ids: List[str], texts: List[str]):
+        ids, sentences = [], []
+        for chunk_id, text in zip(chunk_ids, texts):
+            for start, end in split_sentences(text or ""):
+                sentence = text[start:end]
+                if len(sentence.split(None, MIN_SENTENCE_WORDS - 1)) >= MIN_SENTENCE_WORDS:
+                    ids.append(f"{chunk_id}:{start}:{end}")
+                    sentences.append(sentence)
+        self.add(ids, sentences)
+
+    def delete_chunks(self, chunk_ids: List[str]):
+        wanted = set(chunk_ids)
+        with self._lock:
+            self._deleted.update(
+                number for sentence_id, number in self._doc_numbers.items()
+                if sentence_id.rsplit(":", 2)[0] in wanted
+            )
+            self._deleted_array = None
+
+    def chunk_ids(self) -> set:
+        """IDs of the chunks with at least one indexed sentence"""
+        return {sentence_id.rsplit(":", 2)[0] for sentence_id in self.ids()}
+
+    def search_sentences(self, query: str, k: int = 10) -> List[Tuple[str, int, int, float]]:
+        """Up to k (chunk_id, start, end, BM25 score), best first"""
+        results = []
+        for sentence_id, score in self.search(query, k=k):
+            chunk_id, start, end = sentence_id.rsplit(":", 2)
+            results.append((chunk_id, int(start), int(end), score))
+        return results
@@ -0,0 +1,101 @@
+"""Synthetic corpus generators used by the benchmark scripts"""
+import os
+import random
+from typing import List
+
+
+WORDS = (
+    "policy leave employee manager approval payroll holiday travel expense "
+    "reimbursement laptop security password network office remote contract "
+    "invoice customer support ticket escalation warranty shipment order refund "
+    "training onboarding review benefit insurance claim schedule meeting report"
+).split()
+
+
+def make_paragraphs(count: int, words_per_paragraph: int = 80, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    paragraphs = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(words_per_paragraph)]
+        paragraphs.append(f"Section {i}. " + " ".join(words).capitalize() + ".")
+    return paragraphs
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], line_width: int = 90):
+    """Write a minimal text PDF (Helvetica, one string per page) without extra dependencies"""
+    objects = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    for text in pages:
+        lines = [text[i:i + line_width] for i in range(0, len(text), line_width)] or [""]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_escape_pdf_text(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        objects.append((page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")))
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")),
+        (font_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for obj_id, body in objects:
+            offsets[obj_id] = f.tell()
+            f.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (next_id))
+        for obj_id in range(1, next_id):
+            f.write(b"%010d 00000 n \n" % offsets[obj_id])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref))
+
+
+def write_docx(path: str, pages: List[str]):
+    """Write a Word document with one paragraph per page of text"""
+    import docx
+    document = docx.Document()
+    for text in pages:
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def write_pptx(path: str, pages: List[str]):
+    """Write a PowerPoint deck with one text box slide per page of text"""
+    import pptx
+    from pptx.util import Inches
+    deck = pptx.Presentation()
+    layout = deck.slide_layouts[6]  # blank
+    for text in pages:
+        slide = deck.slides.add_slide(layout)
+        slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6.5)).text_frame.text = text
+    deck.save(path)
+
+
+def write_txt(path: str, pages: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(pages))
+
+
+WRITERS = {".pdf": write_pdf, ".docx": write_docx, ".pptx": write_pptx, ".txt": write_txt}
+
+
+def write_document(path: str, pages: List[str]):
+    """Write pages of text in the format given by the file extension"""
+    WRITERS[os.path.splitext(path)[1].lower()](path, pages)
@@ -0,0 +1,80 @@
+"""HTTP API: pagination cursors and conditional GETs on history endpoints.
+
+main.py builds its components at import time in the working directory, so
+the module is imported inside a scratch directory, with the model-free
+embedding backend and an unreachable Ollama.
+"""
+import importlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("api")
+    saved_cwd = os.getcwd()
+    saved_env = {k: os.environ.get(k) for k in ("EMBEDDING_BACKEND", "OLLAMA_BASE_URL")}
+    os.chdir(directory)
+    os.environ["EMBEDDING_BACKEND"] = "hash"
+    os.environ["OLLAMA_BASE_URL"] = "http://127.0.0.1:9"
+    try:
+        main = importlib.import_module("main")
+        with TestClient(main.app) as client:
+            yield main, client
+        main.rag_chain.ollama.close()
+    finally:
+        os.chdir(saved_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def test_history_etag_answers_304_until_session_changes(api):
+    main, client = api
+    main.chat_history.save_message("etag-session", "q1", "a1", "english")
+
+    first = client.get("/history/etag-session")
+    etag = first.headers["etag"]
+    again = client.get("/history/etag-session", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    main.chat_history.save_message("etag-session", "q2", "a2", "english")
+    changed = client.get("/history/etag-session", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [m["question"] for m in changed.json()["history"]] == ["q1", "q2"]
+
+
+def test_history_pages_with_cursors(api):
+    main, client = api
+    for i in range(5):
+        main.chat_history.save_message("paged", f"q{i}", "a", "english")
+
+    page = client.get("/history/paged", params={"limit": 2}).json()
+    assert [m["question"] for m in page["history"]] == ["q3", "q4"] and page["has_more"]
+    older = client.get("/history/paged", params={"limit": 2, "before": page["before_cursor"]}).json()
+    assert [m["question"] for m in older["history"]] == ["q1", "q2"]
+
+
+def test_sessions_page_with_next_cursor_and_etag(api):
+    main, client = api
+    for i in range(3):
+        main.chat_history.save_message(f"list-{i}", "q", "a", "english")
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"before": cursor} if cursor else {})}
+        page = client.get("/sessions", params=params).json()
+        seen.extend(s["session_id"] for s in page["sessions"])
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert len(seen) == len(set(seen))
+    assert {"list-0", "list-1", "list-2"} <= set(seen)
+
+    etag = client.get("/sessions").headers["etag"]
+    assert client.get("/sessions", headers={"If-None-Match": etag}).status_code == 304
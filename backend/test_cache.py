@@ -0,0 +1,32 @@
+"""LRUCache eviction, expiry and key normalization."""
+import time
+
+from cache import LRUCache, normalize_text
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_entries_expire_after_ttl():
+    cache = LRUCache(maxsize=4, ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_questions_differing_in_case_and_spacing_share_a_key():
+    assert normalize_text("  What is\tthe  Refund policy?") == normalize_text("what is the refund policy?")
@@ -0,0 +1,98 @@
+"""ChatHistoryManager: the SQLite store, its JSON migration and pagination."""
+import json
+import threading
+
+from chat_history import ChatHistoryManager
+
+
+def test_messages_and_session_summary_survive_reopen(tmp_path):
+    history = ChatHistoryManager(history_dir=str(tmp_path))
+    history.save_message("s1", "What is the refund policy?", "30 days.", "english")
+    history.save_message("s1", "And shipping?", "Five days.", "english")
+    history.save_message("s2", "Hi", "Hello!", "english")
+
+    reopened = ChatHistoryManager(history_dir=str(tmp_path))
+    messages = reopened.get_history("s1")
+    assert [m["question"] for m in messages] == ["What is the refund policy?", "And shipping?"]
+    assert reopened.get_session("s1")["message_count"] == 2
+    assert {s["session_id"] for s in reopened.get_all_sessions()} == {"s1", "s2"}
+
+    reopened.delete_session("s1")
+    assert reopened.get_history("s1") == []
+    assert reopened.get_session("s1") is None
+
+
+def test_concurrent_writers_lose_no_messages(tmp_path):
+    history = ChatHistoryManager(history_dir=str(tmp_path))
+
+    def write(worker):
+        for i in range(25):
+            history.save_message("shared", f"q{worker}-{i}", "a", "english")
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(history.get_history("shared")) == 100
+    assert history.get_session("shared")["message_count"] == 100
+
+
+def test_legacy_json_sessions_are_imported_once(tmp_path):
+    legacy = {
+        "session_id": "old",
+        "created_at": "2024-01-01T10:00:00",
+        "messages": [
+            {"question": "Q1", "answer": "A1", "language": "english", "timestamp": "2024-01-01T10:00:00"},
+            {"question": "Q2", "answer": "A2", "language": "hindi", "timestamp": "2024-01-01T10:05:00"},
+        ],
+    }
+    (tmp_path / "old.json").write_text(json.dumps(legacy), encoding="utf-8")
+    (tmp_path / "broken.json").write_text("{not json", encoding="utf-8")
+
+    history = ChatHistoryManager(history_dir=str(tmp_path))
+    assert [m["answer"] for m in history.get_history("old")] == ["A1", "A2"]
+    assert history.get_session("old") == {
+        "session_id": "old",
+        "created_at": "2024-01-01T10:00:00",
+        "updated_at": "2024-01-01T10:05:00",
+        "message_count": 2,
+    }
+    assert (tmp_path / "old.json.migrated").exists()
+    # An unreadable file is left in place for inspection
+    assert (tmp_path / "broken.json").exists()
+
+    # Opening again doesn't import the renamed file twice
+    assert len(ChatHistoryManager(history_dir=str(tmp_path)).get_history("old")) == 2
+
+
+def test_message_cursors_page_through_a_session(tmp_path):
+    history = ChatHistoryManager(history_dir=str(tmp_path))
+    for i in range(7):
+        history.save_message("s1", f"q{i}", f"a{i}", "english")
+
+    # Newest page first, then older pages through the before cursor
+    page, has_more = history.get_messages("s1", limit=3)
+    assert [m["question"] for m in page] == ["q4", "q5", "q6"] and has_more
+    page, has_more = history.get_messages("s1", limit=3, before=page[0]["id"])
+    assert [m["question"] for m in page] == ["q1", "q2", "q3"] and has_more
+    page, has_more = history.get_messages("s1", limit=3, before=page[0]["id"])
+    assert [m["question"] for m in page] == ["q0"] and not has_more
+
+    # Forward from a known message: only what was added since
+    first, _ = history.get_messages("s1", limit=2, after=0)
+    newer, has_more = history.get_messages("s1", after=first[-1]["id"])
+    assert [m["question"] for m in newer] == ["q2", "q3", "q4", "q5", "q6"] and not has_more
+
+
+def test_session_cursor_pages_most_recent_first(tmp_path):
+    history = ChatHistoryManager(history_dir=str(tmp_path))
+    for i in range(5):
+        history.save_message(f"s{i}", "q", "a", "english")
+
+    seen, cursor, has_more = [], None, True
+    while has_more:
+        page, has_more = history.list_sessions(limit=2, before=cursor)
+        seen.extend(s["session_id"] for s in page)
+        cursor = (page[-1]["updated_at"], page[-1]["session_id"])
+    assert seen == ["s4", "s3", "s2", "s1", "s0"]
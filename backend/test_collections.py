@@ -0,0 +1,54 @@
+"""CollectionManager: LRU eviction, pinning and explicit creation."""
+import pytest
+
+from embeddings import create_embeddings
+from vector_collections import CollectionManager, CollectionNotFoundError
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return CollectionManager(str(tmp_path), create_embeddings("hash"), max_open=2)
+
+
+def open_names(manager):
+    return [handle.name for handle in manager.open_handles()]
+
+
+def test_least_recently_used_collection_is_closed(manager):
+    manager.get("alpha", create=True)
+    manager.get("beta", create=True)
+    manager.get("alpha")
+    manager.get("gamma", create=True)
+    assert open_names(manager) == ["alpha", "gamma"]
+
+
+def test_pinned_collection_is_not_evicted(manager):
+    with manager.use("alpha", create=True) as pinned:
+        for name in ("beta", "gamma", "delta"):
+            manager.get(name, create=True)
+        assert "alpha" in open_names(manager)
+        assert manager.get("alpha") is pinned
+    # Unpinned, it's evicted like any other once it is least recently used
+    manager.get("epsilon", create=True)
+    manager.get("zeta", create=True)
+    assert len(open_names(manager)) == 2 and "alpha" not in open_names(manager)
+
+
+def test_evicted_collection_is_flushed(manager):
+    handle = manager.get("alpha", create=True)
+    handle.keyword_index.add(["c1"], ["Refunds within thirty days"])
+    manager.get("beta", create=True)
+    manager.get("gamma", create=True)
+    assert "alpha" not in open_names(manager)
+    reopened = manager.get("alpha")
+    assert reopened is not handle
+    assert reopened.keyword_index.ids() == {"c1"}
+
+
+def test_reads_do_not_create_collections(manager):
+    with pytest.raises(CollectionNotFoundError):
+        manager.get("missing")
+    assert not manager.exists("missing")
+    assert [h.name for h in manager.get_many(["missing", "langchain"])] == ["langchain"]
+    manager.get("created", create=True)
+    assert manager.exists("created")
@@ -0,0 +1,51 @@
+"""CompactVectorIndex recall against exact search, before and after IVF training."""
+import numpy as np
+import pytest
+
+from compact_index import CompactVectorIndex
+
+
+DIM = 64
+K = 4
+
+
+def make_vectors(count: int, seed: int) -> np.ndarray:
+    centres = np.random.default_rng(1234).normal(size=(64, DIM)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.6 * rng.normal(size=(count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(index: CompactVectorIndex, vectors: np.ndarray, queries: np.ndarray) -> float:
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    hits = 0
+    for query in queries:
+        exact = {str(i) for i in np.argsort(norms - 2 * vectors @ query)[:K]}
+        hits += len(exact & {chunk_id for chunk_id, _ in index.search(query, K)})
+    return hits / (K * len(queries))
+
+
+@pytest.mark.parametrize("train_min_rows", [10000, 1000])
+def test_recall_matches_exact_search(tmp_path, train_min_rows):
+    vectors = make_vectors(3000, seed=0)
+    queries = make_vectors(50, seed=1)
+    index = CompactVectorIndex(str(tmp_path), train_min_rows=train_min_rows)
+    index.add([str(i) for i in range(len(vectors))], vectors.tolist())
+    index.flush()
+    # 10000: too few rows to train, every code is scanned; 1000: IVF lists
+    assert (index._centroids is not None) == (train_min_rows <= len(vectors))
+    assert recall(index, vectors, queries) >= 0.95
+    reopened = CompactVectorIndex(str(tmp_path), train_min_rows=train_min_rows)
+    assert recall(reopened, vectors, queries) >= 0.95
+
+
+def test_deleted_vectors_are_never_returned(tmp_path):
+    vectors = make_vectors(500, seed=0)
+    index = CompactVectorIndex(str(tmp_path))
+    index.add([str(i) for i in range(len(vectors))], vectors.tolist())
+    index.flush()
+    best = index.search(vectors[7], K)[0][0]
+    assert best == "7"
+    index.delete(["7"])
+    assert "7" not in {chunk_id for chunk_id, _ in index.search(vectors[7], K)}
+    assert len(index) == 499 and "7" not in index
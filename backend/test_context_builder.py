@@ -0,0 +1,45 @@
+"""ContextBuilder: dedupe of overlapping chunks and the token budget."""
+from langchain.schema import Document
+
+from context_builder import ContextBuilder, estimate_tokens
+
+
+def docs(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+FIRST = "Refunds are issued within thirty days of delivery for unused items. "
+SECOND = "Items must be returned in their original packaging with the receipt. "
+THIRD = "Store credit is offered when the receipt is missing or the item is worn. "
+
+
+def test_duplicate_and_contained_chunks_are_skipped():
+    context, stats = ContextBuilder().build(docs(FIRST + SECOND, FIRST + SECOND, SECOND))
+    assert context == (FIRST + SECOND).strip()
+    assert (stats["chunks_retrieved"], stats["chunks_used"]) == (3, 1)
+
+
+def test_splitter_overlap_is_trimmed():
+    # Consecutive chunks share SECOND, as the text splitter's overlap does
+    context, stats = ContextBuilder().build(docs(FIRST + SECOND, SECOND + THIRD))
+    assert context.count(SECOND.strip()) == 1
+    assert THIRD.strip() in context
+    assert stats["chunks_used"] == 2
+
+
+def test_context_stays_within_budget_and_ends_at_a_sentence():
+    sentences = [f"Sentence number {i} explains one more rule of the policy." for i in range(60)]
+    long_chunk = " ".join(sentences)
+    builder = ContextBuilder(max_tokens=100, min_tail_tokens=10)
+    context, stats = builder.build(docs(FIRST, long_chunk))
+    assert stats["context_tokens"] <= 100
+    assert context.startswith(FIRST.strip())
+    assert context.endswith(".")
+    assert stats["raw_tokens"] == estimate_tokens(FIRST) + estimate_tokens(long_chunk)
+
+
+def test_tail_below_minimum_is_dropped():
+    builder = ContextBuilder(max_tokens=estimate_tokens(FIRST) + 5, min_tail_tokens=40)
+    context, stats = builder.build(docs(FIRST, SECOND * 10))
+    assert context == FIRST.strip()
+    assert stats["chunks_used"] == 1
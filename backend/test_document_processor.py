@@ -0,0 +1,53 @@
+"""Page-aware streaming chunker: page numbers and offsets of iter_chunks."""
+import pytest
+
+from document_processor import DocumentProcessor
+from synthetic import make_paragraphs, write_pdf
+
+
+@pytest.fixture
+def processor(tmp_path):
+    processor = DocumentProcessor(max_workers=1, ocr_cache_dir=str(tmp_path / "ocr"))
+    yield processor
+    processor.shutdown()
+
+
+def test_offsets_locate_each_chunk_on_its_page(processor):
+    pages = make_paragraphs(12, words_per_paragraph=250, seed=3)
+    chunks = list(processor._chunk_pages(enumerate(pages, start=1), "page"))
+    joined = "\n".join(pages)
+    page_starts = [sum(len(p) + 1 for p in pages[:i]) for i in range(len(pages))]
+
+    assert len(chunks) > len(pages)
+    for text, meta in chunks:
+        assert 0 <= meta["offset"] < len(pages[meta["page"] - 1])
+        start = page_starts[meta["page"] - 1] + meta["offset"]
+        assert joined[start:start + len(text)] == text
+    # The whole document is covered, in order
+    assert [meta["page"] for _, meta in chunks] == sorted(meta["page"] for _, meta in chunks)
+    assert chunks[-1][0].endswith(pages[-1][-50:])
+
+
+def test_text_offsets_are_document_positions(processor, tmp_path):
+    paragraphs = make_paragraphs(20, words_per_paragraph=120, seed=4)
+    path = tmp_path / "notes.txt"
+    path.write_text("\n".join(paragraphs), encoding="utf-8")
+    text = path.read_text(encoding="utf-8")
+    for chunk, meta in processor.iter_chunks(str(path), ".txt"):
+        assert "page" not in meta
+        assert text[meta["offset"]:meta["offset"] + len(chunk)] == chunk
+
+
+def test_pdf_chunks_name_the_page_they_start_on(processor, tmp_path):
+    pages = make_paragraphs(6, words_per_paragraph=300, seed=5)
+    path = tmp_path / "report.pdf"
+    write_pdf(str(path), pages)
+    extracted = []
+    chunks = list(processor.iter_chunks(str(path), ".pdf", on_pages=extracted.append))
+    assert sum(extracted) == len(pages)
+    # Each synthetic page starts with "Section <n>."
+    page_openers = [(chunk, meta) for chunk, meta in chunks if chunk.startswith("Section ")]
+    assert page_openers
+    for chunk, meta in page_openers:
+        assert chunk.split(".", 1)[0] == f"Section {meta['page'] - 1}"
+    assert {meta["page"] for _, meta in chunks} == set(range(1, len(pages) + 1))
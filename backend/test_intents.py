@@ -0,0 +1,24 @@
+"""Intent routing: whole-word matching and drawn-out greetings"""
+import pytest
+
+from intents import IntentMatcher
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IntentMatcher.load()
+
+
+@pytest.mark.parametrize("message", [
+    "hiii there", "heyy there", "hii ji", "helloo there friend", "Good morninggg", "namasteee ji",
+])
+def test_elongated_multi_word_greetings(matcher, message):
+    assert matcher.classify(message).name == "greeting"
+
+
+@pytest.mark.parametrize("message", [
+    "What is this policy about?", "Which shipping methods are available?", "hello, what is the refund policy?",
+])
+def test_questions_are_not_greetings(matcher, message):
+    intent = matcher.classify(message)
+    assert intent is None or not intent.route
@@ -0,0 +1,73 @@
+"""OllamaClient against the stand-in server: coalescing and cancellation."""
+import asyncio
+
+import pytest
+
+from fake_ollama import start_fake_ollama
+from ollama_client import OllamaClient, OllamaError
+
+
+MODEL = "llama3:latest"
+
+
+@pytest.fixture
+def server():
+    server = start_fake_ollama(latency=0.3)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = OllamaClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=5.0)
+    yield client
+    client.close()
+
+
+def test_identical_generates_share_one_request(server, client):
+    async def ask_twice():
+        return await asyncio.gather(client.generate(MODEL, "same prompt"), client.generate(MODEL, "same prompt"))
+
+    first, second = asyncio.run(ask_twice())
+    assert first == second == server.answer
+    assert server.generate_calls == 1
+    assert client.stats["coalesced"] == 1
+
+
+def test_cancelled_waiter_leaves_shared_request_running(server, client):
+    async def cancel_one():
+        leaving = asyncio.ensure_future(client.generate(MODEL, "same prompt"))
+        staying = asyncio.ensure_future(client.generate(MODEL, "same prompt"))
+        await asyncio.sleep(0.1)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(cancel_one()) == server.answer
+    assert server.generate_calls == 1
+    assert client.stats["cancelled"] == 0
+
+
+def test_last_waiter_cancelling_cancels_request(client):
+    async def cancel_all():
+        task = asyncio.ensure_future(client.generate(MODEL, "lonely prompt"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.05)
+
+    asyncio.run(cancel_all())
+    assert client.stats["cancelled"] == 1
+
+
+def test_stream_sync_gives_up_after_timeout(server):
+    server.latency = 2.0
+    client = OllamaClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=0.3)
+    try:
+        with pytest.raises((OllamaError, asyncio.TimeoutError)):
+            list(client.stream_sync(MODEL, "slow prompt"))
+    finally:
+        client.close()
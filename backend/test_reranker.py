@@ -0,0 +1,50 @@
+"""Reranker time budget with a stand-in scorer of controllable speed."""
+import time
+
+from langchain.schema import Document
+
+from reranker import Reranker
+
+
+class SlowScorer:
+    """Scores passages by length, sleeping per call once warmed up"""
+
+    def __init__(self, seconds_per_call: float, warm_up_calls: int = 0):
+        self.seconds_per_call = seconds_per_call
+        self.calls = 0
+        self.warm_up_calls = warm_up_calls
+
+    def score(self, question, passages):
+        self.calls += 1
+        if self.calls > self.warm_up_calls:
+            time.sleep(self.seconds_per_call)
+        return [float(len(p)) for p in passages]
+
+
+DOCS = [Document(page_content="x" * i, metadata={"chunk_id": str(i)}) for i in range(1, 33)]
+
+
+def test_cost_measured_at_load_skips_batches_over_budget():
+    scorer = SlowScorer(0.05)
+    reranker = Reranker(lambda: scorer, batch_size=16, budget_seconds=0.02)
+    reranker.load()
+    assert reranker.pair_seconds > 0
+    calls = scorer.calls
+    assert reranker.rerank("q", DOCS, 4) == DOCS[:4]
+    assert scorer.calls == calls
+
+
+def test_late_batch_returns_retrieval_order():
+    # Fast while measured at load, slow afterwards: the estimate lets the
+    # batch start, and the deadline check after it catches the overrun
+    scorer = SlowScorer(0.05, warm_up_calls=2)
+    reranker = Reranker(lambda: scorer, batch_size=32, budget_seconds=0.02)
+    reranker.load()
+    assert reranker.rerank("q", DOCS, 4) == DOCS[:4]
+    assert scorer.calls == 3
+
+
+def test_within_budget_reorders_by_score():
+    reranker = Reranker(lambda: SlowScorer(0.0), batch_size=16, budget_seconds=1.0)
+    reranker.load()
+    assert reranker.rerank("q", DOCS, 4) == DOCS[::-1][:4]
@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from langchain_community.vectorstores.chroma import Chroma
+
+from compact_index import CompactVectorIndex
+from keyword_index import KeywordIndex
+from metrics import report_error
+from sentence_index import SentenceIndex
+
+
+# Chroma's default collection; it keeps the original keyword index location
+DEFAULT_COLLECTION = "langchain"
+
+# Chroma collection names: 3-63 characters, alphanumeric at both ends
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+
+
+class CollectionNotFoundError(Exception):
+    """A collection was read that has never been created"""
+
+
+def validate_collection_name(name: str) -> str:
+    if not _COLLECTION_NAME.match(name or ""):
+        raise ValueError(
+            f"Invalid collection name {name!r}: use 3-63 letters, digits, '_' or '-', "
+            "starting and ending with a letter or digit"
+        )
+    return name
+
+
+class CollectionHandle:
+    """An open Chroma collection together with its keyword indexes and counters"""
+
+    def __init__(self, name: str, persist_directory: str, embeddings, compact: bool = False):
+        self.name = name
+        self.vectorstore = Chroma(
+            persist_directory=persist_directory,
+            collection_name=name,
+            embedding_function=embeddings
+        )
+        suffix = "" if name == DEFAULT_COLLECTION else f"_{name}"
+        self.keyword_index = KeywordIndex(os.path.join(persist_directory, "keyword_index" + suffix))
+        # Sentence-level BM25 for extractive answers when no LLM is available
+        self.sentence_index = SentenceIndex(os.path.join(persist_directory, "sentence_index" + suffix))
+        # Optional int8 copy of the vectors, searched instead of Chroma's index
+        self.compact_index = (
+            CompactVectorIndex(os.path.join(persist_directory, "compact_index" + suffix))
+            if compact else None
+        )
+
+        # Number of chunks in the collection, counted once and kept in sync
+        # by writes so queries never need a probe search to check it
+        self.doc_count = None
+        # Writes (adds and deletes) since the last flush
+        self.unpersisted = 0
+        self.persisted_at = time.monotonic()
+        # Callers using the handle right now; a pinned handle is never evicted
+        self.pins = 0
+
+    @property
+    def collection(self):
+        return self.vectorstore._collection
+
+    def has_documents(self) -> bool:
+        if self.doc_count is None:
+            try:
+                self.doc_count = self.collection.count()
+            except Exception:
+                return False
+        return self.doc_count > 0
+
+    def flush(self):
+        try:
+            self.vectorstore.persist()
+        except Exception as e:
+            report_error("persist", f"Vector store persist error in {self.name}: {e}")
+        self.keyword_index.flush()
+        self.sentence_index.flush()
+        if self.compact_index is not None:
+            self.compact_index.flush()
+        self.unpersisted = 0
+        self.persisted_at = time.monotonic()
+
+
+class CollectionManager:
+    """LRU of open collection handles.
+
+    Opening a collection loads its keyword index, so only ``max_open``
+    handles are kept; the least recently used one is flushed and dropped
+    when another collection is opened. Handles pinned by ``use`` (while
+    they are written to) are never dropped, so the cache can briefly hold
+    more. ``on_open`` is called with each newly opened handle, by the
+    thread that opened it.
+
+    Only the default collection is created on first use; others must be
+    created explicitly (``create=True``, as uploads do), so a read naming
+    an unknown collection raises CollectionNotFoundError instead of
+    creating it.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embeddings,
+        max_open: int = 16,
+        compact: bool = False,
+        on_open: Optional[Callable[[CollectionHandle], None]] = None,
+    ):
+        self.persist_directory = persist_directory
+        self.embeddings = embeddings
+        self.max_open = max_open
+        self.compact = compact
+        self.on_open = on_open
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: Optional[str] = None, create: bool = False) -> CollectionHandle:
+        handle = self._acquire(name, create)
+        self._release(handle)
+        return handle
+
+    @contextmanager
+    def use(self, name: Optional[str] = None, create: bool = False) -> Iterator[CollectionHandle]:
+        """get, with the handle pinned open until the block exits"""
+        handle = self._acquire(name, create)
+        try:
+            yield handle
+        finally:
+            self._release(handle)
+
+    def get_many(self, names: Optional[List[str]] = None) -> List[CollectionHandle]:
+        """Handles of the named collections that exist (default: the default collection)"""
+        handles = []
+        for name in dict.fromkeys(names or [DEFAULT_COLLECTION]):
+            try:
+                handles.append(self.get(name))
+            except CollectionNotFoundError:
+                continue
+        return handles
+
+    def exists(self, name: Optional[str] = None) -> bool:
+        name = validate_collection_name(name or DEFAULT_COLLECTION)
+        return name == DEFAULT_COLLECTION or name in self._handles or name in self.list_names()
+
+    def _acquire(self, name: Optional[str], create: bool) -> CollectionHandle:
+        name = validate_collection_name(name or DEFAULT_COLLECTION)
+        if not create and not self.exists(name):
+            raise CollectionNotFoundError(f"Collection {name!r} does not exist")
+        with self._lock:
+            handle = self._handles.get(name)
+            opened = handle is None
+            if opened:
+                handle = CollectionHandle(name, self.persist_directory, self.embeddings, self.compact)
+                self._handles[name] = handle
+            else:
+                self._handles.move_to_end(name)
+            handle.pins += 1
+            self._evict()
+        if opened and self.on_open is not None:
+            try:
+                self.on_open(handle)
+            except BaseException:
+                self._release(handle)
+                raise
+        return handle
+
+    def _release(self, handle: CollectionHandle):
+        with self._lock:
+            handle.pins -= 1
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held; least recently used first
+        for name in [name for name, handle in self._handles.items() if handle.pins == 0]:
+            if len(self._handles) <= self.max_open:
+                break
+            self._handles.pop(name).flush()
+
+    def open_handles(self) -> List[CollectionHandle]:
+        with self._lock:
+            return list(self._handles.values())
+
+    def list_names(self) -> List[str]:
+        """Names of all collections in the store, open or not"""
+        client = self.get().vectorstore._client
+        return sorted(c if isinstance(c, str) else c.name for c in client.list_collections())
@@ -46,6 +46,16 @@ const DocumentUpload = () => {
     setFiles(prev => [...prev, ...selectedFiles])
   }
 
+  // Poll an ingestion job until the backend has finished processing it
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data } = await axios.get(`${API_URL}/jobs/${jobId}`)
+      if (data.status === 'completed') return data
+      if (data.status === 'failed') throw new Error(data.error || 'Processing failed')
+      await new Promise(resolve => setTimeout(resolve, 1000))
+    }
+  }
+
   const handleUpload = async (file) => {
     if (uploading) return
 
@@ -55,27 +65,35 @@ const DocumentUpload = () => {
     const formData = new FormData()
     formData.append('file', file)
 
+    // Re-uploading a file updates the earlier version in place, so only its
+    // changed chunks are re-embedded
+    const previous = uploadedFilesMeta.find(meta => meta.name === file.name)
+
     try {
       const response = await axios.post(`${API_URL}/upload`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
+        params: previous?.fileId ? { replaces: previous.fileId } : {},
       })
 
+      const job = await waitForJob(response.data.job_id)
+      const info = { ...response.data, chunks: job.chunks_total }
+
       setUploadStatus(prev => ({ 
         ...prev, 
         [file.name]: 'success',
-        [`${file.name}_info`]: response.data
+        [`${file.name}_info`]: info
       }))
       
-      // Save file metadata
-      setUploadedFilesMeta(prev => [...prev, {
+      // Save file metadata (replacing the earlier version's)
+      setUploadedFilesMeta(prev => [...prev.filter(meta => meta.name !== file.name), {
         name: file.name,
         size: file.size,
         type: file.type,
         uploadedAt: new Date().toISOString(),
         fileId: response.data.file_id,
-        chunks: response.data.chunks
+        chunks: info.chunks
       }])
     } catch (error) {
       console.error('Upload error:', error)
@@ -85,6 +103,8 @@ const DocumentUpload = () => {
         errorMsg = 'Cannot connect to backend. Please start the server.'
       } else if (error.response) {
         errorMsg = error.response.data?.detail || error.response.statusText
+      } else if (error.message) {
+        errorMsg = error.message
       }
       
       setUploadStatus(prev => ({ 